@@ -0,0 +1,330 @@
+import atexit  # Shutting the shared pools down with the interpreter
+import multiprocessing  # Start method of the worker processes
+import os  # CPU count for the default pool size
+from collections import deque  # Free shared-memory slots
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait  # Persistent worker pool
+from multiprocessing import shared_memory  # Pixel buffers passed to the workers without pickling
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+from PIL import Image  # Import the PIL (Pillow) library for image processing
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+import Bitmap2SVGConverter
+from ConversionCache import convert_array  # Conversions looked up in a ConversionCache first
+
+# Conversion backends: this package's layered converter, or the compiled `bitmap2svg` package.
+BACKENDS = ('layered', 'bitmap2svg')
+
+# PIL modes whose pixels are passed as they are; other modes are converted to RGB first.
+_ARRAY_MODES = ('RGB', 'RGBA', 'L')
+
+def _init_worker():
+    """Keep each worker on one OpenCV thread: the pool already uses every core."""
+    cv2.setNumThreads(1)
+
+def _convert_shared(name, shape, dtype, from_pil, backend, params, original_size=None, return_stats=False):
+    """
+    Convert the image held in shared memory block `name` (run in a worker process).
+
+    Arrays are converted straight from the block; only images the caller passed as PIL images
+    are rebuilt as PIL images (so they are resized exactly as `bitmap_to_svg_layered` resizes
+    PIL input), and for the 'bitmap2svg' backend, which takes PIL images only. Given
+    `original_size`, the block holds pixels the caller already prepared (to look them up in a
+    `ConversionCache`), which are converted by `ConversionCache.convert_array`.
+
+    Returns:
+        str or tuple: The SVG, or (svg, stats) for prepared pixels.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    image = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    try:
+        if original_size is not None:
+            return convert_array(image, original_size, params, return_stats)
+        if backend == 'bitmap2svg':
+            import bitmap2svg  # Optional: the compiled converter is only needed for this backend.
+            if not from_pil:
+                image, _ = Bitmap2SVGConverter.prepare_image(image, resize=False)
+            return bitmap2svg.bitmap_to_svg(Image.fromarray(image), **params)
+        return Bitmap2SVGConverter.bitmap_to_svg_layered(Image.fromarray(image) if from_pil else image, **params)
+    finally:
+        # Arrays (and some PIL modes, such as 'L' and 'RGBA') share the block's memory; it can
+        # only be detached once they are gone, which a traceback may delay.
+        image = None
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+def _as_pixels(image):
+    """
+    Return the pixels of an input image and whether it was a PIL image.
+
+    PIL images in modes other than RGB, RGBA and L are converted to RGB first; anything else
+    is read by `Bitmap2SVGConverter.pixel_array` (arrays, buffers and tensors).
+    """
+    if isinstance(image, Image.Image):
+        if image.mode not in _ARRAY_MODES:
+            image = image.convert('RGB')
+        return np.asarray(image), True
+    return Bitmap2SVGConverter.pixel_array(image), False
+
+def _finished(result):
+    """Wrap a result that needs no conversion, such as a cache hit, in a finished future."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+class BatchConverter:
+    """
+    A persistent process pool that converts many bitmaps to SVG.
+
+    Pixels reach the workers through `multiprocessing.shared_memory` instead of being pickled:
+    each image in flight is copied once into a shared block, and the worker reads it in place.
+    Blocks are recycled across images (grown when an image does not fit), so a long batch
+    only ever holds `max_in_flight` of them. Only the parameters go through the pool's pipe,
+    and only the SVG string comes back.
+
+    Workers are started once and reused by every `imap` call until `close`. The 'spawn' start
+    method keeps them independent of the caller's threads and CUDA state (guidance loops);
+    they import the converter once at startup.
+
+    Args:
+        workers (int, optional): The number of worker processes. Defaults to the CPU count.
+        backend (str, optional): 'layered' (`Bitmap2SVGConverter.bitmap_to_svg_layered`) or
+            'bitmap2svg' (`bitmap2svg.bitmap_to_svg`, which must be installed). Defaults to 'layered'.
+        max_in_flight (int, optional): The most images submitted and not yet returned (each
+            holds a shared block, and finished results wait for earlier ones in ordered mode).
+            Defaults to twice the number of workers.
+        start_method (str, optional): The multiprocessing start method. Defaults to 'spawn'.
+    """
+
+    def __init__(self, workers=None, backend='layered', max_in_flight=None, start_method='spawn'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            mp_context=multiprocessing.get_context(start_method))
+        self.free = deque()  # Shared blocks not holding an image in flight.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut the workers down and release the shared blocks."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        while self.free:
+            self._release(self.free.popleft())
+
+    @staticmethod
+    def _release(block):
+        block.close()
+        block.unlink()
+
+    def _acquire(self, nbytes):
+        """Take a free shared block of at least `nbytes` bytes, creating or growing one if needed."""
+        block = self.free.popleft() if self.free else None
+        if block is not None and block.size < nbytes:
+            self._release(block)
+            block = None
+        if block is None:
+            block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        return block
+
+    def run(self, tasks, max_in_flight=None, held=None):
+        """
+        Run tasks in the pool, yielding each one's future as soon as it is done.
+
+        Tasks are read from the iterable lazily, at most `max_in_flight` ahead of the results.
+        On an early stop the tasks still in flight are cancelled or waited for.
+
+        Args:
+            tasks (iterable): (function, args) pairs, whose functions must be importable by the
+                workers, or finished futures (results known without converting), passed through.
+            max_in_flight (int, optional): Overrides the converter's `max_in_flight`.
+            held (callable, optional): Returns the number of finished results the caller still
+                holds back, which count against `max_in_flight` too. Defaults to None.
+
+        Yields:
+            tuple: (index, future) in completion order, where `index` is the task's position.
+        """
+        limit = max_in_flight or self.max_in_flight
+        iterator = iter(tasks)
+        pending = {}  # Future -> index.
+        next_index = 0  # The index of the next task read from `tasks`.
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) + (held() if held else 0) < limit:
+                    try:
+                        task = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[task if isinstance(task, Future) else self.executor.submit(task[0], *task[1])] = next_index
+                    next_index += 1
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield pending.pop(future), future
+        finally:
+            for future in pending:
+                future.cancel()
+            wait(pending)
+
+    def imap(self, images, ordered=True, max_in_flight=None, cache=None, **params):
+        """
+        Convert images in the pool, yielding each SVG as soon as it can be returned.
+
+        Images are read from the iterable lazily, at most `max_in_flight` ahead of the results,
+        so a generator of decoded images is never fully materialized.
+
+        Args:
+            images (iterable): PIL images or any input `bitmap_to_svg_layered` takes: (H, W, 3)
+                uint8 arrays, (3, H, W) float tensors.
+            ordered (bool, optional): Whether to yield the SVGs in input order (each one as soon
+                as it and every earlier one are done) or as (index, svg) pairs in completion
+                order. Defaults to True.
+            max_in_flight (int, optional): Overrides the converter's `max_in_flight`.
+            cache (ConversionCache, optional): Serve repeated conversions from this cache
+                ('layered' backend only). Each image is then prepared (resized) and looked up
+                in the calling process, only the misses are sent to the workers, and their
+                results are stored. Defaults to None.
+            **params: Keyword arguments of the backend's conversion function.
+
+        Yields:
+            str or tuple: The SVG of each image, or (index, svg) when not `ordered`.
+
+        Raises:
+            ValueError: If a `cache` is given for the 'bitmap2svg' backend.
+        """
+        if cache is not None and self.backend != 'layered':
+            raise ValueError("A ConversionCache only holds conversions of the 'layered' backend")
+        if cache is not None:
+            prepare = {name: params.pop(name) for name in ('resize', 'target_size') if name in params}
+            return_stats = params.pop('return_stats', False)
+        blocks = {}  # Index -> the shared block of each image in flight.
+        keys = {}  # Index -> the cache key of each conversion to store.
+        done = {}  # Finished SVGs waiting for an earlier one (ordered mode).
+        next_yield = 0  # The next index to yield (ordered mode).
+
+        def tasks():
+            for index, image in enumerate(images):
+                if cache is None:
+                    pixels, from_pil = _as_pixels(image)
+                    args = (from_pil, self.backend, params)
+                else:
+                    pixels, original_size = Bitmap2SVGConverter.prepare_image(image, **prepare)
+                    key, original_size, request = cache.request(pixels, original_size, **params)
+                    found = cache.get(key, stats=return_stats) if key is not None else None
+                    if found is not None:
+                        yield _finished(found)
+                        continue
+                    keys[index] = key
+                    args = (False, self.backend, request, original_size, return_stats)
+                block = self._acquire(pixels.nbytes)
+                np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=block.buf)[...] = pixels
+                blocks[index] = block
+                yield _convert_shared, (block.name, pixels.shape, pixels.dtype.str, *args)
+
+        # In ordered mode, results held back for an earlier image count against the limit too,
+        # so a slow image cannot make the buffer grow without bound.
+        results = self.run(tasks(), max_in_flight=max_in_flight, held=done.__len__)
+        try:
+            for index, future in results:
+                if index in blocks:
+                    self.free.append(blocks.pop(index))
+                svg = future.result()  # Raises the worker's exception, if any.
+                if cache is not None:
+                    key = keys.pop(index, None)
+                    if key is not None:
+                        cache.put(key, *svg)
+                    svg = svg if return_stats else svg[0]
+                if not ordered:
+                    yield index, svg
+                    continue
+                done[index] = svg
+                while next_yield in done:
+                    yield done.pop(next_yield)
+                    next_yield += 1
+        finally:
+            # Stopped early or failed: let the remaining conversions finish, then free their blocks.
+            results.close()
+            self.free.extend(blocks.values())
+
+_default_converters = {}
+
+@atexit.register
+def _close_default_converters():
+    """Stop the shared pools and release their shared blocks at interpreter exit."""
+    for converter in _default_converters.values():
+        converter.close()
+    _default_converters.clear()
+
+def get_batch_converter(workers=None, backend='layered'):
+    """
+    Return the persistent `BatchConverter` shared by `bitmap_to_svg_batch` calls.
+
+    One converter is kept per (workers, backend), so repeated batches reuse warm workers.
+    """
+    key = (workers or os.cpu_count() or 1, backend)
+    if key not in _default_converters:
+        _default_converters[key] = BatchConverter(workers=key[0], backend=backend)
+    return _default_converters[key]
+
+def bitmap_to_svg_batch(images, workers=None, backend='layered', ordered=True, max_in_flight=None, cache=None,
+                        **params):
+    """
+    Convert a batch of bitmaps to SVG in a persistent process pool.
+
+    The pool is started on first use and reused by later calls (see `get_batch_converter`).
+    Results stream back as they complete; with `ordered` they come in input order.
+
+    Args:
+        images (iterable): PIL images, (H, W, 3) uint8 arrays or (3, H, W) float tensors.
+        workers (int, optional): The number of worker processes. Defaults to the CPU count.
+        backend (str, optional): 'layered' or 'bitmap2svg', see `BatchConverter`. Defaults to 'layered'.
+        ordered (bool, optional): Whether to yield SVGs in input order rather than (index, svg)
+            pairs in completion order. Defaults to True.
+        max_in_flight (int, optional): The most images being converted or waiting to be
+            yielded at once. Defaults to twice the number of workers.
+        cache (ConversionCache, optional): Serve repeated conversions from this cache, see
+            `BatchConverter.imap`. Defaults to None.
+        **params: Keyword arguments of `bitmap_to_svg_layered` (or `bitmap2svg.bitmap_to_svg`).
+
+    Yields:
+        str or tuple: The SVG of each image, or (index, svg) when not `ordered`.
+    """
+    converter = get_batch_converter(workers=workers, backend=backend)
+    yield from converter.imap(images, ordered=ordered, max_in_flight=max_in_flight, cache=cache, **params)
+
+if __name__ == "__main__":
+    # Convert a batch of synthetic images serially and in the pool, and check they agree.
+    import time
+
+    from Bitmap2SVGBenchmark import synthetic_image
+
+    images = [synthetic_image('flat', 384, seed=seed) for seed in range(32)]
+    params = {'quantizer': 'fast', 'seed': 0}
+
+    start = time.perf_counter()
+    serial = [Bitmap2SVGConverter.bitmap_to_svg_layered(image, **params) for image in images]
+    serial_time = time.perf_counter() - start
+
+    with BatchConverter() as converter:
+        list(converter.imap(images[:converter.workers], **params))  # Start the workers.
+        start = time.perf_counter()
+        pooled = list(converter.imap(images, **params))
+        pooled_time = time.perf_counter() - start
+
+    print(f"{len(images)} images: serial {len(images) / serial_time:.1f} images/s, "
+          f"{converter.workers} workers {len(images) / pooled_time:.1f} images/s, "
+          f"identical: {pooled == serial}")
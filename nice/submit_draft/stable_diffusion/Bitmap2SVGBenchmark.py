@@ -0,0 +1,226 @@
+import argparse  # Command line options
+import io  # In-memory binary streams for the serialized SVG
+import json  # Machine-readable results
+import platform  # Environment details recorded with the results
+import sys
+import time  # Wall-clock timing of each stage
+import tracemalloc  # Allocation tracking of each stage
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+from PIL import Image  # Import the PIL (Pillow) library for image processing
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+import Bitmap2SVGConverter
+from ColorQuantizer import get_quantizer
+from SimplificationPyramid import SimplificationPyramid
+from SVGWriter import SVGWriter
+
+STAGES = ('resize', 'quantize', 'contours', 'simplify', 'size_accounting', 'serialize')
+# The converter's `stats` timing of each stage.
+STAGE_TIMINGS = {'resize': 'prepare', 'quantize': 'quantize', 'contours': 'contours', 'simplify': 'simplify',
+                 'size_accounting': 'pack', 'serialize': 'serialize'}
+INPUTS = ('flat', 'gradient', 'noise')
+
+def synthetic_image(kind, size, seed=0):
+    """
+    Generate a synthetic RGB test image.
+
+    Args:
+        kind (str): 'flat' (flat-color ellipses and rectangles with soft edges, like Stable
+            Diffusion output), 'gradient' (overlapping linear and radial ramps) or 'noise'
+            (uniform per-pixel noise, the worst case for region extraction).
+        size (int): The width and height in pixels.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: A (size, size, 3) uint8 array.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == 'flat':
+        img = np.full((size, size, 3), 235, dtype=np.uint8)
+        scale = size / 384
+        for _ in range(30):
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            center = tuple(int(c) for c in rng.integers(0, size, 2))
+            axes = tuple(max(1, int(a * scale)) for a in rng.integers(10, 80, 2))
+            if rng.random() < 0.5:
+                cv2.ellipse(img, center, axes, float(rng.integers(0, 180)), 0, 360, color, -1)
+            else:
+                corner = (center[0] + axes[0], center[1] + axes[1])
+                cv2.rectangle(img, center, corner, color, -1)
+        return cv2.GaussianBlur(img, (3, 3), 0)
+    if kind == 'gradient':
+        y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+        img = np.zeros((size, size, 3), dtype=np.float32)
+        for channel in range(3):
+            angle = rng.uniform(0, np.pi)
+            ramp = np.cos(angle) * x + np.sin(angle) * y
+            cx, cy = rng.uniform(0, 1, 2)
+            radial = np.sqrt((x - cx) ** 2 + (y - cy) ** 2)
+            img[:, :, channel] = 0.5 * (ramp - ramp.min()) / np.ptp(ramp) + 0.5 * np.clip(1 - radial, 0, 1)
+        return (img * 255).astype(np.uint8)
+    if kind == 'noise':
+        return rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    raise ValueError(f"Unknown synthetic input: {kind!r}")
+
+def run_stages(source, size, num_colors, quantizer='fast', engine='components', packer='dp',
+               encoding='polygon', max_size_bytes=10000, seed=0):
+    """
+    Run the conversion pipeline stage by stage on one image, with the converter's own stage functions.
+
+    Args:
+        source (PIL.Image): The input image.
+        size (int): The processing size the image is resized to.
+        num_colors (int): The number of colors to quantize to.
+        quantizer (str, optional): The color quantization engine. Defaults to 'fast'.
+        engine (str, optional): The region extraction engine. Defaults to 'components'.
+        packer (str, optional): The adaptive fill solver. Defaults to 'dp'.
+        encoding (str, optional): The output encoding, 'polygon' or 'path'. Defaults to 'polygon'.
+        max_size_bytes (int, optional): The SVG size limit. Defaults to 10000.
+        seed (int, optional): The quantizer seed. Defaults to 0.
+
+    Yields:
+        tuple: (stage, details) after each stage of STAGES has run, with the stage's output
+               counts in `details`. The caller traces the gaps between items.
+    """
+    img_np, original_size = Bitmap2SVGConverter.prepare_image(source, target_size=(size, size))
+    yield 'resize', {}
+
+    labels, palette = Bitmap2SVGConverter.quantize_colors(img_np, num_colors, quantizer=get_quantizer(quantizer, seed=seed))
+    yield 'quantize', {}
+
+    features = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine=engine)
+    yield 'contours', {'vertices': int(features.lengths.sum())}
+
+    pyramid = SimplificationPyramid(features, encoding=encoding)
+    yield 'simplify', {}
+
+    svg_base, svg_footer, background, _ = Bitmap2SVGConverter.svg_frame(img_np, original_size)
+    available_bytes = max_size_bytes - len((svg_base + svg_footer).encode('utf-8'))
+    levels, _ = Bitmap2SVGConverter.select_levels(pyramid, available_bytes, packer=packer, img_np=img_np,
+                                                  background=background)
+    yield 'size_accounting', {}
+
+    writer = SVGWriter(io.BytesIO(), max_size_bytes=max_size_bytes, footer=svg_footer)
+    writer.begin(''.join([svg_base, *Bitmap2SVGConverter.iter_feature_elements(pyramid, levels)]))
+    writer.close()
+    yield 'serialize', {}
+
+def measure(source, size, num_colors, repeat=3, quantizer='fast', engine='components', packer='dp',
+            encoding='polygon', max_size_bytes=10000, seed=0):
+    """
+    Time and trace every stage of a conversion.
+
+    Wall times are the best of `repeat` runs of `write_svg_layered` itself, read from its
+    `stats` timings, so they measure exactly what callers run. Allocations come from one extra
+    run of `run_stages` under tracemalloc (which slows execution down, so it is never timed):
+    `peak_bytes` is the highest traced memory above the stage's starting point and
+    `retained_bytes` what the stage still holds when it ends.
+
+    Returns:
+        dict: Per stage, 'seconds', 'peak_bytes' and 'retained_bytes', plus the conversion's
+              'palette', 'features', 'vertices', 'drawn' and 'svg_bytes'.
+    """
+    stages = {stage: {'seconds': float('inf')} for stage in STAGES}
+    for _ in range(repeat):
+        stats = {}
+        Bitmap2SVGConverter.write_svg_layered(source, io.BytesIO(), max_size_bytes=max_size_bytes,
+                                              target_size=(size, size), num_colors=num_colors, packer=packer,
+                                              quantizer=quantizer, seed=seed, encoding=encoding, engine=engine,
+                                              stats=stats)
+        for stage in STAGES:
+            stages[stage]['seconds'] = min(stages[stage]['seconds'], stats['timings'][STAGE_TIMINGS[stage]])
+    details = {'palette': stats['palette_size'], 'features': stats['features'], 'drawn': stats['drawn'],
+               'svg_bytes': stats['bytes']}
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for stage, info in run_stages(source, size, num_colors, quantizer=quantizer, engine=engine, packer=packer,
+                                      encoding=encoding, max_size_bytes=max_size_bytes, seed=seed):
+            current, peak = tracemalloc.get_traced_memory()
+            stages[stage]['peak_bytes'] = peak - baseline
+            stages[stage]['retained_bytes'] = current - baseline
+            details.update(info)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return {'stages': stages, 'total_seconds': sum(s['seconds'] for s in stages.values()), **details}
+
+def run_benchmark(sizes=(128, 256, 384, 512, 1024), colors=(8, 16, 32), inputs=INPUTS,
+                  quantizers=('fast', 'histogram'), engine='components', packer='dp', encoding='polygon',
+                  max_size_bytes=10000, repeat=3, seed=0, log=None):
+    """
+    Benchmark the pipeline stages over a grid of synthetic inputs, sizes, color counts and quantizers.
+
+    Each input is synthesized at 4/3 of the processing size (as a 512 px Stable Diffusion image
+    is resized to 384 px), so the resize stage does real work.
+
+    Args:
+        log (file object, optional): A text stream for one progress line per case. Defaults to None.
+        See `run_stages` for the other arguments.
+
+    Returns:
+        dict: 'environment' (library versions and options) and 'results' (one entry per case).
+    """
+    results = []
+    for kind in inputs:
+        for size in sizes:
+            source = Image.fromarray(synthetic_image(kind, size * 4 // 3, seed=seed))
+            for num_colors in colors:
+                for quantizer in quantizers:
+                    result = measure(source, size, num_colors, repeat=repeat, quantizer=quantizer,
+                                     engine=engine, packer=packer, encoding=encoding, max_size_bytes=max_size_bytes, seed=seed)
+                    results.append({'input': kind, 'size': size, 'num_colors': num_colors,
+                                    'quantizer': quantizer, **result})
+                    if log is not None:
+                        timings = '  '.join(f"{stage} {result['stages'][stage]['seconds'] * 1000:7.1f}"
+                                            for stage in STAGES)
+                        print(f"{kind:>8} {size:5d}px {num_colors:3d} colors {quantizer:>9}: {timings}  "
+                              f"total {result['total_seconds'] * 1000:7.1f} ms  {result['svg_bytes']} bytes",
+                              file=log)
+
+    environment = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'engine': engine,
+        'packer': packer,
+        'encoding': encoding,
+        'max_size_bytes': max_size_bytes,
+        'repeat': repeat,
+        'seed': seed,
+    }
+    return {'environment': environment, 'results': results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Bitmap2SVG pipeline stages on synthetic inputs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[128, 256, 384, 512, 1024])
+    parser.add_argument('--colors', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--inputs', nargs='+', choices=INPUTS, default=list(INPUTS))
+    parser.add_argument('--quantizers', nargs='+', default=['fast', 'histogram'],
+                        help="quantization engines to compare ('kmeans' is much slower)")
+    parser.add_argument('--engine', default='components', choices=('components', 'multiscale', 'tiled', 'masks'))
+    parser.add_argument('--packer', default='dp')
+    parser.add_argument('--encoding', default='polygon', choices=('polygon', 'path'))
+    parser.add_argument('--max-size-bytes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case; the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bitmap2svg_benchmark.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(sizes=args.sizes, colors=args.colors, inputs=args.inputs,
+                           quantizers=args.quantizers, engine=args.engine, packer=args.packer, encoding=args.encoding,
+                           max_size_bytes=args.max_size_bytes, repeat=args.repeat, seed=args.seed,
+                           log=sys.stdout)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+if __name__ == "__main__":
+    main()
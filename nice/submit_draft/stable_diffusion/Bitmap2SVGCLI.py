@@ -0,0 +1,356 @@
+import argparse  # Command line options
+import glob  # Shell-style input patterns
+import json  # JSON Lines output
+import os  # Paths and durable flushes
+import struct  # Local headers of interrupted zip archives
+import sys
+import time  # Throughput and per-image latency
+import zipfile  # Zip output
+import zlib  # Entries salvaged from interrupted zip archives
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBatch import BatchConverter  # Persistent worker pool
+from BitmapLoader import IMAGE_EXTENSIONS, bitmap_file_to_svg, list_images
+from ColorQuantizer import QUANTIZERS
+from ConversionCache import ConversionCache  # Conversions shared across runs through a cache directory
+
+# Stacks already memory-mapped by this worker process, by their mapping.
+_stacks = {}
+# Conversion caches opened by this worker process, by their directory.
+_caches = {}
+
+def _read_npy_header(f):
+    """Read a .npy header from `f`, leaving it at the start of the array data."""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+def _npy_layout(path):
+    """
+    Locate the arrays of a .npy file, or the uncompressed members of a .npz file, for `np.memmap`.
+
+    Returns:
+        list: (name, mapping) pairs, where mapping is (path, offset, dtype, shape, order), or
+              None for a compressed .npz member, which cannot be mapped.
+    """
+    if not path.endswith('.npz'):
+        with open(path, 'rb') as f:
+            shape, fortran_order, dtype = _read_npy_header(f)
+            return [(None, (path, f.tell(), dtype.str, shape, 'F' if fortran_order else 'C'))]
+    layout = []
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                layout.append((name, None))
+                continue
+            # The member's data starts after its local header, whose name and extra field may
+            # differ in length from the central directory's.
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<2H', f.read(30)[26:])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            shape, fortran_order, dtype = _read_npy_header(f)
+            layout.append((name, (path, f.tell(), dtype.str, shape, 'F' if fortran_order else 'C')))
+    return layout
+
+def _open_stack(mapping):
+    """Memory-map an image stack once per process (see `_npy_layout`)."""
+    if mapping not in _stacks:
+        path, offset, dtype, shape, order = mapping
+        _stacks[mapping] = np.memmap(path, dtype=np.dtype(dtype), mode='r', offset=offset, shape=shape, order=order)
+    return _stacks[mapping]
+
+def _convert_item(source, params, cache_dir=None):
+    """
+    Convert one input (run in a worker process).
+
+    Args:
+        source (tuple): ('file', path), ('stack', mapping, index) for an image of a
+            memory-mapped stack, which the worker maps itself so the pixels are never pickled,
+            or ('array', image) for an image of a compressed stack.
+        params (dict): Keyword arguments of `bitmap_to_svg_layered`.
+        cache_dir (str, optional): The directory of a `ConversionCache` disk tier, shared by the
+            workers (each keeps its own memory tier). Defaults to None.
+
+    Returns:
+        tuple: (svg, seconds): the SVG and the time the conversion took.
+    """
+    start = time.perf_counter()
+    cache = None
+    if cache_dir is not None:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ConversionCache(directory=cache_dir)
+        cache = _caches[cache_dir]
+    if source[0] == 'file':
+        svg = bitmap_file_to_svg(source[1], cache=cache, **params)
+    else:
+        image = _open_stack(source[1])[source[2]] if source[0] == 'stack' else source[1]
+        svg = (cache or Bitmap2SVGConverter).bitmap_to_svg_layered(np.asarray(image), **params)
+    return svg, time.perf_counter() - start
+
+def iter_sources(source):
+    """
+    List the images of an input as (key, source) pairs for `_convert_item`.
+
+    Args:
+        source (str): A directory (its image files, see `list_images`), a .npy or .npz stack
+            of images along the first axis (memory-mapped), an image file, or a glob pattern.
+
+    Yields:
+        tuple: (key, source): the image's key in the output (a path relative to the directory,
+               or to the pattern's directories before the first wildcard, or '<index>' /
+               '<member>/<index>' in a stack) and its `_convert_item` source.
+    """
+    if os.path.isdir(source):
+        for path in list_images(source):
+            yield os.path.relpath(path, source).replace(os.sep, '/'), ('file', path)
+    elif source.endswith(('.npy', '.npz')) and os.path.isfile(source):
+        for name, mapping in _npy_layout(source):
+            if mapping is None:
+                stack = np.load(source)[name]  # Compressed: decompressed here, passed by value.
+                print(f"{source}: member {name!r} is compressed and cannot be memory-mapped", file=sys.stderr)
+            else:
+                stack = _open_stack(mapping)
+            width = len(str(max(len(stack) - 1, 0)))
+            prefix = '' if name is None else name + '/'
+            for index in range(len(stack)):
+                key = f"{prefix}{index:0{width}d}"
+                yield key, ('stack', mapping, index) if mapping is not None else ('array', stack[index])
+    elif os.path.isfile(source):
+        yield os.path.basename(source), ('file', source)
+    else:
+        # Keys are relative to the directories before the first wildcard.
+        parts = source.split(os.sep)
+        fixed = next(i for i, part in enumerate(parts + ['*']) if glob.has_magic(part))
+        root = os.sep.join(parts[:fixed]) or os.curdir
+        for path in sorted(glob.glob(source, recursive=True)):
+            if path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                yield os.path.relpath(path, root).replace(os.sep, '/'), ('file', path)
+
+class JsonlArchive:
+    """
+    SVGs written one JSON object per line: {"key": ..., "svg": ...}.
+
+    On opening an existing file, its keys are read so they can be skipped; a last line cut
+    short by an interrupted run (without its newline) is dropped. Any other line that cannot
+    be read is reported and left in place, and its image is converted again.
+    """
+
+    def __init__(self, path):
+        self.keys = set()
+        if os.path.exists(path):
+            end = 0
+            with open(path, 'rb') as f:
+                for number, line in enumerate(f, 1):
+                    if not line.endswith(b'\n'):
+                        break  # Only the last line can miss its newline.
+                    end += len(line)
+                    try:
+                        self.keys.add(json.loads(line)['key'])
+                    except (ValueError, KeyError, TypeError):
+                        print(f"{path}: skipping unreadable line {number}", file=sys.stderr)
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, key, svg):
+        self.file.write(json.dumps({'key': key, 'svg': svg}) + '\n')
+        self.keys.add(key)
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def _salvage_zip(path):
+    """
+    Rebuild a zip archive whose central directory was lost to an interrupted run.
+
+    Entries are read back from their local headers, in order, up to the first incomplete one.
+
+    Returns:
+        list: The names of the entries kept.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    entries = []
+    position = 0
+    while data.startswith(b'PK\x03\x04', position) and position + 30 <= len(data):
+        (_, _, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack('<4s5H3L2H', data[position:position + 30])
+        start = position + 30 + name_length + extra_length
+        end = start + compressed_size
+        if flags & 0x08 or size == 0 or end > len(data):
+            break  # Sizes unknown (streamed), or the entry was never finished.
+        raw = data[start:end]
+        content = zlib.decompress(raw, -15) if method == zipfile.ZIP_DEFLATED else raw
+        if zlib.crc32(content) != crc:
+            break
+        entries.append((data[position + 30:position + 30 + name_length].decode('utf-8'), content))
+        position = end
+    with zipfile.ZipFile(path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in entries:
+            archive.writestr(name, content)
+    os.replace(path + '.tmp', path)
+    return [name for name, _ in entries]
+
+class ZipArchive:
+    """
+    SVGs written as '<key>.svg' entries of a zip archive.
+
+    The central directory is only written when the archive is closed, so `flush` closes and
+    reopens it: it rewrites the directory and reads it back, which costs time in proportion to
+    the entries already written (about 15 ms per thousand). At the default of one flush every
+    64 SVGs this stays a few percent of the conversion time up to some ten thousand images;
+    for larger archives, flush less often. An archive left without a directory by an interrupted run is salvaged
+    on opening.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        names = []
+        if os.path.exists(path):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    names = archive.namelist()
+            except zipfile.BadZipFile:
+                names = _salvage_zip(path)
+                print(f"{path}: recovered {len(names)} entries of an interrupted run", file=sys.stderr)
+        self.keys = {name[:-4] for name in names if name.endswith('.svg')}
+        self.archive = zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED)
+
+    def write(self, key, svg):
+        self.archive.writestr(key + '.svg', svg)
+        self.keys.add(key)
+
+    def flush(self):
+        self.archive.close()
+        self.archive = zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED)
+
+    def close(self):
+        self.archive.close()
+
+def open_archive(path):
+    """Open a .zip output as a `ZipArchive` and anything else as a `JsonlArchive`."""
+    return ZipArchive(path) if path.lower().endswith('.zip') else JsonlArchive(path)
+
+def convert_sources(sources, archive, workers=None, max_in_flight=None, flush_every=64, log=None, cache_dir=None,
+                    **params):
+    """
+    Convert (key, source) pairs in a `BatchConverter` pool, writing each SVG to an archive as it completes.
+
+    Keys already in the archive are skipped, so an interrupted run can be resumed. Sources are
+    read lazily, at most `max_in_flight` ahead of the results. An image that fails is reported
+    and left out of the archive (a later run retries it).
+
+    Args:
+        sources (iterable): (key, source) pairs, see `iter_sources`.
+        archive (JsonlArchive or ZipArchive): The output.
+        workers (int, optional): The number of worker processes. Defaults to the CPU count.
+        max_in_flight (int, optional): The most images submitted and not yet written. Defaults
+            to twice the number of workers.
+        flush_every (int, optional): The number of SVGs written between flushes. Defaults to 64.
+        log (file, optional): Stream progress and failures are reported to. Defaults to None.
+        cache_dir (str, optional): A `ConversionCache` directory the workers look every
+            conversion up in and store it to, so images converted by earlier runs (into any
+            archive, with the same settings) are not converted again. Defaults to None.
+        **params: Keyword arguments of `bitmap_to_svg_layered`.
+
+    Returns:
+        dict: 'converted', 'skipped', 'failed', 'seconds' (wall time) and 'latencies' (the
+              conversion time of each converted image, in seconds).
+    """
+    stats = {'converted': 0, 'skipped': 0, 'failed': 0, 'latencies': []}
+    keys = {}  # Task index -> key of each image in flight.
+    unflushed = 0
+
+    def tasks():
+        index = 0
+        for key, source in sources:
+            if key in archive.keys:
+                stats['skipped'] += 1
+                continue
+            keys[index] = key
+            index += 1
+            yield _convert_item, (source, params, cache_dir)
+
+    start = time.perf_counter()
+    try:
+        with BatchConverter(workers=workers, max_in_flight=max_in_flight) as converter:
+            for index, future in converter.run(tasks()):
+                key = keys.pop(index)
+                try:
+                    svg, seconds = future.result()
+                except Exception as error:
+                    stats['failed'] += 1
+                    if log is not None:
+                        print(f"{key}: {type(error).__name__}: {error}", file=log)
+                    continue
+                archive.write(key, svg)
+                stats['converted'] += 1
+                stats['latencies'].append(seconds)
+                unflushed += 1
+                if unflushed >= flush_every:
+                    archive.flush()
+                    unflushed = 0
+                    if log is not None:
+                        print(f"{stats['converted']} converted, {stats['skipped']} skipped", file=log)
+    finally:
+        # Interrupted or done: the converter kept what finished and stopped what did not.
+        stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert many bitmaps to SVG in parallel into one JSONL or zip archive.')
+    parser.add_argument('source', help='a directory, a glob pattern (quoted), an image file, or a .npy/.npz image stack')
+    parser.add_argument('output', help="output archive: '.zip' for a zip of '<key>.svg' entries, JSON Lines otherwise; "
+                                       'keys already in it are skipped')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--max-in-flight', type=int, default=None)
+    parser.add_argument('--cache-dir', default=None, help='conversion cache directory shared by the workers and by '
+                                                          'later runs (unseeded quantization uses seed 0)')
+    parser.add_argument('--flush-every', type=int, default=64, help='SVGs written between flushes (each flush of a zip archive rewrites its index)')
+    parser.add_argument('--max-size-bytes', type=int, default=10000)
+    parser.add_argument('--target-size', type=int, nargs=2, default=(384, 384), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--no-resize', dest='resize', action='store_false')
+    parser.add_argument('--num-colors', type=int, default=None)
+    parser.add_argument('--quantizer', default='kmeans', choices=sorted(QUANTIZERS))
+    parser.add_argument('--engine', default='components', choices=('components', 'multiscale', 'tiled', 'masks'))
+    parser.add_argument('--packer', default='dp', choices=('dp', 'lagrangian', 'greedy', 'residual'))
+    parser.add_argument('--encoding', default='polygon', choices=('polygon', 'path'))
+    parser.add_argument('--primitives', action='store_true')
+    parser.add_argument('--gradients', action='store_true')
+    parser.add_argument('--holes', action='store_true')
+    parser.add_argument('--cull', action='store_true')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    params = {'max_size_bytes': args.max_size_bytes, 'resize': args.resize, 'target_size': tuple(args.target_size),
+              'num_colors': args.num_colors, 'quantizer': args.quantizer, 'engine': args.engine,
+              'packer': args.packer, 'encoding': args.encoding, 'primitives': args.primitives,
+              'gradients': args.gradients, 'holes': args.holes, 'cull': args.cull, 'seed': args.seed}
+    archive = open_archive(args.output)
+    try:
+        stats = convert_sources(iter_sources(args.source), archive, workers=args.workers,
+                                max_in_flight=args.max_in_flight, flush_every=args.flush_every,
+                                log=sys.stderr, cache_dir=args.cache_dir, **params)
+    finally:
+        archive.close()
+
+    summary = (f"{stats['converted']} converted, {stats['skipped']} skipped, {stats['failed']} failed "
+               f"in {stats['seconds']:.1f} s")
+    if stats['converted']:
+        p50, p95 = np.percentile(stats['latencies'], [50, 95]) * 1000
+        summary += (f": {stats['converted'] / stats['seconds']:.1f} images/s, "
+                    f"latency p50 {p50:.0f} ms, p95 {p95:.0f} ms")
+    print(summary)
+    return 1 if stats['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,49 @@
+import io  # In-memory binary streams for building SVG documents
+import os  # CPU count for the tiled extraction workers
+import time  # Stage timings for the optional conversion stats
+from concurrent.futures import ThreadPoolExecutor  # Tiles labelled and traced in parallel
+
 import numpy as np  # Import the NumPy library for efficient numerical computations
 
 from PIL import Image  # Import the PIL (Pillow) library for image processing
 
 import cv2  # Import the OpenCV library for computer vision tasks
 
+from FeatureTable import FeatureTable  # Struct-of-arrays container for extracted features
+from SimplificationPyramid import SimplificationPyramid, decimate_mask  # Precomputed simplification levels
+from BudgetPacker import fit_budget, pack_budget, packed_size, SKIP  # Byte-budget level selection for the adaptive fill
+from SVGWriter import SVGWriter  # Incremental SVG writer with a running byte count
+from ColorQuantizer import get_quantizer  # Pluggable color quantization engines
+from PrimitiveFitter import SHAPE_POLYGON, fit_primitive  # Circle, ellipse and rectangle fitting
+from GradientBands import merge_gradient_bands  # Linear-gradient fills for banded shading
+from OcclusionCulling import occluded, visible_pixels  # Low-resolution visibility of painted shapes
+from ResidualPacker import ResidualPacker  # Error-driven feature selection
+
+# Re-packing rounds after occluded features are culled (see `_cull_occluded`).
+CULL_ROUNDS = 3
+
+# Default contour simplification epsilon, as a fraction of each contour's perimeter, and the
+# default smallest contour area (in pixels) kept as a feature.
+SIMPLIFICATION_EPSILON = 0.02
+MIN_CONTOUR_AREA = 20
+
+# Smallest image side the 'multiscale' extraction engine downsamples at all: below it, the
+# full-resolution pass takes a few milliseconds and the coarse pass costs as much as it saves.
+COARSE_MIN_SIDE = 1024
+# Smallest image side the 'multiscale' extraction engine downsamples by 4 rather than 2.
+COARSE_4X_SIDE = 512
+# Smallest area and mean width (area over the longer bounding box side), in pixels of the
+# downsampled map, of a region the 'multiscale' engine traces there.
+COARSE_MIN_AREA = 64
+COARSE_MIN_WIDTH = 4
+# Largest fraction of the image the detail windows of the 'multiscale' engine may cover before
+# it extracts the whole image at full resolution instead.
+COARSE_MAX_DETAIL = 0.5
+
+# Tile side (in pixels) and number of worker threads of the 'tiled' extraction engine.
+TILE_SIZE = 512
+TILE_WORKERS = min(8, os.cpu_count() or 1)
+
 def compress_hex_color(hex_color):
     """
     Convert a hexadecimal color code to its shortest possible representation.
@@ -25,62 +65,372 @@ def compress_hex_color(hex_color):
         return f'#{r//17:x}{g//17:x}{b//17:x}'  # Use an f-string to format the string
     return hex_color  # Otherwise, return the original hexadecimal color code.
 
-def extract_features_by_scale(img_np, num_colors=16):
+def quantize_colors(img_rgb, num_colors, quantizer='kmeans', init_centers=None):
     """
-    Extract image features hierarchically by scale.
+    Quantize an RGB image to a fixed number of colors.
 
-    This function segments the image into representative color regions and extracts contours
-    and other features for each region. It also sorts the features by the importance of the
-    colors in the image.
+    Args:
+        img_rgb (np.ndarray): The input RGB image, shape (H, W, 3).
+        num_colors (int): The number of colors to quantize to.
+        quantizer (str or ColorQuantizer, optional): The quantization engine: 'kmeans' (OpenCV
+            K-means over every pixel), 'fast' (subsampled K-means with one vectorized assignment
+            pass), 'superpixel' (K-means over superpixel mean colors, see `SuperpixelQuantizer`),
+            any other name from `ColorQuantizer.QUANTIZERS` or an engine instance. Defaults to 'kmeans'.
+        init_centers (np.ndarray, optional): A starting palette for engines that can warm-start.
+
+    Returns:
+        tuple: (labels, palette) where labels is an (H, W) uint8 map of palette indices
+               and palette is a (num_colors, 3) uint8 array of RGB colors.
+    """
+    return get_quantizer(quantizer).quantize(img_rgb, num_colors, init_centers=init_centers)
+
+def label_regions(labels):
+    """
+    Find every connected region of every color in a label map in a single pass.
+
+    The label map is expanded onto a (2H-1, 2W-1) lattice where even/even cells are the
+    pixels and the cells between two pixels are "links" that are only set when both
+    pixels share a label. One 4-connected component labelling of that lattice then
+    separates all colors at once, instead of one mask and one contour search per color.
 
     Args:
-        img_np (np.ndarray): The input image, represented as a NumPy array.
-        num_colors (int, optional): The number of colors to quantize to. Defaults to 16.
+        labels (np.ndarray): An (H, W) uint8 map of palette indices.
 
     Returns:
-        list: A list of hierarchical features, sorted by importance. Each feature is a dictionary
-              containing 'points' (contour point string), 'color' (hex color), 'area' (region area),
-              'importance' (importance score), 'point_count' (number of points in contour),
-              and 'original_contour' (original contour, for adaptive simplification).
+        dict: 'ids' (H, W) int32 region map, plus per-region arrays 'color' (palette index),
+              'area' (pixel count), 'cx'/'cy' (pixel centroid), 'bbox' ((N, 4) x, y, w, h) and
+              'cells' (the lattice cells the centroid averages: pixels and links between them).
     """
-    # Ensure the input image is in RGB format.
-    if len(img_np.shape) == 3 and img_np.shape[2] > 1:
-        img_rgb = img_np  # If it's already RGB, use it directly.
-    else:
-        img_rgb = cv2.cvtColor(img_np, cv2.COLOR_GRAY2RGB)  # Otherwise, convert it from grayscale to RGB.
+    height, width = labels.shape
 
-    # Convert the RGB image to grayscale for certain processing steps.
-    gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
-    height, width = gray.shape  # Get the height and width of the image.
+    # Build the pixel/link lattice.
+    lattice = np.zeros((2 * height - 1, 2 * width - 1), dtype=np.uint8)
+    lattice[::2, ::2] = 1  # Every pixel is foreground.
+    lattice[::2, 1::2] = labels[:, 1:] == labels[:, :-1]  # Horizontal links between equal neighbours.
+    lattice[1::2, ::2] = labels[1:, :] == labels[:-1, :]  # Vertical links between equal neighbours.
 
-    # Color quantization: Reduce the number of colors in the image to the specified number.
-    pixels = img_rgb.reshape(-1, 3).astype(np.float32)  # Reshape the RGB image into a list of pixels.
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)  # Set the termination criteria for the K-means algorithm.
-    # Use OpenCV's K-means algorithm for color quantization.
-    try:
-        _, labels, centers = cv2.kmeans(pixels, num_colors, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-    except Exception as e:
-        print(f"Error in cv2.kmeans: {e}")
-        print("OpenCV may not be correctly installed.  Please ensure that OpenCV is correctly installed and configured for your environment.  A common issue on Linux is missing the libGL.so.1 dependency.  This can be resolved by installing the libgl1-mesa-glx package (e.g., sudo apt-get install libgl1-mesa-glx).  If you are on a different operating system, please install the equivalent package.  If you are running in a headless environment, you may need to install a virtual display driver such as Xvfb.")
-        raise
-
-    # Convert the quantized color centers to unsigned 8-bit integers.
-    palette = centers.astype(np.uint8)
+    # Label the lattice once; label 0 is the lattice background and never lands on a pixel.
+    # Diagonal lattice neighbours always share a pixel neighbour, so 8-connectivity gives the
+    # same regions as 4-connectivity and lets OpenCV use its faster block-based scan.
+    num, lattice_ids, stats, centroids = cv2.connectedComponentsWithStats(lattice, connectivity=8, ltype=cv2.CV_32S)
+    ids = lattice_ids[::2, ::2] - 1  # Back to pixel resolution, regions numbered from 0.
+    num -= 1
+
+    flat_ids = ids.ravel()
+    # Area for all regions at once (the lattice area would also count the links).
+    area = np.bincount(flat_ids, minlength=num)
+    # The lattice centroid, halved, is the region centroid (links sit midway between pixels).
+    cx = centroids[1:, 0] / 2
+    cy = centroids[1:, 1] / 2
+
+    # Every region starts and ends on a pixel (even lattice cell), so halving recovers the pixel bbox.
+    lattice_stats = stats[1:]
+    bbox = np.empty((num, 4), dtype=np.int32)
+    bbox[:, 0] = lattice_stats[:, cv2.CC_STAT_LEFT] // 2
+    bbox[:, 1] = lattice_stats[:, cv2.CC_STAT_TOP] // 2
+    bbox[:, 2] = (lattice_stats[:, cv2.CC_STAT_WIDTH] + 1) // 2
+    bbox[:, 3] = (lattice_stats[:, cv2.CC_STAT_HEIGHT] + 1) // 2
+
+    # The palette index of each region (all of its pixels share it).
+    color = np.empty(num, dtype=labels.dtype)
+    color[flat_ids] = labels.ravel()
+
+    return {'ids': ids, 'color': color, 'area': area, 'cx': cx, 'cy': cy, 'bbox': bbox,
+            'cells': lattice_stats[:, cv2.CC_STAT_AREA]}
+
+def _tile_slices(height, width, tile_size):
+    """Return the (rows, columns) slices of the tiles covering an image, in row-major order."""
+    return [(slice(y, min(y + tile_size, height)), slice(x, min(x + tile_size, width)))
+            for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+
+def _merge_roots(pairs):
+    """
+    Union-find, all at once: join the two elements of every row of `pairs`.
+
+    Every round hooks the larger of the two roots of each pair under the smaller one, then
+    points every element at its root (pointer jumping), until every pair shares a root.
+
+    Returns:
+        tuple: (elements, roots): the sorted elements that appear in a pair, and the root of
+               each, the smallest element of its set.
+    """
+    elements, pairs = np.unique(pairs, return_inverse=True)
+    pairs = pairs.reshape(-1, 2)
+    parent = np.arange(len(elements))
+    while True:
+        a, b = parent[pairs[:, 0]], parent[pairs[:, 1]]
+        if np.array_equal(a, b):
+            # Elements are numbered in increasing order, so the smallest is the root.
+            return elements, elements[parent]
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+def label_regions_tiled(labels, tile_size=TILE_SIZE, executor=None):
+    """
+    Find every connected region of a label map tile by tile, as `label_regions` does.
+
+    Each tile is labelled on its own (in parallel when an executor is given), so the
+    lattice only ever holds one tile. Regions that cross a tile seam are then stitched: the
+    regions of two tiles whose pixels face each other across the seam with the same label are
+    one region (see `_merge_roots`). The result holds the same regions with the same
+    statistics as `label_regions`, numbered differently.
+
+    Args:
+        labels (np.ndarray): An (H, W) uint8 map of palette indices.
+        tile_size (int, optional): The tile side in pixels. Defaults to TILE_SIZE.
+        executor (concurrent.futures.Executor, optional): The pool the tiles are labelled in.
+            Defaults to labelling them one after another.
+
+    Returns:
+        dict: The same keys as `label_regions`.
+    """
+    height, width = labels.shape
+    tiles = _tile_slices(height, width, tile_size)
+    if len(tiles) == 1:
+        return label_regions(labels)
+    tile_regions = list((executor.map if executor is not None else map)(lambda tile: label_regions(labels[tile]), tiles))
+
+    # Number the regions of all tiles in one sequence.
+    sizes = [len(regions['area']) for regions in tile_regions]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    columns = -(-width // tile_size)
+    number = lambda index, ids: ids + offsets[index]
+
+    # Pairs of regions facing each other across a seam with the same label, and the position
+    # of the lattice link between them.
+    pairs, link_x, link_y = [], [], []
+    for index, (rows, cols) in enumerate(tiles):
+        col = index % columns
+        if col + 1 < columns:  # Vertical seam with the tile to the right.
+            same = labels[rows, cols.stop - 1] == labels[rows, cols.stop]
+            pairs.append(np.stack([number(index, tile_regions[index]['ids'][:, -1][same]),
+                                   number(index + 1, tile_regions[index + 1]['ids'][:, 0][same])], axis=1))
+            link_y.append(np.flatnonzero(same) + rows.start)
+            link_x.append(np.full(len(link_y[-1]), cols.stop - 0.5))
+        if index + columns < len(tiles):  # Horizontal seam with the tile below.
+            same = labels[rows.stop - 1, cols] == labels[rows.stop, cols]
+            pairs.append(np.stack([number(index, tile_regions[index]['ids'][-1][same]),
+                                   number(index + columns, tile_regions[index + columns]['ids'][0][same])], axis=1))
+            link_x.append(np.flatnonzero(same) + cols.start)
+            link_y.append(np.full(len(link_x[-1]), rows.stop - 0.5))
+    pairs = np.concatenate(pairs)
+    link_x, link_y = np.concatenate(link_x), np.concatenate(link_y)
+    joined, roots = _merge_roots(pairs)
+    # The regions are the pieces that are not joined to a smaller one, numbered in order.
+    is_region = np.ones(int(np.sum(sizes)), dtype=bool)
+    is_region[joined] = joined == roots
+    merged = (np.cumsum(is_region, dtype=np.int32) - 1)
+    merged[joined] = merged[roots]
+
+    # Global region map, written tile by tile.
+    ids = np.empty((height, width), dtype=np.int32)
+    def relabel(index):
+        ids[tiles[index]] = merged[offsets[index]:offsets[index] + sizes[index]][tile_regions[index]['ids']]
+    list((executor.map if executor is not None else map)(relabel, range(len(tiles))))
+
+    # The statistics of every piece, in image coordinates.
+    area = np.concatenate([regions['area'] for regions in tile_regions])
+    cells = np.concatenate([regions['cells'] for regions in tile_regions]).astype(np.float64)
+    cx = np.concatenate([regions['cx'] + cols.start for regions, (_, cols) in zip(tile_regions, tiles)])
+    cy = np.concatenate([regions['cy'] + rows.start for regions, (rows, _) in zip(tile_regions, tiles)])
+    boxes = np.concatenate([regions['bbox'] + np.array([cols.start, rows.start, 0, 0], dtype=np.int32)
+                            for regions, (rows, cols) in zip(tile_regions, tiles)])
+    color = np.concatenate([regions['color'] for regions in tile_regions])
+
+    # Merge the pieces of the regions that cross a seam into their root piece. The centroid
+    # averages the lattice cells of the pieces and the links across the seams, as it does
+    # for the whole image.
+    _, group = np.unique(roots, return_inverse=True)
+    link = np.searchsorted(joined, pairs[:, 0])
+    group_cells = np.bincount(group, weights=cells[joined]) + np.bincount(group[link], minlength=group.max() + 1)
+    group_x = np.bincount(group, weights=cells[joined] * cx[joined]) + np.bincount(group[link], weights=link_x)
+    group_y = np.bincount(group, weights=cells[joined] * cy[joined]) + np.bincount(group[link], weights=link_y)
+    group_area = np.bincount(group, weights=area[joined])
+    # Boxes as (left, top, right, bottom) while they are merged.
+    boxes[:, 2:] += boxes[:, :2]
+    for column, reduce in ((0, np.minimum), (1, np.minimum), (2, np.maximum), (3, np.maximum)):
+        extent = boxes[joined, column]
+        reduce.at(extent, np.searchsorted(joined, roots), boxes[joined, column])
+        boxes[joined, column] = extent
+    boxes[:, 2:] -= boxes[:, :2]
+    root = joined[joined == roots]
+    area[root] = group_area
+    cells[root] = group_cells
+    cx[root] = group_x / group_cells
+    cy[root] = group_y / group_cells
+
+    return {'ids': ids, 'color': color[is_region], 'area': area[is_region], 'cx': cx[is_region], 'cy': cy[is_region],
+            'bbox': boxes[is_region],
+            'cells': cells[is_region].astype(np.int64)}
+
+def _upscale_contour(contour, factor, grow):
+    """
+    Map a contour traced on a map downsampled by `factor` back to image coordinates.
+
+    Each vertex goes to the pixel it was sampled from, then `grow` pixels out of the polygon
+    along the mitred vertex normal (into it when negative): the region's true boundary lies between
+    its outermost sample and the next one.
+    """
+    points = contour.reshape(-1, 2).astype(np.float64)
+    # Unit right-hand normal (dy, -dx) of the edge leaving each vertex; it points out of a
+    # polygon with a positive oriented area.
+    edge = np.roll(points, -1, axis=0) - points
+    length = np.hypot(edge[:, 0], edge[:, 1])
+    length[length == 0] = 1
+    normal = np.stack([edge[:, 1], -edge[:, 0]], axis=1) / length[:, None]
+    # Mitre at each vertex, between the normals of the edges entering and leaving it (limited
+    # to twice the offset at sharp turns).
+    mitre = normal + np.roll(normal, 1, axis=0)
+    scale = np.maximum((mitre ** 2).sum(axis=1), 0.5)
+    grow = grow * np.sign(cv2.contourArea(contour, oriented=True))
+    upscaled = points * factor + grow * 2 * mitre / scale[:, None]
+    return np.rint(upscaled).astype(np.int32).reshape(-1, 1, 2)
+
+def trace_region(ids, region_id, bbox):
+    """
+    Trace the outer boundary of one region of a region map.
+
+    Only the region's bounding box is scanned, so tracing cost is proportional to the
+    region size rather than the image size.
+
+    Args:
+        ids (np.ndarray): The (H, W) region map returned by `label_regions`.
+        region_id (int): The region to trace.
+        bbox (array-like): The region's (x, y, w, h) bounding box.
+
+    Returns:
+        np.ndarray: The contour in image coordinates, in `cv2.findContours` format.
+    """
+    x, y, w, h = (int(v) for v in bbox)
+    mask = (ids[y:y + h, x:x + w] == region_id).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+    # A 4-connected region has exactly one outer boundary.
+    return contours[0]
+
+def trace_region_holes(ids, region_id, bbox, min_area=20):
+    """
+    Trace the outer boundary and the holes of one region of a region map.
+
+    The full two-level contour tree of the region's bounding box gives the holes. For each
+    hole, the regions inside it that touch its boundary are found; when there is exactly one,
+    that region fills the hole up to its boundary (anything else in the hole lies inside it).
+
+    Args:
+        ids (np.ndarray): The (H, W) region map returned by `label_regions`.
+        region_id (int): The region to trace.
+        bbox (array-like): The region's (x, y, w, h) bounding box.
+        min_area (float, optional): The smallest hole area traced. Defaults to 20.
+
+    Returns:
+        tuple: (outer, holes): the outer contour in image coordinates, in `cv2.findContours`
+               format, and a list of (hole contour, content region) pairs, with -1 as the
+               content of a hole touched by several regions.
+    """
+    x, y, w, h = (int(v) for v in bbox)
+    window = ids[y:y + h, x:x + w]
+    mask = (window == region_id).astype(np.uint8)
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    # Top-level contours have no parent; a 4-connected region has exactly one outer boundary.
+    parent = hierarchy[0, :, 3]
+    outer = contours[int(np.flatnonzero(parent < 0)[0])]
+
+    holes = []
+    inner = [c for c, p in zip(contours, parent) if p >= 0 and cv2.contourArea(c) >= min_area]
+    if inner:
+        # Pixels next to the region, for the regions touching each hole's boundary.
+        border = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))) & (1 - mask)
+        for contour in inner:
+            filled = np.zeros_like(mask)
+            cv2.drawContours(filled, [contour], -1, 1, -1)
+            touching = np.unique(window[(filled & border).astype(bool)])
+            holes.append((contour + np.array([x, y], dtype=contour.dtype), int(touching[0]) if len(touching) == 1 else -1))
+    return outer + np.array([x, y], dtype=outer.dtype), holes
+
+def _punch_holes(regions, feature_regions, candidates, order):
+    """
+    Choose the holes to cut out of features, and the features they make redundant.
+
+    A feature X drawn without holes covers the regions inside them, which are painted back on
+    top. Hole h of X, filled by the single feature Y, can be cut out instead when what shows
+    through it has Y's color: X must be the content of a hole of a feature P with Y's color
+    that is drawn before X. Y is then dropped. Features are visited in paint order; a feature
+    is only dropped if it has no holes of its own, and a dropped feature cuts no holes.
+
+    Args:
+        regions (dict): The output of `label_regions`.
+        feature_regions (np.ndarray): (n,) region of each feature.
+        candidates (list): Per feature, its (simplified hole ring, content region) pairs.
+        order (np.ndarray): The paint order of the features.
+
+    Returns:
+        tuple: (holes, dropped): per feature the list of hole rings to cut out, and the (n,)
+               bool mask of the features made redundant.
+    """
+    feature_of_region = {region: i for i, region in enumerate(feature_regions.tolist())}
+    # The region each region is the only content of a hole of, if any.
+    encloser = {content: feature_regions[i] for i, pairs in enumerate(candidates) for _, content in pairs if content >= 0}
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    color = regions['color'][feature_regions]
+
+    holes = [[] for _ in candidates]
+    dropped = np.zeros(len(candidates), dtype=bool)
+    for i in order.tolist():
+        parent = feature_of_region.get(encloser.get(int(feature_regions[i]), -1))
+        if dropped[i] or parent is None or dropped[parent] or rank[parent] > rank[i]:
+            continue
+        for ring, content in candidates[i]:
+            inside = feature_of_region.get(content)
+            if inside is None or dropped[inside] or holes[inside] or color[inside] != color[parent]:
+                continue
+            holes[i].append(ring)
+            dropped[inside] = True
+    return holes, dropped
+
+def _fit_shapes(contours, polygons, colors, hex_colors):
+    """
+    Fit a primitive to every traced contour (see `PrimitiveFitter.fit_primitive`).
+
+    Returns:
+        tuple: (shape, shape_params) arrays for `FeatureTable.from_contours`.
+    """
+    shape = np.zeros(len(contours), dtype=np.int8)
+    shape_params = np.zeros((len(contours), 5), dtype=np.float32)
+    for i, (contour, polygon, color) in enumerate(zip(contours, polygons, colors)):
+        kind, params = fit_primitive(contour, hex_colors[color], polygon=polygon)
+        if params is not None:
+            shape[i] = kind
+            shape_params[i] = params
+    return shape, shape_params
+
+def _extract_features_masks(labels, palette, width, height, primitives=False,
+                            epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA):
+    """
+    Extract features with one color mask and one contour search per palette color.
+
+    This is the original extraction engine, kept for comparison.
+    """
     # Create the quantized image using the quantized color centers and labels.
-    quantized = palette[labels.flatten()].reshape(img_rgb.shape)
+    quantized = palette[labels.ravel()].reshape(height, width, 3)
 
-    hierarchical_features = []  # Initialize an empty list to store the hierarchical features.
+    # Per-feature columns, filled color by color and turned into a FeatureTable at the end.
+    feature_contours, feature_colors, feature_areas, feature_importance = [], [], [], []
+    traced_contours = []  # Full contours, kept for primitive fitting.
 
     # Sort colors by frequency.
     unique_labels, counts = np.unique(labels, return_counts=True)  # Count the occurrences of each color label.
-    sorted_indices = np.argsort(-counts)  # Get the indices of the colors sorted in descending order of frequency.
-    sorted_colors = [palette[i] for i in sorted_indices]  # Get the sorted list of colors.
+    sorted_indices = unique_labels[np.argsort(-counts)]  # Get the labels of the colors sorted in descending order of frequency.
 
     # Calculate the center point of the image, used for importance calculations later.
     center_x, center_y = width / 2, height / 2
 
     # Iterate over the sorted colors.
-    for color in sorted_colors:
+    for color_index in sorted_indices:
+        color = palette[color_index]
         # Create a color mask for the current color.
         color_mask = cv2.inRange(quantized, color, color)
 
@@ -90,15 +440,10 @@ def extract_features_by_scale(img_np, num_colors=16):
         # Sort the contours by area (largest first).
         contours = sorted(contours, key=cv2.contourArea, reverse=True)
 
-        # Convert the RGB color to a compressed hexadecimal format.
-        hex_color = compress_hex_color(f'#{color[0]:02x}{color[1]:02x}{color[2]:02x}')
-
-        color_features = []  # Store the features for the current color
-
         # Iterate over the contours of the current color.
         for contour in contours:
             area = cv2.contourArea(contour)
-            if area < 20:  # Skip very small contours.
+            if area < min_contour_area:  # Skip very small contours.
                 continue
 
             # Calculate the center of the contour.
@@ -112,12 +457,9 @@ def extract_features_by_scale(img_np, num_colors=16):
             dist_from_center = np.sqrt(((cx - center_x) / width) ** 2 + ((cy - center_y) / height) ** 2)
 
             # Simplify the contour, reducing the number of points.
-            epsilon = 0.02 * cv2.arcLength(contour, True)  # A smaller epsilon value preserves more detail
+            epsilon = epsilon_factor * cv2.arcLength(contour, True)  # A smaller epsilon value preserves more detail
             approx = cv2.approxPolyDP(contour, epsilon, True)
 
-            # Convert the contour points to a string format.
-            points = " ".join([f"{pt[0][0]:.1f},{pt[0][1]:.1f}" for pt in approx])
-
             # Calculate the importance of the contour.
             importance = (
                 area * # Contour area
@@ -125,189 +467,933 @@ def extract_features_by_scale(img_np, num_colors=16):
                 (1 / (len(approx) + 1))  # Contour complexity (fewer points is more important)
             )
 
-            color_features.append({
-                'points': points,
-                'color': hex_color,
-                'area': area,
-                'importance': importance,
-                'point_count': len(approx),
-                'original_contour': approx  # Save the original contour for later adaptive simplification
-            })
+            feature_contours.append(approx)  # Keep the simplified contour for adaptive simplification
+            feature_colors.append(color_index)
+            feature_areas.append(area)
+            feature_importance.append(importance)
+            if primitives:
+                traced_contours.append(contour)
+
+    hex_colors = [compress_hex_color(f'#{c[0]:02x}{c[1]:02x}{c[2]:02x}') for c in palette]
+    shapes = _fit_shapes(traced_contours, feature_contours, feature_colors, hex_colors) if primitives else (None, None)
+    features = FeatureTable.from_contours(feature_contours, feature_colors, feature_areas, feature_importance, palette, hex_colors, *shapes)
+
+    # Sort all the features by overall importance.
+    return features.sorted_by_importance()
+
+def _extract_features_components(labels, palette, width, height, primitives=False, holes=False,
+                                 regions=None, executor=None, tile_size=TILE_SIZE,
+                                 epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA,
+                                 traced=None):
+    """
+    Extract features from a single connected-component pass over the label map.
+
+    Area and centroid come from the component statistics for every region at once, so
+    only the regions that survive the area filter are traced. With `holes`, the holes of
+    every region are traced too and cut out where that makes a feature redundant (see
+    `_punch_holes`). Given an executor, the regions are traced in parallel, in one batch per
+    `tile_size` tile (the tile their bounding box starts in). Given a `traced` dict, the
+    contours are kept there by region, so calls with the same `regions` and other
+    simplification settings only trace the regions no earlier call traced.
+    """
+    if regions is None:
+        regions = label_regions(labels)
+
+    # Drop small regions before any tracing. The pixel count is an upper bound on the
+    # contour area, so this never drops a region the contour-area test below would keep.
+    survivors = np.flatnonzero(regions['area'] >= min_contour_area)
+    # Visit the biggest regions first so ties keep the original largest-first order.
+    survivors = survivors[np.argsort(-regions['area'][survivors], kind='stable')]
+
+    feature_regions, feature_contours, feature_areas = [], [], []
+    traced_contours = []  # Full contours, kept for primitive fitting.
+    hole_candidates = []
+    def trace(region_id):
+        # Which holes are traced depends on the minimum area, so they are kept per area.
+        key = (region_id, min_contour_area) if holes else region_id
+        if traced is not None and key in traced:
+            return traced[key]
+        if holes:
+            result = trace_region_holes(regions['ids'], region_id, regions['bbox'][region_id], min_contour_area)
+        else:
+            result = trace_region(regions['ids'], region_id, regions['bbox'][region_id]), None
+        if traced is not None:
+            traced[key] = result
+        return result
+
+    if executor is None:
+        results = map(trace, survivors)
+    else:
+        # One batch per tile, traced in parallel; the results go back into survivor order.
+        bbox = regions['bbox'][survivors]
+        tile = (bbox[:, 1] // tile_size) * -(-width // tile_size) + bbox[:, 0] // tile_size
+        batches = [survivors[tile == number] for number in np.unique(tile)]
+        results = [None] * len(survivors)
+        position = {region_id: i for i, region_id in enumerate(survivors.tolist())}
+        for batch, batch_results in zip(batches, executor.map(lambda batch: [trace(r) for r in batch], batches)):
+            for region_id, result in zip(batch.tolist(), batch_results):
+                results[position[region_id]] = result
+
+    for region_id, (contour, region_holes) in zip(survivors, results):
+        area = cv2.contourArea(contour)
+        if area < min_contour_area:  # Skip very small contours.
+            continue
+
+        # Simplify the contour, reducing the number of points.
+        epsilon = epsilon_factor * cv2.arcLength(contour, True)  # A smaller epsilon value preserves more detail
+        feature_contours.append(cv2.approxPolyDP(contour, epsilon, True))
+        feature_regions.append(region_id)
+        feature_areas.append(area)
+        if primitives:
+            traced_contours.append(contour)
+        if holes:
+            # Holes wind against the outer boundary, so the nonzero fill rule leaves them empty.
+            orientation = cv2.contourArea(contour, oriented=True) > 0
+            rings = []
+            for hole, content in region_holes:
+                ring = cv2.approxPolyDP(hole, epsilon_factor * cv2.arcLength(hole, True), True)
+                if len(ring) >= 3:
+                    rings.append((ring if (cv2.contourArea(ring, oriented=True) > 0) != orientation else ring[::-1], content))
+            hole_candidates.append(rings)
+
+    feature_regions = np.asarray(feature_regions, dtype=np.intp)
+    feature_areas = np.asarray(feature_areas, dtype=np.float64)
+    point_counts = np.fromiter((len(c) for c in feature_contours), dtype=np.float64, count=len(feature_contours))
+
+    # Distance from the region centroid to the image center, normalized.
+    center_x, center_y = width / 2, height / 2
+    dist_from_center = np.sqrt(((regions['cx'][feature_regions] - center_x) / width) ** 2 +
+                               ((regions['cy'][feature_regions] - center_y) / height) ** 2)
+
+    # Calculate the importance of every contour at once.
+    importance = feature_areas * (1 - dist_from_center) / (point_counts + 1)
 
-        # Sort the features of the current color by importance.
-        color_features.sort(key=lambda x: x['importance'], reverse=True)
-        hierarchical_features.extend(color_features)  # Add the current color's features to the total list.
+    hex_colors = [compress_hex_color(f'#{c[0]:02x}{c[1]:02x}{c[2]:02x}') for c in palette]
+    feature_colors = regions['color'][feature_regions]
+    shapes = _fit_shapes(traced_contours, feature_contours, feature_colors, hex_colors) if primitives else (None, None)
+    if not holes:
+        features = FeatureTable.from_contours(feature_contours, feature_colors, feature_areas, importance, palette, hex_colors, *shapes)
+        # Sort all the features by overall importance.
+        return features.sorted_by_importance()
+
+    feature_holes, dropped = _punch_holes(regions, feature_regions, hole_candidates,
+                                          np.argsort(-importance, kind='stable'))
+    if primitives:
+        shapes[0][[bool(h) for h in feature_holes]] = SHAPE_POLYGON  # A primitive has no holes.
+    features = FeatureTable.from_contours(feature_contours, feature_colors, feature_areas, importance, palette, hex_colors,
+                                          *shapes, holes=feature_holes).filter(~dropped)
 
     # Sort all the features by overall importance.
-    hierarchical_features.sort(key=lambda x: x['importance'], reverse=True)
+    return features.sorted_by_importance()
+
+def _extract_features_tiled(labels, palette, width, height, primitives=False, holes=False,
+                            epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA):
+    """
+    Extract features as `_extract_features_components` does, labelling and tracing in tiles.
+
+    The label map (quantized once for the whole image, so every tile shares the palette) is
+    labelled one TILE_SIZE tile at a time and stitched across the seams (see
+    `label_regions_tiled`), then the regions are traced one batch per tile, both in a pool of
+    TILE_WORKERS threads (OpenCV releases the GIL while it labels and traces). The features are
+    the ones the 'components' engine finds, up to the order of ties.
+    """
+    with ThreadPoolExecutor(max_workers=TILE_WORKERS) as executor:
+        regions = label_regions_tiled(labels, tile_size=TILE_SIZE, executor=executor)
+        return _extract_features_components(labels, palette, width, height, primitives=primitives, holes=holes,
+                                            regions=regions, executor=executor, tile_size=TILE_SIZE,
+                                            epsilon_factor=epsilon_factor, min_contour_area=min_contour_area)
+
+def _detail_windows(labels, small, big, factor):
+    """
+    Find the windows of a label map the 'multiscale' engine extracts at full resolution.
+
+    Detail is the blocks (the `factor` x `factor` pixels each sample of `small` stands for)
+    of regions too small or thin to trace downsampled, and the blocks of more than one label
+    where the labels do not match the samples around them: something the downsampling
+    stepped over. Grown by one block, the connected groups of detail blocks give the windows (the
+    bounding box of each group), so a detail region stays within its group.
+
+    Args:
+        labels (np.ndarray): The (H, W) label map.
+        small (np.ndarray): The downsampled label map, `labels[::factor, ::factor]`.
+        big (np.ndarray): (h, w) bool map of the samples that belong to regions traced downsampled.
+        factor (int): The downsampling factor.
+
+    Returns:
+        tuple: (group, windows): the (h, w) int32 map of the group of each block (0 for none)
+               and the (x, y, w, h, group) of every window, in downsampled pixels; (None, None)
+               when detail makes up more than COARSE_MAX_DETAIL of the blocks.
+    """
+    small_height, small_width = small.shape
+    height, width = labels.shape
+    # Blocks of more than one label: the largest and smallest label of each block differ.
+    kernel = np.ones((factor, factor), dtype=np.uint8)
+    mixed = (cv2.dilate(labels, kernel, anchor=(0, 0))[::factor, ::factor] !=
+             cv2.erode(labels, kernel, anchor=(0, 0))[::factor, ::factor])
+
+    # Of those, the blocks inside a region downsampled (their four neighbouring samples share
+    # their own sample's label) hold something the downsampling stepped over.
+    around = np.pad(small, 1, mode='edge')
+    neighbours = [around[dy:dy + small_height, dx:dx + small_width] for dy, dx in ((0, 1), (2, 1), (1, 0), (1, 2))]
+    inside = np.logical_and.reduce([neighbour == small for neighbour in neighbours])
+    detail = ~big | (mixed & inside)
+    if detail.mean() > COARSE_MAX_DETAIL:
+        return None, None
+
+    # So do the blocks on a boundary between downsampled regions with a label none of the five
+    # samples around them has, such as a thin outline along the boundary.
+    by, bx = np.nonzero(mixed & ~detail)
+    blocks = np.pad(labels, ((0, small_height * factor - height), (0, small_width * factor - width)), mode='edge')
+    pixels = blocks.reshape(small_height, factor, small_width, factor)[by, :, bx, :].reshape(len(by), -1)
+    expected = np.stack([small[by, bx]] + [neighbour[by, bx] for neighbour in neighbours], axis=1)
+    detail[by, bx] = (pixels[:, :, None] != expected[:, None, :]).all(axis=2).any(axis=1)
+
+    detail = detail.astype(np.uint8)
+    detail = cv2.dilate(detail, np.ones((3, 3), dtype=np.uint8))
+    num, group, stats, _ = cv2.connectedComponentsWithStats(detail, connectivity=8, ltype=cv2.CV_32S)
+    # Component 0 is the background (no detail) unless every block is detail.
+    first = 1 if detail.min() == 0 else 0
+    return group, [(*box, number) for number, box in enumerate(stats[:num, :4].tolist()) if number >= first]
+
+def _extract_features_multiscale(labels, palette, width, height, primitives=False,
+                                 epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA):
+    """
+    Extract features coarse to fine: large regions downsampled, small details at full resolution.
+
+    The label map is sampled every 2 pixels (every 4 from COARSE_4X_SIDE) and labelled and
+    traced at that scale; the regions there that are large and wide enough (see
+    COARSE_MIN_AREA and COARSE_MIN_WIDTH) become features, their contours scaled back up.
+    Only the windows around the rest (see `_detail_windows`) are labelled and traced again at
+    full resolution, keeping the regions that do not belong to a downsampled feature (hold
+    none of its samples) and stay within their window's group of blocks. Flat images, where
+    large regions make up most of the pixels, label and trace far fewer pixels; when the
+    windows cover more than COARSE_MAX_DETAIL of the image, it is extracted at full
+    resolution by `_extract_features_components` instead, as are images with a side shorter
+    than COARSE_MIN_SIDE. Regions are simplified the same way either way.
+    """
+    if min(height, width) < COARSE_MIN_SIDE:
+        return _extract_features_components(labels, palette, width, height, primitives=primitives,
+                                            epsilon_factor=epsilon_factor, min_contour_area=min_contour_area)
+
+    factor = 4 if min(height, width) >= COARSE_4X_SIDE else 2
+    small = labels[::factor, ::factor]
+    coarse = label_regions(small)
+    coarse_width = coarse['area'] / coarse['bbox'][:, 2:].max(axis=1)
+    big_regions = np.flatnonzero((coarse['area'] >= COARSE_MIN_AREA) & (coarse_width >= COARSE_MIN_WIDTH))
+    is_big = np.zeros(len(coarse['area']), dtype=bool)
+    is_big[big_regions] = True
+    big = is_big[coarse['ids']]
+
+    group, windows = _detail_windows(labels, small, big, factor)
+    if windows is None or sum(w * h for _, _, w, h, _ in windows) > COARSE_MAX_DETAIL * small.size:
+        # Detailed throughout: the windows would label most of the image a second time.
+        return _extract_features_components(labels, palette, width, height, primitives=primitives,
+                                            epsilon_factor=epsilon_factor, min_contour_area=min_contour_area)
+
+    traced_contours, feature_areas, feature_cx, feature_cy, feature_colors = [], [], [], [], []
+    for region_id in big_regions.tolist():
+        # The true boundary lies between the outermost samples and the next ones: half a block out
+        # covers the region as tracing it at full resolution does.
+        contour = _upscale_contour(trace_region(coarse['ids'], region_id, coarse['bbox'][region_id]),
+                                   factor, factor / 2)
+        traced_contours.append(contour)
+        feature_areas.append(cv2.contourArea(contour))
+        feature_cx.append(coarse['cx'][region_id] * factor + (factor - 1) / 2)
+        feature_cy.append(coarse['cy'][region_id] * factor + (factor - 1) / 2)
+        feature_colors.append(coarse['color'][region_id])
+
+    for x, y, w, h, number in windows:
+        x0, y0, x1, y1 = x * factor, y * factor, min((x + w) * factor, width), min((y + h) * factor, height)
+        regions = label_regions(labels[y0:y1, x0:x1])
+        num = len(regions['area'])
+        # Regions holding a sample of a downsampled feature are part of it.
+        samples = regions['ids'][::factor, ::factor].ravel()
+        in_big = np.bincount(samples, weights=big[y:y + h, x:x + w].ravel(), minlength=num) > 0
+        # Regions reaching blocks of other groups (or none) belong elsewhere, and regions
+        # reaching a side of the window that is not the image border run out of it.
+        member = np.repeat(np.repeat(group[y:y + h, x:x + w] == number, factor, axis=0), factor, axis=1)
+        elsewhere = np.bincount(regions['ids'][~member[:y1 - y0, :x1 - x0]], minlength=num) > 0
+        left, top = regions['bbox'][:, 0], regions['bbox'][:, 1]
+        right, bottom = left + regions['bbox'][:, 2], top + regions['bbox'][:, 3]
+        cut = (((left == 0) & (x0 > 0)) | ((top == 0) & (y0 > 0)) |
+               ((right == x1 - x0) & (x1 < width)) | ((bottom == y1 - y0) & (y1 < height)))
+        for region_id in np.flatnonzero((regions['area'] >= min_contour_area) & ~in_big & ~elsewhere & ~cut).tolist():
+            contour = trace_region(regions['ids'], region_id, regions['bbox'][region_id]) + np.array([x0, y0], dtype=np.int32)
+            area = cv2.contourArea(contour)
+            if area < min_contour_area:  # Skip very small contours.
+                continue
+            traced_contours.append(contour)
+            feature_areas.append(area)
+            feature_cx.append(regions['cx'][region_id] + x0)
+            feature_cy.append(regions['cy'][region_id] + y0)
+            feature_colors.append(regions['color'][region_id])
+
+    # Largest first, so ties keep the largest-first order of the other engines.
+    order = np.argsort(-np.asarray(feature_areas, dtype=np.float64), kind='stable').tolist()
+    traced_contours = [traced_contours[i] for i in order]
+    feature_areas = np.asarray(feature_areas, dtype=np.float64)[order]
+    feature_colors = np.asarray(feature_colors, dtype=np.uint8)[order]
+
+    # Simplify the contours, reducing the number of points.
+    feature_contours = [cv2.approxPolyDP(contour, epsilon_factor * cv2.arcLength(contour, True), True)
+                        for contour in traced_contours]
+    point_counts = np.fromiter((len(c) for c in feature_contours), dtype=np.float64, count=len(feature_contours))
+
+    # Distance from the region centroid to the image center, normalized.
+    center_x, center_y = width / 2, height / 2
+    dist_from_center = np.sqrt(((np.asarray(feature_cx)[order] - center_x) / width) ** 2 +
+                               ((np.asarray(feature_cy)[order] - center_y) / height) ** 2)
+    importance = feature_areas * (1 - dist_from_center) / (point_counts + 1)
+
+    hex_colors = [compress_hex_color(f'#{c[0]:02x}{c[1]:02x}{c[2]:02x}') for c in palette]
+    shapes = _fit_shapes(traced_contours, feature_contours, feature_colors, hex_colors) if primitives else (None, None)
+    features = FeatureTable.from_contours(feature_contours, feature_colors, feature_areas, importance, palette, hex_colors, *shapes)
+    # Sort all the features by overall importance.
+    return features.sorted_by_importance()
+
+def extract_features_by_scale(img_np, num_colors=16, engine='components', quantizer='kmeans', init_centers=None,
+                              primitives=False, gradients=False, holes=False,
+                              epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA, stats=None):
+    """
+    Extract image features hierarchically by scale.
+
+    This function segments the image into representative color regions and extracts contours
+    and other features for each region. It also sorts the features by the importance of the
+    colors in the image.
 
-    return hierarchical_features  # Return the sorted list of features.
+    Args:
+        img_np (np.ndarray): The input image, represented as a NumPy array.
+        num_colors (int, optional): The number of colors to quantize to. Defaults to 16.
+        engine (str, optional): The region extraction engine. 'components' labels every region
+            of every color in one connected-component pass and only traces the regions that
+            survive the area filter; 'multiscale' labels and traces the large regions on a 2x or
+            4x downsampled label map and only the small details at full resolution, in the
+            windows around them, on images of at least COARSE_MIN_SIDE pixels a side (see
+            `_extract_features_multiscale`); 'tiled' finds the same features as 'components',
+            labelling and tracing tile by tile in a thread pool, for large images (see
+            `_extract_features_tiled`); 'masks' runs one color mask and contour search per
+            color. Defaults to 'components'.
+        quantizer (str or ColorQuantizer, optional): The color quantization engine, see
+            `quantize_colors`. Defaults to 'kmeans'.
+        init_centers (np.ndarray, optional): A starting palette for engines that can warm-start.
+        primitives (bool, optional): Whether to fit a circle, ellipse or rotated rectangle to every
+            contour and draw the feature as that primitive when it matches (see `PrimitiveFitter`).
+            Defaults to False.
+        gradients (bool, optional): Whether to replace groups of adjacent quantized bands that form
+            a linear color ramp by one region filled with a `<linearGradient>` fitted to the
+            original pixels (see `GradientBands`). Defaults to False.
+        holes (bool, optional): Whether to trace the full contour tree of every region and cut a
+            hole out of a feature, instead of painting the region inside it back on top, where
+            the color behind it already matches (components and tiled engines only). Defaults to False.
+        epsilon_factor (float, optional): The `cv2.approxPolyDP` epsilon every contour is
+            simplified with, as a fraction of its perimeter. Defaults to SIMPLIFICATION_EPSILON.
+        min_contour_area (float, optional): Contours (and, with `holes`, holes) with a smaller area
+            are dropped. Defaults to MIN_CONTOUR_AREA.
+        stats (dict, optional): If given, receives the palette size, the number of gradients and
+            the quantize and contours stage timings (see `write_svg_array`).
 
-def simplify_polygon(points_str, simplification_level):
+    Returns:
+        FeatureTable: The extracted features, sorted by importance. Each feature has its simplified
+                      contour in the shared coordinate buffer, a palette index, an area and an
+                      importance score.
+    """
+    # Ensure the input image is in RGB format.
+    if len(img_np.shape) == 3 and img_np.shape[2] > 1:
+        img_rgb = img_np  # If it's already RGB, use it directly.
+    else:
+        img_rgb = cv2.cvtColor(img_np, cv2.COLOR_GRAY2RGB)  # Otherwise, convert it from grayscale to RGB.
+
+    height, width = img_rgb.shape[:2]  # Get the height and width of the image.
+
+    # Color quantization: Reduce the number of colors in the image to the specified number.
+    start = time.perf_counter()
+    labels, palette = quantize_colors(img_rgb, num_colors, quantizer=quantizer, init_centers=init_centers)
+    quantized = time.perf_counter()
+    palette_size = len(palette)
+
+    # Merge banded shading into gradient regions, which get palette entries of their own.
+    ramps = []
+    if gradients:
+        labels, palette, ramps = merge_gradient_bands(img_rgb, labels, palette, label_regions(labels))
+
+    features = extract_features_from_labels(labels, palette, engine=engine, primitives=primitives, holes=holes,
+                                            epsilon_factor=epsilon_factor, min_contour_area=min_contour_area)
+    for number, ramp in enumerate(ramps):
+        features.hex_colors[ramp['index']] = f'url(#g{number})'
+        features.defs[ramp['index']] = _gradient_defs(number, ramp)
+
+    if stats is not None:
+        stats['palette_size'] = palette_size
+        stats['gradients'] = len(ramps)
+        timings = stats.setdefault('timings', {})
+        timings['quantize'] = quantized - start
+        timings['contours'] = time.perf_counter() - quantized
+    return features
+
+def _gradient_defs(number, ramp):
+    """Format the `<defs>` element of gradient `number` found by `merge_gradient_bands`."""
+    (x1, y1), (x2, y2) = ramp['start'], ramp['end']
+    stops = ''.join(f'<stop offset="{offset}" stop-color="{compress_hex_color(f"#{c[0]:02x}{c[1]:02x}{c[2]:02x}")}"/>'
+                    for offset, c in zip((0, 1), ramp['stops']))
+    return (f'<defs><linearGradient id="g{number}" gradientUnits="userSpaceOnUse" '
+            f'x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}">{stops}</linearGradient></defs>')
+
+def extract_features_from_labels(labels, palette, engine='components', primitives=False, holes=False,
+                                 epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA):
+    """
+    Extract features from an already quantized image.
+
+    Args:
+        labels (np.ndarray): An (H, W) uint8 map of palette indices.
+        palette (np.ndarray): (k, 3) uint8 RGB palette.
+        engine (str, optional): The region extraction engine, 'components', 'multiscale', 'tiled'
+            or 'masks'. Defaults to 'components'.
+        primitives (bool, optional): Whether to fit primitives, see `extract_features_by_scale`. Defaults to False.
+        holes (bool, optional): Whether to cut holes, see `extract_features_by_scale`. Defaults to False.
+        epsilon_factor (float, optional): See `extract_features_by_scale`. Defaults to SIMPLIFICATION_EPSILON.
+        min_contour_area (float, optional): See `extract_features_by_scale`. Defaults to MIN_CONTOUR_AREA.
+
+    Returns:
+        FeatureTable: The extracted features, sorted by importance.
+    """
+    height, width = labels.shape
+    if holes and engine not in ('components', 'tiled'):
+        raise ValueError("Holes require the 'components' or 'tiled' extraction engine")
+    simplification = {'epsilon_factor': epsilon_factor, 'min_contour_area': min_contour_area}
+    if engine == 'components':
+        return _extract_features_components(labels, palette, width, height, primitives=primitives, holes=holes,
+                                            **simplification)
+    if engine == 'tiled':
+        return _extract_features_tiled(labels, palette, width, height, primitives=primitives, holes=holes,
+                                       **simplification)
+    if engine == 'multiscale':
+        return _extract_features_multiscale(labels, palette, width, height, primitives=primitives, **simplification)
+    if engine == 'masks':
+        return _extract_features_masks(labels, palette, width, height, primitives=primitives, **simplification)
+    raise ValueError(f"Unknown extraction engine: {engine!r}")
+
+def _format_points(points, decimals):
+    """Format an (n, 2) vertex array as a space-separated "x,y" string."""
+    if decimals == 0:
+        # Round once in NumPy; formatting Python ints is much cheaper than formatting floats.
+        return " ".join([f"{x},{y}" for x, y in np.rint(points).astype(np.int64).tolist()])
+    return " ".join([f"{x:.{decimals}f},{y:.{decimals}f}" for x, y in points.tolist()])
+
+def simplify_polygon(points, simplification_level):
     """
     Simplify a polygon by reducing coordinate precision or the number of points.
 
     Args:
-        points_str (str): A space-separated string of "x,y" coordinates.
+        points (np.ndarray or str): The polygon vertices, either as an (n, 2) array such as
+            `FeatureTable.points(i)` or as a space-separated string of "x,y" coordinates.
         simplification_level (int): The simplification level (0-3).
 
     Returns:
         str: The simplified point string.
     """
-    if simplification_level == 0:
-        return points_str  # Do not simplify.
+    if isinstance(points, str):
+        # Parse the string form once into a vertex array.
+        points = np.array(points.replace(',', ' ').split(), dtype=np.float64).reshape(-1, 2)
 
-    points = points_str.split()  # Split the string into a list of points.
-
-    if simplification_level == 1:
-        # Round the coordinates to 1 decimal place.
-        return " ".join([f"{float(p.split(',')[0]):.1f},{float(p.split(',')[1]):.1f}" for p in points])
+    if simplification_level in (0, 1):
+        # Level 0 keeps the full precision of the features (1 decimal place); level 1 rounds to it.
+        return _format_points(points, 1)
 
     elif simplification_level == 2:
         # Round the coordinates to the nearest integer.
-        return " ".join([f"{float(p.split(',')[0]):.0f},{float(p.split(',')[1]):.0f}" for p in points])
+        return _format_points(points, 0)
 
     elif simplification_level == 3:
-        # Reduce the number of points, but ensure at least 3 points are kept.
-        if len(points) <= 4:
-            # If there are 4 or fewer points, just round to integer
-            return " ".join([f"{float(p.split(',')[0]):.0f},{float(p.split(',')[1]):.0f}" for p in points])
+        # Keep approximately half the points (and the last one), rounded to integers.
+        # Polygons with 5 or fewer points keep all of them.
+        return _format_points(points[decimate_mask([len(points)])], 0)
+
+    return _format_points(points, 1)  # Return the unsimplified points if the simplification_level is invalid.
+
+def iter_feature_elements(pyramid, levels=None):
+    """
+    Yield the SVG element of every drawn feature, in importance order.
+
+    Elements are formatted lazily, so a consumer that stops early (such as `SVGWriter.write_all`
+    hitting the size limit) never formats the rest. With the compact 'path' encoding, the
+    features are grouped into path elements of one color each instead (see `SimplificationPyramid.path_elements`).
+
+    Args:
+        pyramid (SimplificationPyramid): The features and their simplification levels.
+        levels (np.ndarray, optional): The level of each feature, SKIP for features that are not
+            drawn. If None, every feature is drawn at level 0.
+
+    Yields:
+        str: One element per drawn feature.
+    """
+    if pyramid.encoding == 'path':
+        if levels is None:
+            levels = np.zeros(len(pyramid.features), dtype=np.int8)
+        yield from pyramid.path_elements(levels)
+    elif levels is None:
+        for i in range(len(pyramid.features)):
+            yield pyramid.element(i, 0)
+    else:
+        for i in np.flatnonzero(levels != SKIP):
+            yield pyramid.element(i, levels[i])
+
+def _fill_in_order(pyramid, budget):
+    """
+    Draw features at level 0 in importance order until the first one that does not fit.
+
+    This is the non-adaptive fill for the path encoding, where the fixed cost of an element is
+    paid by the feature that opens it (see `SimplificationPyramid.opens`).
+
+    Returns:
+        np.ndarray: (n,) int8 level of each feature, SKIP when it is not drawn.
+    """
+    levels = np.zeros(len(pyramid.features), dtype=np.int8)
+    return fit_budget(pyramid.cost, levels, budget, pyramid.group, pyramid.group_cost, pyramid.opens)
+
+def _pack_features(pyramid, budget, packer, keep=None):
+    """
+    Pack the features of a pyramid into `budget` bytes (see `BudgetPacker.pack_budget`).
+
+    Args:
+        pyramid (SimplificationPyramid): The features and their simplification levels.
+        budget (int): The number of bytes available for features.
+        packer (str or ResidualPacker): The solver.
+        keep (np.ndarray, optional): (n,) bool mask of the features that may be drawn. Defaults to all.
+
+    Returns:
+        np.ndarray: (n,) int8 level of each feature, SKIP when it is not drawn.
+    """
+    if not isinstance(packer, str):
+        levels = packer.pack(pyramid, budget, keep=keep)
+        if pyramid.encoding == 'path':
+            # The packer charges each color's element once; splitting colors may cost more.
+            levels = fit_budget(pyramid.cost, levels, budget, pyramid.group, pyramid.group_cost, pyramid.opens)
+        return levels
+    num_features = len(pyramid.features)
+    rows = np.arange(num_features) if keep is None else np.flatnonzero(keep)
+    importance = pyramid.features.importance[rows]
+    if pyramid.encoding == 'path':
+        def opens(packed):
+            levels = np.full(num_features, SKIP, dtype=np.int8)
+            levels[rows] = packed
+            return pyramid.opens(levels)[rows]
+
+        packed = pack_budget(pyramid.cost[rows], importance, budget, solver=packer,
+                             group=pyramid.group[rows], group_cost=pyramid.group_cost, opens=opens)
+    else:
+        packed = pack_budget(pyramid.cost[rows], importance, budget, solver=packer)
+    levels = np.full(len(pyramid.features), SKIP, dtype=np.int8)
+    levels[rows] = packed
+    return levels
+
+def _cull_occluded(pyramid, levels, budget, packer, width, height, rounds=CULL_ROUNDS):
+    """
+    Drop the drawn features that later ones hide, and give their bytes back to the packer.
+
+    The packed features are painted onto a low-resolution coverage buffer in paint order (see
+    `OcclusionCulling.visible_pixels`); those that show (almost) none of their pixels are
+    excluded and the budget is packed again without them. The new packing may hide other
+    features, so this repeats up to `rounds` times; what the last check finds is only dropped.
+
+    Args:
+        pyramid (SimplificationPyramid): The features and their simplification levels.
+        levels (np.ndarray): The packed level of each feature.
+        budget (int): The number of bytes available for features.
+        packer (str or ResidualPacker): The solver.
+        width (int): The image width.
+        height (int): The image height.
+        rounds (int, optional): The maximum number of re-packings. Defaults to CULL_ROUNDS.
+
+    Returns:
+        tuple: (levels, culled): the new levels and the number of features culled.
+    """
+    excluded = np.zeros(len(levels), dtype=bool)
+    for round_number in range(rounds + 1):
+        order = pyramid.paint_order(levels)
+        visible, covered = visible_pixels([pyramid.outline(i, levels[i]) for i in order.tolist()], width, height)
+        hidden = order[occluded(visible, covered)]
+        if len(hidden) == 0:
+            break
+        excluded[hidden] = True
+        if round_number == rounds:
+            levels = levels.copy()
+            levels[hidden] = SKIP
         else:
-            # Keep approximately half the points, but maintain at least 3
-            step = min(2, len(points) // 3)  # Calculate a suitable step size
-            reduced_points = [points[i] for i in range(0, len(points), step)]
-            # Ensure we keep at least 3 points and the last point
-            if len(reduced_points) < 3:
-                reduced_points = points[:3]
-            if points[-1] not in reduced_points:
-                reduced_points.append(points[-1])
-            return " ".join([f"{float(p.split(',')[0]):.0f},{float(p.split(',')[1]):.0f}" for p in reduced_points])
-
-    return points_str  # Return the original string if the simplification_level is invalid.
+            levels = _pack_features(pyramid, budget, packer, keep=~excluded)
+    return levels, int(excluded.sum())
 
-def bitmap_to_svg_layered(image, max_size_bytes=10000, resize=True, target_size=(384, 384),
-                         adaptive_fill=True, num_colors=None):
+def default_num_colors(width, height):
     """
-    Convert a bitmap to SVG using layered feature extraction, optimizing space usage.
+    Choose the number of quantization colors from the image size (the adaptive color selection).
 
-    This function converts a raster image (bitmap) into a scalable vector graphic (SVG) format.
-    It extracts the main features of the image and represents them as polygons in the SVG.
-    The function aims to generate the smallest possible SVG file while maintaining visual quality.
+    Args:
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        int: 8 below 256x256 pixels, 12 below 512x512 and 16 above.
+    """
+    pixel_count = width * height
+
+    if pixel_count < 65536:  # 256x256
+        return 8
+    elif pixel_count < 262144:  # 512x512
+        return 12
+    return 16
+
+def pixel_array(image):
+    """
+    View an array-like input as (H, W, 3) or (H, W) pixels without copying.
+
+    NumPy arrays and buffer-protocol objects are taken as they are. Tensors (anything with
+    `detach`, `cpu` and `numpy`, such as a torch tensor) are moved to the CPU first, which is
+    free for CPU tensors. A leading batch dimension of 1 is dropped, and float arrays with 1
+    or 3 leading channels (CHW) are transposed to a (H, W, C) view.
+    """
+    if all(hasattr(image, name) for name in ('detach', 'cpu', 'numpy')):
+        tensor = image.detach().cpu()
+        if str(tensor.dtype) == 'torch.bfloat16':
+            tensor = tensor.float()  # NumPy has no bfloat16.
+        image = tensor.numpy()
+    pixels = np.asarray(image)
+    if pixels.ndim == 4 and pixels.shape[0] == 1:
+        pixels = pixels[0]
+    if pixels.dtype.kind == 'f':
+        if pixels.ndim == 3 and pixels.shape[0] in (1, 3) and pixels.shape[2] not in (1, 3):
+            pixels = pixels.transpose(1, 2, 0)
+        if pixels.dtype not in (np.float32, np.float64):
+            pixels = pixels.astype(np.float32)  # OpenCV works on float32 and float64 only.
+    if pixels.ndim == 3 and pixels.shape[2] == 1:
+        pixels = pixels[:, :, 0]
+    if (pixels.dtype != np.uint8 and pixels.dtype.kind != 'f') or pixels.ndim not in (2, 3) or \
+            (pixels.ndim == 3 and pixels.shape[2] != 3):
+        raise ValueError(f"Expected a PIL image, an (H, W, 3) uint8 array or a (3, H, W) float tensor, "
+                         f"got {pixels.dtype} {pixels.shape}")
+    return pixels
+
+def prepare_image(image, resize=True, target_size=(384, 384)):
+    """
+    Resize a bitmap (if requested) and convert it to a NumPy array.
+
+    Besides PIL images, the input can be an (H, W, 3) uint8 array (or any buffer-protocol
+    object NumPy reads as one) or a (3, H, W) float tensor with values in [0, 1] or, when
+    any value is negative, [-1, 1] (e.g. VAE-decoded images), see `pixel_array`.
+    Arrays are never turned into PIL images: an unresized uint8 array is used in place, and
+    otherwise one OpenCV resize (area averaging when shrinking, Lanczos when enlarging) and
+    one saturating conversion to uint8 produce the pixel array.
 
     Args:
-        image (PIL.Image): The input image (a PIL.Image object).
-        max_size_bytes (int, optional): The maximum size of the SVG file in bytes. Defaults to 10000.
-        resize (bool, optional): Whether to resize the image before processing. Defaults to True.
+        image (PIL.Image or array-like): The input image.
+        resize (bool, optional): Whether to resize the image. Defaults to True.
         target_size (tuple, optional): The target size for resizing (width, height). Defaults to (384, 384).
-        adaptive_fill (bool, optional): Whether to adaptively fill the available space. Defaults to True.
-        num_colors (int, optional): The number of colors to quantize to. If None, uses adaptive selection.
 
     Returns:
-        str: The SVG string representation.
+        tuple: (img_np, original_size) where img_np is the pixel array to vectorize and
+               original_size is the (width, height) of the input, used for the SVG size.
+    """
+    if isinstance(image, Image.Image):
+        original_size = image.size  # Save the original dimensions
+        # Resize the image if needed.
+        if resize:
+            image = image.resize(target_size, Image.LANCZOS)  # Use a high-quality LANCZOS filter.
+        # Convert the PIL Image to a NumPy array.
+        return np.array(image), original_size
+
+    pixels = pixel_array(image)
+    height, width = pixels.shape[:2]
+    original_size = (width, height)
+    if resize and (width, height) != tuple(target_size):
+        shrinking = target_size[0] <= width and target_size[1] <= height
+        interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+        if pixels.dtype == np.uint8:
+            return cv2.resize(pixels, tuple(target_size), interpolation=interpolation), original_size
+        # Resize in float so the values are only rounded once, below.
+        resized = cv2.resize(pixels, tuple(target_size), interpolation=interpolation)
+    elif pixels.dtype == np.uint8:
+        return np.ascontiguousarray(pixels), original_size
+    else:
+        resized = pixels
+
+    # Map [low, 1] to [0, 255], rounding and saturating into uint8 in one pass. The range is
+    # read from the input, which a Lanczos overshoot cannot make negative.
+    low = -1.0 if pixels.min() < 0 else 0.0
+    scale = 255 / (1 - low)
+    return cv2.addWeighted(resized, scale, resized, 0, -low * scale, dtype=cv2.CV_8U), original_size
+
+def write_svg_layered(image, fp, max_size_bytes=10000, resize=True, target_size=(384, 384),
+                      adaptive_fill=True, num_colors=None, packer='dp', quantizer='kmeans', seed=None,
+                      encoding='polygon', primitives=False, gradients=False, holes=False, cull=False,
+                      engine='components', epsilon_factor=SIMPLIFICATION_EPSILON,
+                      min_contour_area=MIN_CONTOUR_AREA, stats=None):
+    """
+    Convert a bitmap to SVG and stream the document into a binary file object.
+
+    This is `bitmap_to_svg_layered` writing to `fp` (an `io.BytesIO` or a file opened in binary
+    mode) instead of returning a string, so batch jobs can write thousands of SVGs to disk
+    without building each document in memory first. See `bitmap_to_svg_layered` for the
+    arguments and `write_svg_array` for `stats`.
+
+    Returns:
+        int: The number of bytes written.
     """
+    start = time.perf_counter()
+    img_np, original_size = prepare_image(image, resize=resize, target_size=target_size)
+    if stats is not None:
+        stats.setdefault('timings', {})['prepare'] = time.perf_counter() - start
+    return write_svg_array(img_np, fp, original_size=original_size, max_size_bytes=max_size_bytes,
+                           adaptive_fill=adaptive_fill, num_colors=num_colors, packer=packer,
+                           quantizer=quantizer, seed=seed, encoding=encoding, primitives=primitives,
+                           gradients=gradients, holes=holes, cull=cull, engine=engine,
+                           epsilon_factor=epsilon_factor, min_contour_area=min_contour_area, stats=stats)
+
+def write_svg_array(img_np, fp, original_size=None, max_size_bytes=10000, adaptive_fill=True,
+                    num_colors=None, packer='dp', quantizer='kmeans', seed=None, encoding='polygon',
+                    primitives=False, gradients=False, holes=False, cull=False, engine='components',
+                    epsilon_factor=SIMPLIFICATION_EPSILON, min_contour_area=MIN_CONTOUR_AREA, stats=None):
+    """
+    Convert an already prepared pixel array (see `prepare_image`) to SVG, writing into `fp`.
+
+    Args:
+        img_np (np.ndarray): The pixel array to vectorize, at its final processing size.
+        fp (file object): A binary stream to write to.
+        original_size (tuple, optional): The (width, height) written as the SVG size. Defaults to
+            the array size.
+        stats (dict, optional): If given, filled with a report of the conversion:
+            'timings' (seconds per stage: 'prepare' when the image was prepared here too,
+            'quantize', 'contours', 'simplify', 'pack' and 'serialize'), 'num_colors' (requested),
+            'palette_size', 'gradients' (gradient regions found), 'features' (extracted), 'drawn', 'dropped', 'levels' (number of
+            features emitted at each simplification level), 'bytes', 'max_size_bytes',
+            'available_bytes' (budget for features), 'utilization' (percent of max_size_bytes)
+            and 'fallback' (True when only the background could be written), plus 'culled'
+            (occluded features dropped) with `cull`.
+        See `bitmap_to_svg_layered` for the other arguments.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    # Get the image dimensions.
+    height, width = img_np.shape[:2]
+    if original_size is None:
+        original_size = (width, height)
+
     # Adaptive color selection: Choose the number of colors based on image complexity.
     if num_colors is None:
-        if resize:
-            pixel_count = target_size[0] * target_size[1]
-        else:
-            pixel_count = image.size[0] * image.size[1]
+        num_colors = default_num_colors(width, height)
+
+    svg_base, svg_footer, avg_bg_color, bg_hex_color = svg_frame(img_np, original_size)
+
+    # Calculate the base SVG size.
+    base_size = len((svg_base + svg_footer).encode('utf-8'))
+    available_bytes = max_size_bytes - base_size  # Calculate the bytes available for adding features.
+
+    # Extract the image features and precompute their simplification levels.
+    features = extract_features_by_scale(img_np, num_colors=num_colors, engine=engine,
+                                         quantizer=get_quantizer(quantizer, seed=seed), primitives=primitives,
+                                         gradients=gradients, holes=holes, epsilon_factor=epsilon_factor,
+                                         min_contour_area=min_contour_area, stats=stats)
+    start = time.perf_counter()
+    pyramid = SimplificationPyramid(features, encoding=encoding)
+    simplified = time.perf_counter()
 
-        if pixel_count < 65536:  # 256x256
-            num_colors = 8
-        elif pixel_count < 262144:  # 512x512
-            num_colors = 12
+    writer = SVGWriter(fp, max_size_bytes=max_size_bytes, footer=svg_footer)
+
+    # If not using adaptive fill, add features until the size limit is reached.
+    # The writer tracks the running size, so each candidate costs only its own bytes.
+    if not adaptive_fill:
+        writer.begin(svg_base)
+        if encoding == 'path':
+            levels = _fill_in_order(pyramid, available_bytes)
+            writer.write_all(iter_feature_elements(pyramid, levels))
         else:
-            num_colors = 16
+            drawn = writer.write_all(iter_feature_elements(pyramid))
+            levels = np.full(len(features), SKIP, dtype=np.int8)
+            levels[:drawn] = 0
+        size = writer.close()
+        if stats is not None:
+            _record_stats(stats, features, levels, num_colors, size, max_size_bytes, available_bytes,
+                          {'simplify': simplified - start, 'pack': 0.0,
+                           'serialize': time.perf_counter() - simplified})
+        return size
 
-    # Resize the image if needed.
-    if resize:
-        original_size = image.size  # Save the original dimensions
-        image = image.resize(target_size, Image.LANCZOS)  # Use a high-quality LANCZOS filter.
+    # Use adaptive fill: choose a simplification level (or skip) for every feature so the
+    # total importance drawn is maximal within the byte budget. The byte size of every
+    # feature at every level comes from the pyramid, without formatting. With the path
+    # encoding, each path element is a fixed cost shared by the features it holds.
+    levels, culled = select_levels(pyramid, available_bytes, packer=packer, img_np=img_np,
+                                   background=avg_bg_color, cull=cull)
+    packed = time.perf_counter()
+
+    final_size = base_size + packed_size(pyramid.cost, levels, pyramid.group, pyramid.group_cost, pyramid.opens)
+    fallback = final_size > max_size_bytes
+    if fallback:
+        # If the limit is exceeded, write a basic SVG
+        writer = SVGWriter(fp, footer='</svg>')
+        writer.begin(f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}"><rect width="{width}" height="{height}" fill="{bg_hex_color}"/>')
+        levels = np.full(len(features), SKIP, dtype=np.int8)
     else:
-        original_size = image.size
-    # Convert the PIL Image to a NumPy array.
-    img_np = np.array(image)
+        # Emit the chosen features in importance order and assemble the document with one join.
+        writer.begin(''.join([svg_base, *iter_feature_elements(pyramid, levels)]))
+    size = writer.close()
 
-    # Get the image dimensions.
+    if stats is not None:
+        _record_stats(stats, features, levels, num_colors, size, max_size_bytes, available_bytes,
+                      {'simplify': simplified - start, 'pack': packed - simplified,
+                       'serialize': time.perf_counter() - packed}, fallback=fallback)
+        if cull:
+            stats['culled'] = culled
+    return size
+
+def svg_frame(img_np, original_size=None):
+    """
+    Build the part of the SVG document every conversion of `img_np` starts and ends with.
+
+    Args:
+        img_np (np.ndarray): The pixel array being vectorized, at its final processing size.
+        original_size (tuple, optional): The (width, height) written as the SVG size. Defaults to
+            the array size.
+
+    Returns:
+        tuple: (svg_base, svg_footer, background, background_hex): the header and background
+               rectangle, the closing tag, and the background color as RGB and as a hex string.
+    """
     height, width = img_np.shape[:2]
+    if original_size is None:
+        original_size = (width, height)
 
     # Calculate the average background color.
     if len(img_np.shape) == 3 and img_np.shape[2] == 3:
         avg_bg_color = np.mean(img_np, axis=(0, 1)).astype(int)
         bg_hex_color = compress_hex_color(f'#{avg_bg_color[0]:02x}{avg_bg_color[1]:02x}{avg_bg_color[2]:02x}')
     else:
+        avg_bg_color = np.array([255, 255, 255])
         bg_hex_color = '#fff'  # Default background color is white
 
-    # Start building the SVG string.
     # Use the original dimensions in the viewBox for proper scaling when displayed.
     orig_width, orig_height = original_size
     svg_header = f'<svg xmlns="http://www.w3.org/2000/svg" width="{orig_width}" height="{orig_height}" viewBox="0 0 {width} {height}">\n'
     svg_bg = f'<rect width="{width}" height="{height}" fill="{bg_hex_color}"/>\n'  # Background rectangle
-    svg_base = svg_header + svg_bg
-    svg_footer = '</svg>'
+    return svg_header + svg_bg, '</svg>', avg_bg_color, bg_hex_color
 
-    # Calculate the base SVG size.
-    base_size = len((svg_base + svg_footer).encode('utf-8'))
-    available_bytes = max_size_bytes - base_size  # Calculate the bytes available for adding features.
+def select_levels(pyramid, budget, packer='dp', img_np=None, background=None, cull=False):
+    """
+    Choose the simplification level (or skip) of every feature for the adaptive fill.
 
-    # Extract the image features.
-    features = extract_features_by_scale(img_np, num_colors=num_colors)
+    Args:
+        pyramid (SimplificationPyramid): The features and their simplification levels.
+        budget (int): The number of bytes available for features.
+        packer (str, optional): The adaptive fill solver, see `bitmap_to_svg_layered`. Defaults to 'dp'.
+        img_np (np.ndarray, optional): The pixel array, needed by the 'residual' packer and by `cull`.
+        background (array-like, optional): The background RGB color, needed by the 'residual' packer.
+        cull (bool, optional): Whether to re-pack the bytes of occluded features. Defaults to False.
 
-    # If not using adaptive fill, add features until the size limit is reached.
-    if not adaptive_fill:
-        svg = svg_base
-        for feature in features:
-            feature_svg = f'<polygon points="{feature["points"]}" fill="{feature["color"]}" />\n'
-            if len((svg + feature_svg + svg_footer).encode('utf-8')) > max_size_bytes:
-                break  # Stop adding features if the limit is exceeded.
-            svg += feature_svg
-        svg += svg_footer
-        return svg
-
-    # Use adaptive fill: Try to add more features by simplifying less important ones.
-    feature_sizes = []
-    for feature in features:
-        feature_sizes.append({
-            'original': len(f'<polygon points="{feature["points"]}" fill="{feature["color"]}" />\n'.encode('utf-8')),
-            'level1': len(f'<polygon points="{simplify_polygon(feature["points"], 1)}" fill="{feature["color"]}" />\n'.encode('utf-8')),
-            'level2': len(f'<polygon points="{simplify_polygon(feature["points"], 2)}" fill="{feature["color"]}" />\n'.encode('utf-8')),
-            'level3': len(f'<polygon points="{simplify_polygon(feature["points"], 3)}" fill="{feature["color"]}" />\n'.encode('utf-8'))
-        })
-
-    svg = svg_base
-    bytes_used = base_size
-    added_features = set()
-
-    # Add the most important features first
-    for i, feature in enumerate(features):
-        feature_svg = f'<polygon points="{feature["points"]}" fill="{feature["color"]}" />\n'
-        feature_size = feature_sizes[i]['original']
-
-        if bytes_used + feature_size <= max_size_bytes:
-            svg += feature_svg
-            bytes_used += feature_size
-            added_features.add(i)
-
-    # Try to add the remaining features, simplifying them progressively
-    for level in range(1, 4):
-        for i, feature in enumerate(features):
-            if i in added_features:
-                continue
+    Returns:
+        tuple: (levels, culled): the (n,) int8 level of each feature, SKIP when it is not drawn,
+               and the number of features culled.
+    """
+    if packer == 'residual':
+        # Select by error reduction against a low-resolution render, starting from the background.
+        packer = ResidualPacker(img_np, background)
+    levels = _pack_features(pyramid, budget, packer)
+    culled = 0
+    if cull:
+        # Spend the bytes of features that end up hidden under others on more features.
+        height, width = img_np.shape[:2]
+        levels, culled = _cull_occluded(pyramid, levels, budget, packer, width, height)
+    return levels, culled
 
-            feature_size = feature_sizes[i][f'level{level}']
-            if bytes_used + feature_size <= max_size_bytes:
-                feature_svg = f'<polygon points="{simplify_polygon(feature["points"], level)}" fill="{feature["color"]}" />\n'
-                svg += feature_svg
-                bytes_used += feature_size
-                added_features.add(i)
+def _record_stats(stats, features, levels, num_colors, size, max_size_bytes, available_bytes, timings,
+                  fallback=False):
+    """Fill the `stats` dict of `write_svg_array` from the outcome of a conversion."""
+    drawn = levels[levels != SKIP]
+    stats.setdefault('timings', {}).update(timings)
+    stats.update({
+        'num_colors': num_colors,
+        'features': len(features),
+        'drawn': len(drawn),
+        'dropped': len(features) - len(drawn),
+        'levels': np.bincount(drawn, minlength=SimplificationPyramid.num_levels).tolist(),
+        'bytes': size,
+        'max_size_bytes': max_size_bytes,
+        'available_bytes': available_bytes,
+        'utilization': (size / max_size_bytes) * 100,  # Percent of the size limit used.
+        'fallback': fallback,
+    })
 
-    svg += svg_footer
+def bitmap_to_svg_layered(image, max_size_bytes=10000, resize=True, target_size=(384, 384),
+                         adaptive_fill=True, num_colors=None, packer='dp', quantizer='kmeans', seed=None,
+                         encoding='polygon', primitives=False, gradients=False, holes=False, cull=False,
+                         engine='components', epsilon_factor=SIMPLIFICATION_EPSILON,
+                         min_contour_area=MIN_CONTOUR_AREA, return_stats=False):
+    """
+    Convert a bitmap to SVG using layered feature extraction, optimizing space usage.
 
-    final_size = len(svg.encode('utf-8'))
-    if final_size > max_size_bytes:
-        # If the limit is exceeded, return a basic SVG
-        return f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}"><rect width="{width}" height="{height}" fill="{bg_hex_color}"/></svg>'
+    This function converts a raster image (bitmap) into a scalable vector graphic (SVG) format.
+    It extracts the main features of the image and represents them as polygons in the SVG.
+    The function aims to generate the smallest possible SVG file while maintaining visual quality.
 
-    utilization = (final_size / max_size_bytes) * 100  # Calculate the space utilization
+    Args:
+        image (PIL.Image or array-like): The input image: a PIL.Image object, an (H, W, 3) uint8
+            array or a (3, H, W) float tensor in [0, 1] or [-1, 1], used without a PIL round trip
+            (see `prepare_image`).
+        max_size_bytes (int, optional): The maximum size of the SVG file in bytes. Defaults to 10000.
+        resize (bool, optional): Whether to resize the image before processing. Defaults to True.
+        target_size (tuple, optional): The target size for resizing (width, height). Defaults to (384, 384).
+        adaptive_fill (bool, optional): Whether to adaptively fill the available space. Defaults to True.
+        num_colors (int, optional): The number of colors to quantize to. If None, uses adaptive selection.
+        packer (str, optional): The adaptive fill solver: 'dp' (exact byte-budget knapsack),
+            'lagrangian' (fast approximation), 'greedy' (the original level sweep) or 'residual'
+            (features chosen by how much they reduce the error of a low-resolution render per
+            byte rather than by importance, see `ResidualPacker`). Defaults to 'dp'.
+        quantizer (str or ColorQuantizer, optional): The color quantization engine: 'kmeans',
+            'fast', 'histogram', 'superpixel' (clusters the mean colors of SLIC superpixels, for
+            edge-aligned regions without speckle, see `SuperpixelQuantizer`) or an engine
+            instance (e.g. `FastKMeansQuantizer(warm_start=True)` reused across guidance steps).
+            Defaults to 'kmeans'.
+        seed (int, optional): Seed of the quantizer's random number generator, for reproducible
+            output. Ignored for quantizer instances. Defaults to None.
+        encoding (str, optional): 'polygon' (one `<polygon>` per feature, coordinates with 1
+            decimal where the budget allows) or 'path' (compact: features of one color merged
+            into shared `<path>` elements with integer relative `l`/`h`/`v` segments, split only
+            where another color overlaps in between so the paint order is kept, which fits
+            considerably more geometry into the same size). Defaults to 'polygon'.
+        primitives (bool, optional): Whether to draw regions that match a circle, ellipse or
+            rotated rectangle as `<circle>`, `<ellipse>` or `<rect>`, which costs far fewer bytes
+            than their polygons. Defaults to False.
+        gradients (bool, optional): Whether to draw smooth shading, which quantization splits into
+            bands, as single regions filled with a linear gradient. Defaults to False.
+        holes (bool, optional): Whether to draw regions with holes as one path with a subpath per
+            hole, dropping the features that only painted the holes back, for fewer elements and
+            less overdraw. Defaults to False.
+        cull (bool, optional): Whether to drop the features that the features painted after them
+            (almost) completely hide, and pack more features into the bytes they free (adaptive
+            fill only). Defaults to False.
+        engine (str, optional): The region extraction engine: 'components', 'multiscale' (large
+            smooth regions traced on a downsampled region map, faster with fewer vertices on images
+            of at least COARSE_MIN_SIDE pixels a side),
+            'tiled' (the 'components' features, extracted tile by tile in parallel: for large
+            images with `resize=False`) or 'masks', see `extract_features_by_scale`. Defaults
+            to 'components'.
+        epsilon_factor (float, optional): How far contours are simplified before any
+            simplification level, as a fraction of their perimeter (see
+            `SizeAutotuner` for tuning it to a byte budget). Defaults to SIMPLIFICATION_EPSILON.
+        min_contour_area (float, optional): The area (in pixels) below which regions are not
+            drawn and holes are not cut. Defaults to MIN_CONTOUR_AREA.
+        return_stats (bool, optional): Whether to also return a dict of stage timings, feature
+            counts per simplification level, bytes used against the budget, palette size and
+            whether the output fell back to the background only (see `write_svg_array`).
+            Defaults to False.
 
-    return svg  # Return the generated SVG
+    Returns:
+        str: The SVG string representation, or a (svg, stats) tuple if `return_stats` is True.
+    """
+    buffer = io.BytesIO()
+    stats = {} if return_stats else None
+    write_svg_layered(image, buffer, max_size_bytes=max_size_bytes, resize=resize, target_size=target_size,
+                      adaptive_fill=adaptive_fill, num_colors=num_colors, packer=packer, quantizer=quantizer,
+                      seed=seed, encoding=encoding, primitives=primitives, gradients=gradients,
+                      holes=holes, cull=cull, engine=engine, epsilon_factor=epsilon_factor,
+                      min_contour_area=min_contour_area, stats=stats)
+    svg = buffer.getvalue().decode('utf-8')  # The generated SVG
+    if return_stats:
+        return svg, stats
+    return svg
@@ -0,0 +1,149 @@
+import io  # In-memory binary streams for building SVG documents
+import os  # Directory listing
+from collections import deque  # Prefetch window of pending decodes
+from concurrent.futures import ThreadPoolExecutor  # Files decoded ahead of the consumer
+
+from PIL import Image  # Import the PIL (Pillow) library for image processing
+
+import Bitmap2SVGConverter
+
+# File extensions read from a directory.
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# Modes `Image.reduce` works on that convert to RGB afterwards; any other (palette, bilevel,
+# 16-bit) image is converted to RGB before it is reduced.
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK')
+
+def load_image(path, resize=True, target_size=(384, 384)):
+    """
+    Open an image file, decoding as few pixels as the final resize needs.
+
+    With `resize`, a JPEG is decoded in draft mode, where the decoder itself scales by 1/2,
+    1/4 or 1/8 to the smallest size still at least `target_size`; any other format (and a
+    JPEG that is still more than twice too large) is then shrunk by the largest power-of-two
+    factor that keeps it at least `target_size` with `Image.reduce` (box averaging, after
+    converting a mode it does not support to RGB, see REDUCIBLE_MODES). The final LANCZOS
+    resize to `target_size` therefore always starts from at most twice the target size.
+
+    Args:
+        path (str): The image file.
+        resize (bool, optional): Whether the image will be resized to `target_size`. If False
+            the image is decoded at full size. Defaults to True.
+        target_size (tuple, optional): The (width, height) it will be resized to. Defaults to (384, 384).
+
+    Returns:
+        tuple: (image, original_size): the decoded RGB PIL image and the (width, height) of the
+               file, used for the SVG size.
+    """
+    image = Image.open(path)
+    original_size = image.size
+    if resize:
+        target_width, target_height = target_size
+        if image.format == 'JPEG':
+            image.draft('RGB', (target_width, target_height))
+        factor = min(image.width // target_width, image.height // target_height)
+        if factor >= 2:
+            if image.mode not in REDUCIBLE_MODES:
+                image = image.convert('RGB')
+            image = image.reduce(1 << (factor.bit_length() - 1))  # Largest power of two <= factor.
+    return image.convert('RGB'), original_size
+
+def bitmap_file_to_svg(path, max_size_bytes=10000, resize=True, target_size=(384, 384), return_stats=False,
+                       cache=None, **params):
+    """
+    Convert an image file to SVG, decoding it at reduced scale (see `load_image`).
+
+    The SVG keeps the file's full size as its width and height, as `bitmap_to_svg_layered`
+    does for an image decoded at full size.
+
+    Args:
+        path (str): The image file.
+        cache (ConversionCache, optional): Serve the conversion from this cache when it holds
+            it (the file is still decoded, to hash its pixels). Defaults to None.
+        **params: Any other `bitmap_to_svg_layered` keyword argument.
+        See `bitmap_to_svg_layered` for the other arguments.
+
+    Returns:
+        str: The SVG string representation, or a (svg, stats) tuple if `return_stats` is True.
+    """
+    image, original_size = load_image(path, resize=resize, target_size=target_size)
+    img_np, _ = Bitmap2SVGConverter.prepare_image(image, resize=resize, target_size=target_size)
+    if cache is not None:
+        return cache.convert_array(img_np, original_size, max_size_bytes=max_size_bytes,
+                                   return_stats=return_stats, **params)
+    buffer = io.BytesIO()
+    stats = {} if return_stats else None
+    Bitmap2SVGConverter.write_svg_array(img_np, buffer, original_size=original_size,
+                                        max_size_bytes=max_size_bytes, stats=stats, **params)
+    svg = buffer.getvalue().decode('utf-8')
+    if return_stats:
+        return svg, stats
+    return svg
+
+def list_images(directory):
+    """Return the image files (by IMAGE_EXTENSIONS) directly inside `directory`, sorted by name."""
+    return sorted(entry.path for entry in os.scandir(directory)
+                  if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+
+def iter_images(paths, resize=True, target_size=(384, 384), workers=4, prefetch=None):
+    """
+    Decode image files in a thread pool, yielding them in order while later ones are decoded.
+
+    PIL releases the GIL while it decodes, so `workers` threads keep up to `prefetch` files
+    decoding ahead of the consumer; the window is bounded, so a long directory is never held
+    in memory at once.
+
+    Args:
+        paths (str or iterable): A directory (see `list_images`) or the image files.
+        resize (bool, optional): See `load_image`. Defaults to True.
+        target_size (tuple, optional): See `load_image`. Defaults to (384, 384).
+        workers (int, optional): The number of decoding threads. Defaults to 4.
+        prefetch (int, optional): The most files decoded or decoding ahead. Defaults to twice
+            the number of workers.
+
+    Yields:
+        tuple: (path, image, original_size) for every file, in order.
+    """
+    if isinstance(paths, str):
+        paths = list_images(paths)
+    window = prefetch or 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(load_image, path, resize=resize, target_size=target_size)))
+            if len(pending) >= window:
+                path, future = pending.popleft()
+                yield (path, *future.result())
+        while pending:
+            path, future = pending.popleft()
+            yield (path, *future.result())
+
+if __name__ == "__main__":
+    # Compare decoding a large JPEG at full size with decoding it at reduced scale.
+    import sys
+    import tempfile
+    import time
+
+    import numpy as np  # Import the NumPy library for efficient numerical computations
+
+    from Bitmap2SVGBenchmark import synthetic_image
+
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'large.jpg')
+        Image.fromarray(synthetic_image('flat', 4096)).save(path, quality=92)
+
+    for reduced in (False, True):
+        start = time.perf_counter()
+        if reduced:
+            image, _ = load_image(path)
+        else:
+            image = Image.open(path).convert('RGB')
+        img_np, _ = Bitmap2SVGConverter.prepare_image(image)
+        elapsed = time.perf_counter() - start
+        if not reduced:
+            reference = img_np
+        print(f"{'reduced' if reduced else 'full':>8}: decode and resize {elapsed * 1000:7.1f} ms, "
+              f"decoded {image.size[0]}x{image.size[1]}, "
+              f"max difference {np.abs(img_np.astype(int) - reference).max()}")
@@ -0,0 +1,296 @@
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+# Relative value of a feature drawn at each simplification level (0-3). Levels 0 and 1 print
+# the same polygon; 2 loses the sub-pixel precision of primitives (polygon vertices are
+# integers, so for them levels 0-2 cost the same bytes) and 3 also drops about half the vertices.
+LEVEL_QUALITY = (1.0, 1.0, 0.9, 0.7)
+
+# Upper bounds on the width of a DP row and on the size of the whole DP table (features x
+# cells). Budgets above them are solved on a coarser byte grid (costs rounded up), which keeps
+# the CPU time and memory per image bounded however many features there are.
+MAX_DP_CELLS = 10000
+MAX_DP_TABLE = 4000000
+
+SKIP = -1  # Level value of a feature that is not drawn.
+
+def level_values(importance, num_levels):
+    """
+    Build the (n, num_levels) value table of drawing each feature at each level.
+
+    Args:
+        importance (np.ndarray): The importance score of each feature.
+        num_levels (int): The number of simplification levels.
+
+    Returns:
+        np.ndarray: A float64 array of importance scaled by LEVEL_QUALITY.
+    """
+    quality = np.asarray(LEVEL_QUALITY[:num_levels], dtype=np.float64)
+    return np.asarray(importance, dtype=np.float64)[:, None] * quality[None, :]
+
+def _fill_leftover(levels, cost, value, budget):
+    """
+    Spend the bytes a solver left unused on skipped features, best value per byte first.
+
+    Each skipped feature is added at the most valuable level that still fits.
+    """
+    used = int(cost[np.arange(len(levels)), levels][levels != SKIP].sum()) if len(levels) else 0
+    skipped = np.flatnonzero(levels == SKIP)
+    if len(skipped) == 0:
+        return levels
+    # Order the candidates by their best value density.
+    density = (value[skipped] / np.maximum(cost[skipped], 1)).max(axis=1)
+    for i in skipped[np.argsort(-density, kind='stable')]:
+        fits = np.flatnonzero(cost[i] <= budget - used)
+        if len(fits) == 0:
+            continue
+        level = fits[np.argmax(value[i, fits])]
+        levels[i] = level
+        used += int(cost[i, level])
+    return levels
+
+def pack_greedy(cost, value, budget):
+    """
+    Reproduce the original adaptive fill: add features at level 0 in order while they fit,
+    then sweep the leftovers at levels 1, 2 and 3.
+
+    Args:
+        cost (np.ndarray): (n, num_levels) byte cost of each feature at each level.
+        value (np.ndarray): (n, num_levels) value of each feature at each level (unused).
+        budget (int): The number of bytes available for features.
+
+    Returns:
+        np.ndarray: (n,) int8 chosen level of each feature, SKIP when it is not drawn.
+    """
+    levels = np.full(len(cost), SKIP, dtype=np.int8)
+    used = 0
+    for level in range(cost.shape[1]):
+        for i in np.flatnonzero(levels == SKIP):
+            if used + cost[i, level] <= budget:
+                levels[i] = level
+                used += int(cost[i, level])
+    return levels
+
+def pack_dp(cost, value, budget, max_cells=MAX_DP_CELLS):
+    """
+    Solve the multiple-choice knapsack exactly with dynamic programming over the byte budget.
+
+    Each feature picks one of {skip, level 0..L-1}. Budgets larger than `max_cells` bytes (or
+    than MAX_DP_TABLE / n for n features) are solved on a grid of several bytes per cell with
+    costs rounded up, so the answer always fits; the bytes lost to rounding are handed out
+    again by a final greedy pass.
+
+    Args:
+        cost (np.ndarray): (n, num_levels) byte cost of each feature at each level.
+        value (np.ndarray): (n, num_levels) value of each feature at each level.
+        budget (int): The number of bytes available for features.
+        max_cells (int, optional): The maximum DP row width. Defaults to MAX_DP_CELLS.
+
+    Returns:
+        np.ndarray: (n,) int8 chosen level of each feature, SKIP when it is not drawn.
+    """
+    num_features, num_levels = cost.shape
+    levels = np.full(num_features, SKIP, dtype=np.int8)
+    if num_features == 0 or budget <= 0:
+        return levels
+
+    max_cells = max(256, min(max_cells, MAX_DP_TABLE // num_features))
+    grid = max(1, -(-budget // max_cells))  # Bytes per DP cell (ceil division).
+    cells = budget // grid
+    grid_cost = -(-cost.astype(np.int64) // grid)  # Costs rounded up onto the grid.
+
+    # best[c] is the best value reachable with at most c cells; choice[i, c] is the level
+    # feature i took to reach it (SKIP when it was left out).
+    best = np.zeros(cells + 1, dtype=np.float64)
+    choice = np.full((num_features, cells + 1), SKIP, dtype=np.int8)
+    for i in range(num_features):
+        new_best = best.copy()
+        for level in range(num_levels):
+            w = grid_cost[i, level]
+            if w > cells:
+                continue
+            candidate = best[:cells + 1 - w] + value[i, level]
+            better = candidate > new_best[w:]
+            new_best[w:][better] = candidate[better]
+            choice[i, w:][better] = level
+        best = new_best
+
+    # Walk back from the best final cell.
+    c = int(np.argmax(best))
+    for i in range(num_features - 1, -1, -1):
+        level = choice[i, c]
+        if level != SKIP:
+            levels[i] = level
+            c -= grid_cost[i, level]
+
+    return _fill_leftover(levels, cost, value, budget)
+
+def pack_lagrangian(cost, value, budget, iterations=50):
+    """
+    Solve the multiple-choice knapsack approximately by Lagrangian relaxation.
+
+    For a byte price `lam` every feature independently takes the level maximising
+    value - lam * cost (or is skipped when that is never positive). The price is bisected
+    to the cheapest one whose choices fit the budget, and the remaining bytes are filled
+    greedily. Each iteration is a handful of vectorized operations over the cost table.
+
+    Args:
+        cost (np.ndarray): (n, num_levels) byte cost of each feature at each level.
+        value (np.ndarray): (n, num_levels) value of each feature at each level.
+        budget (int): The number of bytes available for features.
+        iterations (int, optional): The number of bisection steps. Defaults to 50.
+
+    Returns:
+        np.ndarray: (n,) int8 chosen level of each feature, SKIP when it is not drawn.
+    """
+    num_features = len(cost)
+    if num_features == 0 or budget <= 0:
+        return np.full(num_features, SKIP, dtype=np.int8)
+
+    rows = np.arange(num_features)
+
+    def choose(lam):
+        score = value - lam * cost
+        level = np.argmax(score, axis=1)
+        level[score[rows, level] <= 0] = SKIP
+        weight = np.where(level == SKIP, 0, cost[rows, level]).sum()
+        return level.astype(np.int8), weight
+
+    # Find a price high enough that the choices fit.
+    low, high = 0.0, 1.0
+    levels, weight = choose(low)
+    if weight <= budget:
+        return _fill_leftover(levels, cost, value, budget)
+    while choose(high)[1] > budget:
+        high *= 2
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        if choose(mid)[1] > budget:
+            low = mid
+        else:
+            high = mid
+
+    levels, _ = choose(high)
+    return _fill_leftover(levels, cost, value, budget)
+
+PACKERS = {
+    'dp': pack_dp,
+    'lagrangian': pack_lagrangian,
+    'greedy': pack_greedy,
+}
+
+def first_in_group(levels, group):
+    """
+    Return the (n,) bool mask of the drawn features that are the first of their group, which
+    pay its fixed cost when a group is one element.
+    """
+    drawn = np.flatnonzero(levels != SKIP)
+    mask = np.zeros(len(levels), dtype=bool)
+    _, first = np.unique(np.asarray(group)[drawn], return_index=True)
+    mask[drawn[first]] = True
+    return mask
+
+def packed_size(cost, levels, group=None, group_cost=None, opens=None):
+    """
+    Return the bytes used by a packing: the drawn features plus the fixed cost of their groups.
+
+    Args:
+        cost (np.ndarray): (n, num_levels) byte cost of each feature at each level.
+        levels (np.ndarray): (n,) chosen level of each feature, SKIP when it is not drawn.
+        group (np.ndarray, optional): (n,) group index of each feature.
+        group_cost (np.ndarray, optional): The fixed cost of each group.
+        opens (callable, optional): Maps levels to the (n,) bool mask of the drawn features
+            that pay their group's fixed cost. Defaults to the first drawn feature of each group.
+
+    Returns:
+        int: The total byte cost.
+    """
+    drawn = np.flatnonzero(levels != SKIP)
+    size = int(np.asarray(cost)[drawn, levels[drawn]].sum())
+    if group is not None:
+        mask = opens(levels) if opens is not None else first_in_group(levels, group)
+        size += int(np.asarray(group_cost)[np.asarray(group)[mask]].sum())
+    return size
+
+def fit_budget(cost, levels, budget, group=None, group_cost=None, opens=None):
+    """
+    Drop the least important drawn features (the last ones) until a packing fits the budget.
+
+    `opens` must only depend on the drawn features before each one (as for the first feature
+    of each group), so the cost of every prefix of the drawn features is known in one pass.
+
+    Args:
+        See `packed_size`.
+
+    Returns:
+        np.ndarray: The levels, with the features that did not fit set to SKIP.
+    """
+    drawn = np.flatnonzero(levels != SKIP)
+    nbytes = np.asarray(cost, dtype=np.int64)[drawn, levels[drawn]]
+    if group is not None:
+        mask = opens(levels) if opens is not None else first_in_group(levels, group)
+        nbytes = nbytes + np.where(mask[drawn], np.asarray(group_cost)[np.asarray(group)[drawn]], 0)
+    fits = np.searchsorted(np.cumsum(nbytes), budget, side='right')
+    if fits < len(drawn):
+        levels = levels.copy()
+        levels[drawn[fits:]] = SKIP
+    return levels
+
+def pack_budget(cost, importance, budget, solver='dp', group=None, group_cost=None, opens=None):
+    """
+    Choose a simplification level (or skip) for every feature so the total cost fits a budget.
+
+    Features may share a fixed cost, such as the `<path>` element that holds the subpaths of
+    one color: `group_cost[group[i]]` is paid by every drawn feature that `opens` an element of
+    its group (by default the first one of each group). The solvers handle independent costs
+    only, so the fixed costs of drawing every feature are reserved first, and the packing is
+    repeated with the fixed costs the last one actually incurred reserved until they agree.
+    A packing that exceeds the budget (the fixed costs depend on what is drawn) loses its
+    least important features until it fits (see `fit_budget`), and the most valuable packing
+    is kept, so the result always fits exactly.
+
+    Args:
+        cost (np.ndarray): (n, num_levels) byte cost of each feature at each level.
+        importance (np.ndarray): The importance score of each feature, in decreasing order.
+        budget (int): The number of bytes available for features.
+        solver (str, optional): 'dp' (exact), 'lagrangian' (fast approximation) or 'greedy'
+            (the original level sweep). Defaults to 'dp'.
+        group (np.ndarray, optional): (n,) group index of each feature. Defaults to None (no
+            shared costs).
+        group_cost (np.ndarray, optional): The fixed cost of each group.
+        opens (callable, optional): Maps levels to the (n,) bool mask of the drawn features
+            that pay their group's fixed cost (e.g. `SimplificationPyramid.opens`). Defaults to
+            the first drawn feature of each group.
+
+    Returns:
+        np.ndarray: (n,) int8 chosen level of each feature, SKIP when it is not drawn.
+    """
+    if solver not in PACKERS:
+        raise ValueError(f"Unknown packer: {solver!r}")
+    cost = np.asarray(cost, dtype=np.int64)
+    value = level_values(importance, cost.shape[1])
+    budget = int(budget)
+    if group is None:
+        return PACKERS[solver](cost, value, budget)
+
+    group = np.asarray(group)
+    group_cost = np.asarray(group_cost, dtype=np.int64)
+    if opens is None:
+        opens = lambda levels: first_in_group(levels, group)
+
+    def fixed_cost(levels):
+        return int(group_cost[group[opens(levels)]].sum())
+
+    rows = np.arange(len(cost))
+    reserved = fixed_cost(np.zeros(len(cost), dtype=np.int8))
+    best, best_value = None, -1.0
+    for _ in range(3):
+        levels = fit_budget(cost, PACKERS[solver](cost, value, budget - reserved), budget, group, group_cost, opens)
+        drawn = levels != SKIP
+        total = float(value[rows[drawn], levels[drawn]].sum())
+        if total > best_value:
+            best, best_value = levels, total
+        used = fixed_cost(levels)
+        if used == reserved:
+            break
+        reserved = used
+    return best
@@ -0,0 +1,272 @@
+import hashlib  # Fast content hashing of pixel buffers
+import inspect  # Normalizing conversion parameters against the converter signature
+import io  # In-memory binary streams for the conversion output
+import json  # Conversion stats stored with the disk tier's SVGs
+import os  # Disk tier file handling
+from collections import OrderedDict  # LRU order of the in-memory tier
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import Bitmap2SVGConverter
+
+# Parameters that only affect how the input is prepared; they are covered by hashing the
+# prepared pixel buffer itself.
+_PREPARE_PARAMS = ('resize', 'target_size')
+
+# Arguments of `write_svg_array` that are not conversion parameters.
+_ARRAY_ARGUMENTS = ('img_np', 'fp', 'original_size', 'stats')
+
+def convert_array(img_np, original_size, params, return_stats=False):
+    """
+    Convert a prepared pixel array with `Bitmap2SVGConverter.write_svg_array`.
+
+    Returns:
+        tuple: (svg, stats), where stats is None unless `return_stats`.
+    """
+    buffer = io.BytesIO()
+    stats = {} if return_stats else None
+    Bitmap2SVGConverter.write_svg_array(img_np, buffer, original_size=original_size, stats=stats, **params)
+    return buffer.getvalue().decode('utf-8'), stats
+
+class ConversionCache:
+    """
+    Content-addressed cache around `Bitmap2SVGConverter.bitmap_to_svg_layered`.
+
+    The key is a BLAKE2 hash of the resized pixel buffer (shape, dtype and bytes), the original
+    image size and every conversion parameter with defaults filled in, so repeated conversions
+    of the same bitmap with the same settings (seed re-runs, parameter sweeps, re-scoring) are
+    served without re-vectorizing. Results live in an in-memory LRU tier and, optionally, an
+    on-disk tier with one file per key (and one for its stats, if any) whose total size is
+    bounded by evicting the least recently used files. The disk tier may be shared by several
+    processes, such as the workers of `Bitmap2SVGCLI`.
+
+    Quantization is seeded (`seed` is filled in when a call leaves it None) so a cached result
+    is exactly what a fresh conversion would produce. Calls that pass a quantizer instance are
+    not cached, since the instance may carry state such as a warm-start palette. The stats of
+    a conversion are stored with its SVG: a call with `return_stats=True` is served from the
+    cache when an earlier call stored them, and gets the stats of that conversion (timings
+    included).
+
+    Args:
+        max_items (int, optional): The capacity of the in-memory tier. Defaults to 256.
+        directory (str, optional): The disk tier directory, or None for memory only. Defaults to None.
+        max_disk_bytes (int, optional): The size bound of the disk tier. Defaults to 256 MiB.
+        seed (int, optional): The quantization seed used when the caller does not pass one. Defaults to 0.
+
+    Attributes:
+        hits (int): Lookups served from either tier.
+        disk_hits (int): The subset of `hits` served from disk.
+        misses (int): Lookups that ran a conversion.
+
+    Raises:
+        ValueError: If `seed` is None: unseeded quantization gives a different SVG on every
+            run, which no cached result could stand for.
+    """
+
+    def __init__(self, max_items=256, directory=None, max_disk_bytes=256 * 1024 * 1024, seed=0):
+        if seed is None:
+            raise ValueError("ConversionCache needs an integer seed: unseeded quantization is not reproducible, "
+                             "so its results cannot be cached")
+        self.max_items = max_items
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.seed = seed
+        self.memory = OrderedDict()  # Key -> (svg, stats or None).
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                                  if entry.name.endswith(('.svg', '.json')))
+
+    def stats(self):
+        """Return the hit/miss counters and tier sizes as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_items': len(self.memory),
+            'disk_bytes': self.disk_bytes,
+        }
+
+    def key(self, img_np, original_size, params):
+        """
+        Compute the cache key of a prepared pixel buffer and its conversion parameters.
+
+        Args:
+            img_np (np.ndarray): The prepared (resized) pixel array.
+            original_size (tuple): The (width, height) of the input image.
+            params (dict): The conversion parameters, with defaults filled in.
+
+        Returns:
+            str: A 32-character hex digest.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        pixels = np.ascontiguousarray(img_np)
+        digest.update(f'{pixels.shape}|{pixels.dtype}|{tuple(original_size)}|'.encode('utf-8'))
+        digest.update(memoryview(pixels).cast('B'))
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def request(self, img_np, original_size=None, **params):
+        """
+        Normalize a conversion of a prepared pixel array and compute its key.
+
+        Args:
+            img_np (np.ndarray): The prepared (resized) pixel array.
+            original_size (tuple, optional): The (width, height) of the input image. Defaults
+                to the array's own size.
+            **params: Any `write_svg_array` conversion parameter.
+
+        Returns:
+            tuple: (key, original_size, params): the cache key (None when the quantizer is an
+                   instance, which is not cached), the original size and the parameters with
+                   defaults and the seed filled in.
+        """
+        if original_size is None:
+            original_size = (img_np.shape[1], img_np.shape[0])
+        bound = inspect.signature(Bitmap2SVGConverter.write_svg_array).bind(img_np, None, **params)
+        bound.apply_defaults()
+        params = {name: value for name, value in bound.arguments.items() if name not in _ARRAY_ARGUMENTS}
+        if params['seed'] is None:
+            params['seed'] = self.seed
+        if not isinstance(params['quantizer'], str):
+            return None, tuple(original_size), params
+        return self.key(img_np, original_size, params), tuple(original_size), params
+
+    def _disk_path(self, key, extension='.svg'):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, key, stats=False):
+        """
+        Return the cached (svg, stats) for `key`, or None. Updates LRU order and the counters.
+
+        Args:
+            key (str): The cache key.
+            stats (bool, optional): Whether only an entry stored with its stats will do.
+                Defaults to False.
+        """
+        entry = self.memory.get(key)
+        if entry is not None and (entry[1] is not None or not stats):
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self.directory is not None:
+            entry = self._read(key)
+            if entry is not None and (entry[1] is not None or not stats):
+                os.utime(self._disk_path(key))  # Mark as recently used for eviction.
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, *entry)
+                return entry
+
+        self.misses += 1
+        return None
+
+    def _read(self, key):
+        """Read the (svg, stats or None) of `key` from the disk tier, or None."""
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                svg = f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            with open(self._disk_path(key, '.json'), encoding='utf-8') as f:
+                return svg, json.load(f)
+        except FileNotFoundError:
+            return svg, None
+
+    def put(self, key, svg, stats=None):
+        """Store `svg` (and its `stats`) under `key` in both tiers, evicting the least recently used entries."""
+        if stats is None and key in self.memory:
+            stats = self.memory[key][1]
+        self._remember(key, svg, stats)
+        if self.directory is None:
+            return
+
+        written = self._write(self._disk_path(key), svg.encode('utf-8'))
+        if stats is not None:
+            written += self._write(self._disk_path(key, '.json'), json.dumps(stats).encode('utf-8'))
+        self.disk_bytes += written
+        if self.disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    @staticmethod
+    def _write(path, data):
+        """Write a disk tier file unless it exists, returning the bytes written."""
+        if os.path.exists(path):
+            return 0
+        # Write to a temporary name first so readers never see a partial file.
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        return len(data)
+
+    def _remember(self, key, svg, stats):
+        self.memory[key] = (svg, stats)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Delete the least recently used files until the disk tier is back under its bound."""
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.svg')),
+                         key=lambda entry: entry.stat().st_mtime)
+        self.disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                              if entry.name.endswith(('.svg', '.json')))
+        for entry in entries:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            # An SVG goes with its stats.
+            for path in (entry.path, entry.path[:-4] + '.json'):
+                try:
+                    size = os.stat(path).st_size
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue  # No stats, or already evicted by another process sharing the directory.
+                self.disk_bytes -= size
+
+    def convert_array(self, img_np, original_size=None, return_stats=False, **params):
+        """
+        Cached `Bitmap2SVGConverter.write_svg_array`, for a pixel array already prepared (see
+        `Bitmap2SVGConverter.prepare_image`).
+
+        Args:
+            img_np (np.ndarray): The prepared (resized) pixel array.
+            original_size (tuple, optional): The (width, height) of the input image. Defaults
+                to the array's own size.
+            return_stats (bool, optional): Whether to also return the conversion stats. Defaults to False.
+            **params: Any `write_svg_array` conversion parameter.
+
+        Returns:
+            str: The SVG string representation, or a (svg, stats) tuple if `return_stats` is True.
+        """
+        key, original_size, params = self.request(img_np, original_size, **params)
+        found = self.get(key, stats=return_stats) if key is not None else None
+        if found is None:
+            found = convert_array(img_np, original_size, params, return_stats)
+            if key is not None:
+                self.put(key, *found)
+        return found if return_stats else found[0]
+
+    def bitmap_to_svg_layered(self, image, **params):
+        """
+        Cached `Bitmap2SVGConverter.bitmap_to_svg_layered`.
+
+        Args:
+            image (PIL.Image or array-like): The input image, see `Bitmap2SVGConverter.prepare_image`.
+            **params: Any `bitmap_to_svg_layered` keyword argument.
+
+        Returns:
+            str: The SVG string representation, or a (svg, stats) tuple if `return_stats` is True.
+        """
+        inspect.signature(Bitmap2SVGConverter.bitmap_to_svg_layered).bind(image, **params)  # Reject unknown arguments.
+        prepare = {name: params.pop(name) for name in _PREPARE_PARAMS if name in params}
+        img_np, original_size = Bitmap2SVGConverter.prepare_image(image, **prepare)
+        return self.convert_array(img_np, original_size, **params)
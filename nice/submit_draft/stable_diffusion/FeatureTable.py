@@ -0,0 +1,146 @@
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+class FeatureTable:
+    """
+    Struct-of-arrays container for the polygon features extracted from a bitmap.
+
+    All polygon vertices live in one int16 coordinate buffer. Each feature is a slice of that
+    buffer described by an offset and a length, and every other per-feature value (palette
+    index, area, importance) is a parallel NumPy array. Sorting and filtering only permute
+    the small per-feature arrays; the coordinate buffer is shared and never copied.
+
+    A feature may also have holes: rings in the same buffer, listed in a shared ring table
+    (`hole_offsets`, `hole_lengths`) that each feature indexes with `hole_start` and
+    `hole_count`.
+
+    Attributes:
+        coords (np.ndarray): (total_points, 2) int16 vertex buffer shared by all features.
+        offsets (np.ndarray): (n,) int32 start of each feature in `coords`.
+        lengths (np.ndarray): (n,) int32 number of vertices of each feature.
+        color_index (np.ndarray): (n,) uint8 palette index of each feature.
+        area (np.ndarray): (n,) float32 contour area of each feature.
+        importance (np.ndarray): (n,) float32 importance score of each feature.
+        palette (np.ndarray): (k, 3) uint8 RGB palette.
+        hex_colors (list): The compressed hex string of each palette entry.
+        shape (np.ndarray): (n,) int8 primitive each feature is drawn as (see `PrimitiveFitter`);
+            0 for a polygon.
+        shape_params (np.ndarray): (n, 5) float32 primitive parameters (center x, center y,
+            width, height, angle in degrees); unused for polygons.
+        defs (list): Per palette entry, the `<defs>` element its fill refers to (such as a
+            gradient), or '' for a plain color.
+        hole_offsets (np.ndarray): (h,) int32 start of each hole ring in `coords`.
+        hole_lengths (np.ndarray): (h,) int32 number of vertices of each hole ring.
+        hole_start (np.ndarray): (n,) int32 first hole ring of each feature.
+        hole_count (np.ndarray): (n,) int32 number of hole rings of each feature.
+    """
+
+    def __init__(self, coords, offsets, lengths, color_index, area, importance, palette, hex_colors,
+                 shape=None, shape_params=None, defs=None, holes=None):
+        self.coords = coords
+        self.offsets = offsets
+        self.lengths = lengths
+        self.color_index = color_index
+        self.area = area
+        self.importance = importance
+        self.palette = palette
+        self.hex_colors = hex_colors
+        self.shape = shape if shape is not None else np.zeros(len(offsets), dtype=np.int8)
+        self.shape_params = shape_params if shape_params is not None else np.zeros((len(offsets), 5), dtype=np.float32)
+        self.defs = defs if defs is not None else [''] * len(hex_colors)
+        if holes is None:
+            no_rings = np.zeros(0, dtype=np.int32)
+            holes = (no_rings, no_rings, np.zeros(len(offsets), dtype=np.int32), np.zeros(len(offsets), dtype=np.int32))
+        self.hole_offsets, self.hole_lengths, self.hole_start, self.hole_count = holes
+
+    @classmethod
+    def from_contours(cls, contours, color_index, area, importance, palette, hex_colors, shape=None, shape_params=None,
+                      holes=None):
+        """
+        Build a table from a list of OpenCV contours and their per-feature values.
+
+        Args:
+            contours (list): Contours in `cv2.findContours` format ((n, 1, 2) int32 arrays).
+            color_index (array-like): The palette index of each contour.
+            area (array-like): The area of each contour.
+            importance (array-like): The importance score of each contour.
+            palette (np.ndarray): (k, 3) uint8 RGB palette.
+            hex_colors (list): The compressed hex string of each palette entry.
+            shape (array-like, optional): The primitive kind of each contour. Defaults to polygons.
+            shape_params (array-like, optional): (n, 5) primitive parameters of each contour.
+            holes (list, optional): Per contour, a list of hole contours. Defaults to no holes.
+
+        Returns:
+            FeatureTable: The new table, in the order the contours were given.
+        """
+        # Hole rings are stored after all the outer rings.
+        rings = list(contours)
+        hole_table = None
+        if holes is not None:
+            hole_count = np.fromiter((len(h) for h in holes), dtype=np.int32, count=len(contours))
+            hole_start = np.zeros(len(contours), dtype=np.int32)
+            np.cumsum(hole_count[:-1], out=hole_start[1:])
+            rings.extend(ring for feature_holes in holes for ring in feature_holes)
+
+        ring_lengths = np.fromiter((len(c) for c in rings), dtype=np.int32, count=len(rings))
+        ring_offsets = np.zeros(len(rings), dtype=np.int32)
+        np.cumsum(ring_lengths[:-1], out=ring_offsets[1:])  # Each ring starts where the previous one ends.
+        if rings:
+            coords = np.concatenate(rings).reshape(-1, 2).astype(np.int16)
+        else:
+            coords = np.zeros((0, 2), dtype=np.int16)
+        offsets, lengths = ring_offsets[:len(contours)], ring_lengths[:len(contours)]
+        if holes is not None:
+            hole_table = (ring_offsets[len(contours):], ring_lengths[len(contours):], hole_start, hole_count)
+        return cls(
+            coords, offsets, lengths,
+            np.asarray(color_index, dtype=np.uint8),
+            np.asarray(area, dtype=np.float32),
+            np.asarray(importance, dtype=np.float32),
+            palette, hex_colors,
+            None if shape is None else np.asarray(shape, dtype=np.int8),
+            None if shape_params is None else np.asarray(shape_params, dtype=np.float32).reshape(-1, 5),
+            None, hole_table,
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def points(self, i):
+        """Return the (n, 2) vertex array of feature `i` as a view into the coordinate buffer."""
+        start = self.offsets[i]
+        return self.coords[start:start + self.lengths[i]]
+
+    def holes(self, i):
+        """Return the (m, 2) vertex arrays of the hole rings of feature `i`."""
+        start = self.hole_start[i]
+        return [self.coords[offset:offset + length] for offset, length in
+                zip(self.hole_offsets[start:start + self.hole_count[i]], self.hole_lengths[start:start + self.hole_count[i]])]
+
+    def color(self, i):
+        """Return the compressed hex fill color of feature `i`."""
+        return self.hex_colors[self.color_index[i]]
+
+    def take(self, indices):
+        """
+        Return a table holding the features at `indices`, in that order.
+
+        Args:
+            indices (np.ndarray): Integer feature indices.
+
+        Returns:
+            FeatureTable: A new table sharing this table's coordinate buffer.
+        """
+        return FeatureTable(
+            self.coords, self.offsets[indices], self.lengths[indices],
+            self.color_index[indices], self.area[indices], self.importance[indices],
+            self.palette, self.hex_colors, self.shape[indices], self.shape_params[indices], self.defs,
+            (self.hole_offsets, self.hole_lengths, self.hole_start[indices], self.hole_count[indices]),
+        )
+
+    def filter(self, mask):
+        """Return a table holding only the features where the boolean `mask` is True."""
+        return self.take(np.flatnonzero(mask))
+
+    def sorted_by_importance(self):
+        """Return a table sorted by descending importance (stable, so ties keep their order)."""
+        return self.take(np.argsort(-self.importance, kind='stable'))
@@ -0,0 +1,192 @@
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+# Largest RGB distance between the palette colors of two adjacent regions that can be
+# neighbouring bands of one gradient.
+MAX_BAND_STEP = 48.0
+
+# Smallest region (in pixels) considered as a band, and smallest group of bands replaced.
+MIN_BAND_AREA = 20
+MIN_GRADIENT_AREA = 400
+
+# Smallest boundary (in pixel pairs) two bands must share to be merged.
+MIN_SHARED_BOUNDARY = 4
+
+# Smallest color change (RGB distance) between the two ends of a gradient worth encoding.
+MIN_RAMP = 24.0
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:  # Path compression.
+        parent[i], i = root, parent[i]
+    return root
+
+def band_groups(labels, palette, regions):
+    """
+    Group adjacent regions whose palette colors are close, the candidate bands of a gradient.
+
+    Args:
+        labels (np.ndarray): An (H, W) map of palette indices.
+        palette (np.ndarray): (k, 3) RGB palette.
+        regions (dict): The output of `label_regions(labels)`.
+
+    Returns:
+        list: Region id arrays, one per group of at least two regions of different colors.
+    """
+    ids = regions['ids']
+    area = regions['area']
+
+    # Every pair of 4-neighbouring pixels in different regions, as (smaller, larger) id pairs.
+    pairs = np.concatenate([
+        np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1),
+        np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1),
+    ])
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    pairs.sort(axis=1)
+    big = area >= MIN_BAND_AREA
+    pairs = pairs[big[pairs[:, 0]] & big[pairs[:, 1]]]
+    if len(pairs) == 0:
+        return []
+    edges, shared = np.unique(pairs, axis=0, return_counts=True)
+
+    # Keep the boundaries between sizeable regions of nearby colors.
+    color = regions['color']
+    step = np.linalg.norm(palette[color[edges[:, 0]]].astype(np.float64) -
+                          palette[color[edges[:, 1]]].astype(np.float64), axis=1)
+    edges = edges[(shared >= MIN_SHARED_BOUNDARY) & (step <= MAX_BAND_STEP) & (step > 0)]
+
+    parent = {}
+    for a, b in edges.tolist():
+        parent.setdefault(a, a)
+        parent.setdefault(b, b)
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for region in parent:
+        groups.setdefault(_find(parent, region), []).append(region)
+    return [np.array(sorted(members)) for members in groups.values() if len(members) > 1]
+
+def fit_ramp(pixels, points):
+    """
+    Fit colors as a linear ramp along one direction by least squares.
+
+    A full affine fit gives each channel its own gradient; the direction of the ramp is the
+    best common direction of those gradients (first right singular vector), and each channel
+    is then refitted as a line along it.
+
+    Args:
+        pixels (np.ndarray): (n, 3) RGB values.
+        points (np.ndarray): (n, 2) pixel coordinates (x, y).
+
+    Returns:
+        tuple: (direction, offset, slope, position) with direction a (2,) unit vector, offset
+               and slope (3,) per-channel line coefficients and position the (n,) coordinate
+               of each point along the direction.
+    """
+    pixels = pixels.astype(np.float64)
+    centered = points - points.mean(axis=0)
+    design = np.column_stack([np.ones(len(points)), centered])
+    coefficients, *_ = np.linalg.lstsq(design, pixels, rcond=None)
+    _, _, vt = np.linalg.svd(coefficients[1:].T, full_matrices=False)
+    direction = vt[0]
+
+    position = points @ direction
+    design = np.column_stack([np.ones(len(points)), position])
+    (offset, slope), *_ = np.linalg.lstsq(design, pixels, rcond=None)
+    return direction, offset, slope, position
+
+def merge_gradient_bands(img_rgb, labels, palette, regions, max_gradients=32):
+    """
+    Replace groups of quantized bands that form a linear color ramp by one gradient region.
+
+    Smooth shading is quantized into several bands of nearby colors. Each group of adjacent
+    bands is fitted with a linear ramp along one direction on the original pixels. The group
+    is replaced when the ramp is monotone across the bands (the bands' colors progress in the
+    order of their position along it), reproduces the pixels at least as well as the flat
+    bands do, and spans a visible color change. Every replaced group gets a new palette index,
+    so region extraction traces it as a single region, and a two-stop linear gradient to fill
+    it with.
+
+    Args:
+        img_rgb (np.ndarray): The (H, W, 3) original RGB pixels.
+        labels (np.ndarray): The (H, W) uint8 quantized label map.
+        palette (np.ndarray): (k, 3) uint8 RGB palette.
+        regions (dict): The output of `label_regions(labels)`.
+        max_gradients (int, optional): The maximum number of gradients. Defaults to 32.
+
+    Returns:
+        tuple: (labels, palette, gradients): the relabelled map, the palette extended with the
+               mean color of each gradient region, and one dict per gradient with its palette
+               'index', the 'start' and 'end' points (x, y) of the gradient vector in pixels
+               and the RGB 'stops' at those points.
+    """
+    groups = band_groups(labels, palette, regions)
+    if not groups:
+        return labels, palette, []
+
+    ids = regions['ids']
+    height, width = labels.shape
+    flat_pixels = img_rgb.reshape(-1, 3)
+    # Largest groups first, so the cap on gradients keeps the most valuable ones.
+    groups.sort(key=lambda members: -int(regions['area'][members].sum()))
+
+    new_labels = labels
+    new_colors = []
+    gradients = []
+    for members in groups:
+        if len(gradients) >= max_gradients or len(palette) + len(new_colors) > np.iinfo(labels.dtype).max:
+            break
+        if regions['area'][members].sum() < MIN_GRADIENT_AREA:
+            continue
+
+        # Pixels of the group, with the band each belongs to.
+        x0, y0 = regions['bbox'][members, :2].min(axis=0)
+        x1, y1 = (regions['bbox'][members, :2] + regions['bbox'][members, 2:]).max(axis=0)
+        window = ids[y0:y1, x0:x1]
+        inside = np.isin(window, members)
+        ys, xs = np.nonzero(inside)
+        band = window[ys, xs]
+        xs, ys = xs + x0, ys + y0
+        index = ys * width + xs
+        pixels = flat_pixels[index]
+
+        direction, offset, slope, position = fit_ramp(pixels, np.column_stack([xs, ys]).astype(np.float64))
+
+        # The ramp must reproduce the pixels at least as well as the flat bands.
+        ramp_error = ((pixels - (offset + position[:, None] * slope)) ** 2).sum(axis=1).mean()
+        band_error = ((pixels.astype(np.float64) - palette[labels.ravel()[index]]) ** 2).sum(axis=1).mean()
+        low, high = position.min(), position.max()
+        if ramp_error > band_error or np.linalg.norm(slope) * (high - low) < MIN_RAMP:
+            continue
+
+        # Monotone: ordered by their mean position, the bands' colors progress along the ramp
+        # (pieces of one band split by another shape share a color, hence the ties).
+        order = np.searchsorted(members, band)
+        count = np.bincount(order, minlength=len(members))
+        mean_position = np.bincount(order, weights=position, minlength=len(members)) / count
+        progress = palette[regions['color'][members]].astype(np.float64) @ slope
+        if np.any(np.diff(progress[np.argsort(mean_position)]) < 0):
+            continue
+
+        # Gradient vector through the group's centroid, spanning its extent along the ramp.
+        center = np.array([xs.mean(), ys.mean()])
+        center_position = center @ direction
+        start = np.rint(center + (low - center_position) * direction).astype(int)
+        end = np.rint(center + (high - center_position) * direction).astype(int)
+        stops = [np.clip(np.rint(offset + t * slope), 0, 255).astype(np.uint8) for t in (low, high)]
+
+        palette_index = len(palette) + len(new_colors)
+        if new_labels is labels:
+            new_labels = labels.copy()
+        new_labels.ravel()[index] = palette_index
+        new_colors.append(np.clip(np.rint(pixels.mean(axis=0)), 0, 255))
+        gradients.append({'index': palette_index, 'start': tuple(start.tolist()), 'end': tuple(end.tolist()),
+                          'stops': stops})
+
+    if not gradients:
+        return labels, palette, []
+    palette = np.vstack([palette, np.asarray(new_colors, dtype=palette.dtype)])
+    return new_labels, palette, gradients
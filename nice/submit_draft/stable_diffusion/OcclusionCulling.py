@@ -0,0 +1,312 @@
+import re  # Parsing the elements of finished SVG documents
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+from PrimitiveFitter import SHAPE_CIRCLE, SHAPE_ELLIPSE, SHAPE_RECT, primitive_outline  # Outlines of circles, ellipses and rects
+
+# Side (in pixels) of the low-resolution canvas visibility is measured on.
+OCCLUSION_CANVAS = 128
+
+# An element showing at most this fraction of its own pixels is nearly fully occluded.
+MIN_VISIBLE_FRACTION = 0.02
+
+# Shape elements of a document, each with the `<defs>` block written right before it (the
+# gradient its fill refers to), which goes away with it.
+_ELEMENT = re.compile(r'(?:<defs>(?:(?!</defs>).)*</defs>)?<(polygon|path|circle|ellipse|rect)\b([^>]*)>\n?', re.S)
+# Containers whose content is never drawn by itself (gradient stops, clip and mask shapes).
+_CONTAINER = re.compile(r'<(defs|clipPath|mask|pattern|symbol|marker|linearGradient|radialGradient)\b[^>]*(?<!/)>'
+                        r'(.*?)</\1\s*>', re.S)
+_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*"([^"]*)"')
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_PATH_TOKEN = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_ROTATE = re.compile(r'^\s*rotate\(\s*([^)]*)\)\s*$')
+
+def rasterize_shape(rings, scale, evenodd=False):
+    """
+    Rasterize one shape onto the visibility canvas, cropped to its bounding box.
+
+    Every ring is filled on its own and counted with the sign of its orientation, so the
+    winding number decides coverage (the nonzero rule); with `evenodd` its parity does.
+
+    Args:
+        rings (list): (m, 2) vertex arrays in document coordinates.
+        scale (float): Canvas pixels per document unit.
+        evenodd (bool, optional): Whether to use the even-odd fill rule. Defaults to False.
+
+    Returns:
+        tuple: (x, y, mask): the canvas position of the crop and its boolean coverage, or None
+               when the shape covers no pixel center.
+    """
+    rings = [np.asarray(ring, dtype=np.float64).reshape(-1, 2) * scale for ring in rings if len(ring) >= 3]
+    if not rings:
+        return None
+    both = np.concatenate(rings)
+    x0, y0 = np.floor(both.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(both.max(axis=0)).astype(int) + 1
+
+    # Three fractional bits of vertex precision; pixel centers sit at integer coordinates.
+    if len(rings) == 1:
+        # A single ring covers the same pixels under either rule.
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.rint((rings[0] - (x0, y0)) * 8).astype(np.int32)], 1, shift=3)
+        return x0, y0, mask.view(bool)
+    winding = np.zeros((y1 - y0, x1 - x0), dtype=np.int16)
+    ring_mask = np.zeros_like(winding, dtype=np.uint8)
+    for ring in rings:
+        fixed = np.rint((ring - (x0, y0)) * 8).astype(np.int32)
+        ring_mask[:] = 0
+        cv2.fillPoly(ring_mask, [fixed], 1, shift=3)
+        if evenodd:
+            winding ^= ring_mask
+        else:
+            winding += ring_mask if cv2.contourArea(fixed.astype(np.float32), oriented=True) >= 0 else -ring_mask.astype(np.int16)
+    return x0, y0, winding != 0
+
+def visible_pixels(shapes, width, height, canvas=OCCLUSION_CANVAS, opaque=None, evenodd=None):
+    """
+    Count the pixels of every shape that remain visible once all the shapes are painted.
+
+    The shapes are rasterized at low resolution (the longer side of the document is scaled to
+    `canvas` pixels) and visited from the last painted to the first against a coverage buffer
+    of everything painted above them; opaque shapes are then added to the buffer.
+
+    Args:
+        shapes (list): In paint order, each shape's list of (m, 2) ring vertex arrays in
+            document coordinates, or None for a shape whose geometry is unknown.
+        width (float): The document width.
+        height (float): The document height.
+        canvas (int, optional): The canvas side in pixels. Defaults to OCCLUSION_CANVAS.
+        opaque (array-like, optional): Per shape, whether it hides what is below it. Defaults
+            to all shapes.
+        evenodd (array-like, optional): Per shape, whether it uses the even-odd fill rule.
+            Defaults to nonzero for all shapes.
+
+    Returns:
+        tuple: (visible, covered) int64 arrays: per shape the pixels it shows and the pixels
+               it covers on its own (0 for unknown shapes and shapes smaller than a pixel).
+    """
+    scale = canvas / max(width, height, 1)
+    size_y, size_x = int(np.ceil(height * scale)), int(np.ceil(width * scale))
+    # Margins so that every crop lands on the buffer, whatever the shape's extent.
+    buffer = np.zeros((size_y + 2, size_x + 2), dtype=bool)
+
+    visible = np.zeros(len(shapes), dtype=np.int64)
+    covered = np.zeros(len(shapes), dtype=np.int64)
+    for i in range(len(shapes) - 1, -1, -1):
+        if shapes[i] is None:
+            continue
+        raster = rasterize_shape(shapes[i], scale, evenodd=bool(evenodd[i]) if evenodd is not None else False)
+        if raster is None:
+            continue
+        x, y, mask = raster
+        # Clip the crop to the document (plus the one-pixel margin).
+        left, top = max(-x - 1, 0), max(-y - 1, 0)
+        right = min(mask.shape[1], size_x + 1 - x)
+        bottom = min(mask.shape[0], size_y + 1 - y)
+        if left >= right or top >= bottom:
+            continue
+        mask = mask[top:bottom, left:right]
+        window = buffer[y + top + 1:y + bottom + 1, x + left + 1:x + right + 1]
+        covered[i] = np.count_nonzero(mask)
+        visible[i] = np.count_nonzero(mask & ~window)
+        if opaque is None or opaque[i]:
+            window |= mask
+    return visible, covered
+
+def occluded(visible, covered, min_visible=MIN_VISIBLE_FRACTION):
+    """
+    Flag the shapes that are fully or nearly fully occluded.
+
+    Shapes too small to cover a pixel of the canvas are never flagged.
+
+    Args:
+        visible (np.ndarray): The visible pixels of each shape (see `visible_pixels`).
+        covered (np.ndarray): The pixels each shape covers on its own.
+        min_visible (float, optional): The largest visible fraction of a shape's pixels that
+            still counts as occluded. Defaults to MIN_VISIBLE_FRACTION.
+
+    Returns:
+        np.ndarray: (n,) bool, True for the occluded shapes.
+    """
+    return (covered > 0) & (visible <= min_visible * covered)
+
+def _path_rings(data):
+    """
+    Parse path data made of straight segments (M, L, H, V, Z, absolute or relative) into rings.
+
+    Returns:
+        list: The (m, 2) vertex arrays of the subpaths, or None if the data has other commands.
+    """
+    rings, ring = [], []
+    x = y = start_x = start_y = 0.0
+    command = None
+    tokens = _PATH_TOKEN.findall(data)
+    i = 0
+    try:
+        while i < len(tokens):
+            if tokens[i].isalpha():
+                command = tokens[i]
+                i += 1
+                if command in 'Zz':
+                    if ring:
+                        rings.append(ring)
+                    ring = []
+                    x, y = start_x, start_y
+                    continue
+            elif command is None:
+                return None
+            if command in 'Mm':
+                dx, dy = float(tokens[i]), float(tokens[i + 1])
+                i += 2
+                x, y = (x + dx, y + dy) if command == 'm' else (dx, dy)
+                if ring:
+                    rings.append(ring)
+                ring = [(x, y)]
+                start_x, start_y = x, y
+                command = 'l' if command == 'm' else 'L'  # Further pairs are lineto.
+            elif command in 'Ll':
+                dx, dy = float(tokens[i]), float(tokens[i + 1])
+                i += 2
+                x, y = (x + dx, y + dy) if command == 'l' else (dx, dy)
+                ring.append((x, y))
+            elif command in 'Hh':
+                x = x + float(tokens[i]) if command == 'h' else float(tokens[i])
+                i += 1
+                ring.append((x, y))
+            elif command in 'Vv':
+                y = y + float(tokens[i]) if command == 'v' else float(tokens[i])
+                i += 1
+                ring.append((x, y))
+            else:
+                return None  # Curves and arcs.
+    except (IndexError, ValueError):
+        return None
+    if ring:
+        rings.append(ring)
+    return [np.array(r, dtype=np.float64) for r in rings]
+
+def _apply_transform(rings, transform):
+    """Apply a `rotate(angle [cx cy])` transform to rings; None for any other transform."""
+    if not transform.strip():
+        return rings
+    match = _ROTATE.match(transform)
+    if match is None:
+        return None
+    values = [float(v) for v in _NUMBER.findall(match.group(1))]
+    if len(values) not in (1, 3):
+        return None
+    angle, cx, cy = (values + [0.0, 0.0])[:3] if len(values) == 1 else values
+    theta = np.deg2rad(angle)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    return [(ring - (cx, cy)) @ rotation.T + (cx, cy) for ring in rings]
+
+def _element_shape(tag, attributes):
+    """Return the rings of one shape element, or None if its geometry is not understood."""
+    number = lambda name: float(attributes.get(name, 0) or 0)
+    try:
+        if tag == 'polygon':
+            values = [float(v) for v in _NUMBER.findall(attributes.get('points', ''))]
+            rings = [np.array(values[:len(values) // 2 * 2], dtype=np.float64).reshape(-1, 2)]
+        elif tag == 'path':
+            rings = _path_rings(attributes.get('d', ''))
+        elif tag == 'rect':
+            w, h = number('width'), number('height')
+            rings = [primitive_outline(SHAPE_RECT, (number('x') + w / 2, number('y') + h / 2, w, h, 0))]
+        elif tag == 'circle':
+            diameter = 2 * number('r')
+            rings = [primitive_outline(SHAPE_CIRCLE, (number('cx'), number('cy'), diameter, diameter, 0))]
+        else:
+            rings = [primitive_outline(SHAPE_ELLIPSE, (number('cx'), number('cy'), 2 * number('rx'), 2 * number('ry'), 0))]
+    except ValueError:
+        return None
+    if rings is None:
+        return None
+    return _apply_transform(rings, attributes.get('transform', ''))
+
+def _paint(attributes):
+    """Return (opaque, evenodd) of an element from its attributes and its style attribute."""
+    style = dict(attributes)
+    for declaration in attributes.get('style', '').split(';'):
+        if ':' in declaration:
+            name, value = declaration.split(':', 1)
+            style[name.strip()] = value.strip()
+    try:
+        opacity = float(style.get('opacity', 1)) * float(style.get('fill-opacity', 1))
+    except ValueError:
+        opacity = 0.0
+    opaque = style.get('fill', '#000').strip() not in ('none', 'transparent') and opacity >= 1
+    return opaque, style.get('fill-rule', 'nonzero').strip() == 'evenodd'
+
+def _length(value):
+    """Parse an SVG length such as "512" or "512px" as a number of user units."""
+    match = _NUMBER.match(value.strip())
+    return float(match.group(0)) if match else 0.0
+
+def svg_size(svg):
+    """Return the (width, height) of a document's coordinate system: its viewBox, or its size attributes."""
+    header = re.search(r'<svg\b[^>]*>', svg)
+    attributes = dict(_ATTRIBUTE.findall(header.group(0))) if header else {}
+    view_box = [float(v) for v in _NUMBER.findall(attributes.get('viewBox', ''))]
+    if len(view_box) == 4:
+        return view_box[2], view_box[3]
+    return _length(attributes.get('width', '')), _length(attributes.get('height', ''))
+
+def _hide_containers(svg):
+    """Blank out the content of every `_CONTAINER` of `svg`, keeping all positions in place."""
+    def blank(match):
+        start, end = match.span(2)
+        text = match.group(0)
+        offset = match.start()
+        return text[:start - offset] + ' ' * (end - start) + text[end - offset:]
+    return _CONTAINER.sub(blank, svg)
+
+def cull_svg(svg, min_visible=MIN_VISIBLE_FRACTION, canvas=OCCLUSION_CANVAS):
+    """
+    Remove the fully or nearly fully occluded elements of a finished SVG document.
+
+    Works on any flat document of `<polygon>`, `<path>` (straight segments), `<circle>`,
+    `<ellipse>` and `<rect>` elements, such as the output of `bitmap_to_svg_layered` or of
+    the VLM `create_enhanced_svg`. Elements with a transparent fill occlude nothing, and
+    elements whose geometry is not understood (curves, transforms other than rotations) are
+    neither occluders nor removed. Shapes inside `<defs>`, `<clipPath>`, `<mask>` and other
+    containers that are not drawn by themselves are ignored. The first element, the
+    background, is always kept. A removed element takes the `<defs>` written right before it
+    along.
+
+    Args:
+        svg (str): The SVG document.
+        min_visible (float, optional): See `occluded`. Defaults to MIN_VISIBLE_FRACTION.
+        canvas (int, optional): See `visible_pixels`. Defaults to OCCLUSION_CANVAS.
+
+    Returns:
+        tuple: (svg, removed): the document without the occluded elements and their number.
+    """
+    width, height = svg_size(svg)
+    # Only the top-level drawable elements count: shapes inside `<defs>`, `<clipPath>` and the
+    # like are found in a copy with those contents blanked out, at the same positions.
+    matches = list(_ELEMENT.finditer(_hide_containers(svg)))
+    if not matches or width <= 0 or height <= 0:
+        return svg, 0
+
+    shapes, opaque, evenodd = [], [], []
+    for match in matches:
+        attributes = dict(_ATTRIBUTE.findall(match.group(2)))
+        shapes.append(_element_shape(match.group(1), attributes))
+        paint = _paint(attributes)
+        opaque.append(paint[0])
+        evenodd.append(paint[1])
+
+    visible, covered = visible_pixels(shapes, width, height, canvas=canvas, opaque=opaque, evenodd=evenodd)
+    remove = occluded(visible, covered, min_visible=min_visible)
+    remove[0] = False  # The background.
+    if not remove.any():
+        return svg, 0
+
+    parts, position = [], 0
+    for match in (m for m, drop in zip(matches, remove) if drop):
+        parts.append(svg[position:match.start()])
+        position = match.end()
+    parts.append(svg[position:])
+    return ''.join(parts), int(remove.sum())
@@ -0,0 +1,187 @@
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+# Primitive kinds stored in `FeatureTable.shape`.
+SHAPE_POLYGON = 0
+SHAPE_CIRCLE = 1
+SHAPE_ELLIPSE = 2
+SHAPE_RECT = 3
+
+# Minimum intersection over union between a region's contour and the primitive replacing it.
+PRIMITIVE_IOU = 0.92
+
+# Allowance for rasterization when the areas of a contour and a primitive bound their IoU.
+AREA_SLACK = 0.03
+
+# Side of the canvas the polygon and the candidate primitive are rasterized on to measure IoU.
+IOU_CANVAS = 64
+
+def _normalize_angle(width, height, angle):
+    """
+    Bring a rotated box or ellipse to an angle in (-45, 45] degrees.
+
+    Both shapes are symmetric under a half turn, and a quarter turn only swaps their axes.
+    """
+    reduced = (angle + 45) % 90 - 45
+    if reduced == -45:
+        reduced = 45
+    if round((angle - reduced) / 90) % 2:
+        width, height = height, width
+    return width, height, reduced
+
+def primitive_outline(kind, params, samples=72):
+    """
+    Return the outline of a primitive as polygon vertices.
+
+    Args:
+        kind (int): SHAPE_CIRCLE, SHAPE_ELLIPSE or SHAPE_RECT.
+        params (array-like): (center x, center y, width, height, angle in degrees).
+        samples (int, optional): Vertices used for curved outlines. Defaults to 72.
+
+    Returns:
+        np.ndarray: (m, 2) float64 vertices.
+    """
+    cx, cy, width, height, angle = (float(v) for v in params)
+    if kind == SHAPE_RECT:
+        return cv2.boxPoints(((cx, cy), (width, height), angle)).astype(np.float64)
+    t = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    x, y = width / 2 * np.cos(t), height / 2 * np.sin(t)
+    theta = np.deg2rad(angle)
+    return np.stack([cx + x * np.cos(theta) - y * np.sin(theta),
+                     cy + x * np.sin(theta) + y * np.cos(theta)], axis=1)
+
+def shape_iou(points, kind, params):
+    """
+    Measure the intersection over union of a polygon and a primitive by rasterizing both.
+
+    The two shapes are drawn on a canvas of about IOU_CANVAS pixels per side (scaled up for
+    small shapes and down for large ones) with sub-pixel vertex precision.
+
+    Args:
+        points (np.ndarray): (n, 2) polygon vertices.
+        kind (int): The primitive kind.
+        params (array-like): The primitive parameters.
+
+    Returns:
+        float: The IoU, between 0 and 1.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    outline = primitive_outline(kind, params)
+    both = np.concatenate([points, outline])
+    origin = both.min(axis=0)
+    scale = IOU_CANVAS / max(float((both.max(axis=0) - origin).max()), 1.0)
+    size = IOU_CANVAS + 2
+
+    def rasterize(vertices):
+        canvas = np.zeros((size, size), dtype=np.uint8)
+        # Three fractional bits of vertex precision.
+        fixed = np.rint((vertices - origin) * scale * 8).astype(np.int32)
+        cv2.fillPoly(canvas, [fixed], 1, shift=3)
+        return canvas.astype(bool)
+
+    polygon, primitive = rasterize(points), rasterize(outline)
+    union = np.count_nonzero(polygon | primitive)
+    return np.count_nonzero(polygon & primitive) / union if union else 0.0
+
+def _number(value, decimals):
+    """Print a coordinate with at most the given number of decimals (no trailing zeros, and
+    integers without a point)."""
+    if not decimals:
+        return str(int(round(value)))
+    text = f'{value:.{decimals}f}'.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def format_primitive(kind, params, color, decimals=0):
+    """
+    Format a primitive as an SVG element.
+
+    Circles become `<circle>`, ellipses `<ellipse>` and boxes `<rect>`; a rotated ellipse or
+    box gets a `rotate` transform around its center (angles are printed in whole degrees, and
+    omitted when they round to 0).
+
+    Args:
+        kind (int): SHAPE_CIRCLE, SHAPE_ELLIPSE or SHAPE_RECT.
+        params (array-like): (center x, center y, width, height, angle in degrees).
+        color (str): The fill color.
+        decimals (int, optional): Decimals printed for lengths and coordinates. Defaults to 0.
+
+    Returns:
+        str: The element, ending with a newline.
+    """
+    cx, cy, width, height, angle = (float(v) for v in params)
+    x, y = _number(cx, decimals), _number(cy, decimals)
+    rotation = int(round(angle))
+    transform = f' transform="rotate({rotation} {x} {y})"' if rotation else ''
+    if kind == SHAPE_CIRCLE:
+        return f'<circle cx="{x}" cy="{y}" r="{_number(width / 2, decimals)}" fill="{color}"/>\n'
+    if kind == SHAPE_ELLIPSE:
+        return (f'<ellipse cx="{x}" cy="{y}" rx="{_number(width / 2, decimals)}" ry="{_number(height / 2, decimals)}"'
+                f'{transform} fill="{color}"/>\n')
+    if kind == SHAPE_RECT:
+        return (f'<rect x="{_number(cx - width / 2, decimals)}" y="{_number(cy - height / 2, decimals)}" '
+                f'width="{_number(width, decimals)}" height="{_number(height, decimals)}"{transform} fill="{color}"/>\n')
+    raise ValueError(f"Unknown primitive: {kind!r}")
+
+def fit_primitive(contour, color, polygon=None, tolerance=PRIMITIVE_IOU):
+    """
+    Find the cheapest primitive that matches a region contour.
+
+    The candidates are a rotated rectangle (`cv2.minAreaRect`), a rotated ellipse
+    (`cv2.fitEllipse`, for contours with at least 5 points) and the circle of the same area
+    centered on that ellipse. A candidate qualifies when its IoU with the contour is at least
+    `tolerance` and its integer element is shorter than the integer polygon element the
+    feature would otherwise be drawn as.
+
+    Fitting and IoU use the full traced contour rather than the simplified polygon: a smooth
+    shape is simplified to a handful of vertices, which would understate how well it matches.
+
+    Most contours are rejected before any IoU is rasterized: polygons no longer than the
+    shortest possible primitive element are never fitted, and a candidate whose area differs
+    from the contour's by more than the IoU allows (IoU <= smaller area / larger area) is not
+    measured.
+
+    Args:
+        contour (np.ndarray): (n, 2) boundary points of the region, as traced.
+        color (str): The fill color, which is part of both element sizes.
+        polygon (np.ndarray, optional): (m, 2) vertices of the simplified polygon. Defaults to
+            the contour itself.
+        tolerance (float, optional): The minimum IoU. Defaults to PRIMITIVE_IOU.
+
+    Returns:
+        tuple: (kind, params) of the best primitive, or (SHAPE_POLYGON, None) if none qualifies.
+    """
+    points = np.asarray(contour, dtype=np.float32).reshape(-1, 2)
+    if len(points) < 3:
+        return SHAPE_POLYGON, None
+    polygon = points if polygon is None else np.asarray(polygon).reshape(-1, 2)
+    vertices = " ".join(f"{x},{y}" for x, y in polygon.astype(int).tolist())
+    polygon_bytes = len(f'<polygon points="{vertices}" fill="{color}" />\n')
+    if polygon_bytes <= len(format_primitive(SHAPE_CIRCLE, (0, 0, 0, 0, 0), color)):
+        return SHAPE_POLYGON, None  # No primitive element can be shorter.
+
+    candidates = []
+    (cx, cy), (width, height), angle = cv2.minAreaRect(points)
+    candidates.append((SHAPE_RECT, (cx, cy, *_normalize_angle(width, height, angle))))
+    if len(points) >= 5:
+        (cx, cy), (width, height), angle = cv2.fitEllipse(points)
+        candidates.append((SHAPE_ELLIPSE, (cx, cy, *_normalize_angle(width, height, angle))))
+        diameter = np.sqrt(width * height)
+        candidates.append((SHAPE_CIRCLE, (cx, cy, diameter, diameter, 0.0)))
+
+    # The IoU bound from the areas alone, with slack for the rasterization of both shapes.
+    contour_area = max(cv2.contourArea(points), 1.0)
+    best, best_key = (SHAPE_POLYGON, None), (polygon_bytes, 0.0)
+    for kind, params in candidates:
+        if not np.all(np.isfinite(params)) or min(params[2], params[3]) <= 0:
+            continue
+        area = params[2] * params[3] * (1.0 if kind == SHAPE_RECT else np.pi / 4)
+        if min(area, contour_area) / max(area, contour_area) < tolerance - AREA_SLACK:
+            continue
+        nbytes = len(format_primitive(kind, params, color))
+        if nbytes >= best_key[0]:
+            continue
+        iou = shape_iou(points, kind, params)
+        if iou >= tolerance:
+            best, best_key = (kind, params), (nbytes, iou)
+    return best
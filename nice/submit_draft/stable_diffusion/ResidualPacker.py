@@ -0,0 +1,278 @@
+import heapq  # Lazy greedy priority queue
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+from BudgetPacker import SKIP  # The skipped-feature marker
+
+# Side (in pixels) of the low-resolution canvas the residual is tracked on.
+RESIDUAL_CANVAS = 96
+
+# The most important features scored against the render; the rest only fill leftover bytes.
+MAX_CANDIDATES = 256
+
+class ResidualPacker:
+    """
+    Error-driven feature selection against a running low-resolution render.
+
+    Instead of a static importance score, every candidate feature is scored by how much it
+    reduces the squared color error of the render drawn so far, per byte. The target image
+    and the render are kept at low resolution (the longer side scaled to `canvas` pixels).
+    A feature is rasterized once, as the canvas pixels it covers, so scoring a candidate and
+    drawing it only touch those pixels; it is first scored by a bound from its bounding box
+    (see `gain_bounds`) and only rasterized when that bound reaches the top of the queue.
+
+    Features are painted in a fixed order (importance order, see
+    `SimplificationPyramid.paint_order`), not in the order they are selected: a candidate
+    only changes the pixels where no selected feature painted after it is on top.
+
+    The selection is a lazy greedy over the `max_candidates` most important features (the
+    others only fill the bytes left over, in importance order): candidates sit in a priority
+    queue under their last score, and the best one is rescored before it is taken; if it is
+    no longer the best it goes back in. A feature is a candidate twice: with all of its
+    vertices at the cheapest of levels 0-2, and decimated at level 3, each scored on its own
+    geometry (once, at the cheaper, when decimating it changes no pixel); taking one
+    withdraws the other. The bytes left at the end restore the full geometry of the drawn
+    features that were decimated, largest error reduction per byte first.
+
+    Args:
+        img_rgb (np.ndarray): The (H, W, 3) image being vectorized (or (H, W) grayscale).
+        background (array-like): The RGB color of the background rectangle.
+        canvas (int, optional): The canvas side in pixels. Defaults to RESIDUAL_CANVAS.
+        max_candidates (int, optional): The number of features, by importance, scored against
+            the render. Defaults to MAX_CANDIDATES.
+    """
+
+    def __init__(self, img_rgb, background, canvas=RESIDUAL_CANVAS, max_candidates=MAX_CANDIDATES):
+        img = np.asarray(img_rgb)
+        if img.ndim == 2:
+            img = np.repeat(img[:, :, None], 3, axis=2)
+        height, width = img.shape[:2]
+        scale = canvas / max(width, height)
+        self.size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        self.scale = np.array([self.size[0] / width, self.size[1] / height])
+        self.target = cv2.resize(img[:, :, :3].astype(np.float32), self.size, interpolation=cv2.INTER_AREA).reshape(-1, 3)
+        self.background = np.asarray(background, dtype=np.float32)[:3]
+        self.max_candidates = max_candidates
+        self._pyramid = None
+        self._pixels = None
+        self._same = None
+
+    def feature_pixels(self, pyramid, i, level):
+        """Return the flat canvas indices of the pixels feature `i` covers at `level`."""
+        # Canvas pixel centers sit half a pixel in from the edges of the pixels they average;
+        # three fractional bits of vertex precision, as in `OcclusionCulling.rasterize_shape`.
+        rings = [np.rint((ring * self.scale - 0.5) * 8).astype(np.int32) for ring in pyramid.outline(i, level) if len(ring) >= 3]
+        if not rings:
+            return np.zeros(0, dtype=np.intp)
+        both = np.concatenate(rings)
+        x0, y0 = np.maximum(both.min(axis=0) >> 3, 0)
+        x1, y1 = np.minimum((both.max(axis=0) >> 3) + 2, self.size)
+        if x1 <= x0 or y1 <= y0:
+            return np.zeros(0, dtype=np.intp)
+        # Holes lie inside the outer ring and apart from each other, so filling all the rings at
+        # once (by parity) covers the same pixels as the nonzero rule.
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, rings, 1, offset=(-8 * int(x0), -8 * int(y0)), shift=3)
+        ys, xs = np.nonzero(mask)
+        return (ys + y0) * self.size[0] + xs + x0
+
+    def _use(self, pyramid):
+        """Forget the rasterized features when a new pyramid is packed (culling re-packs the same one)."""
+        if self._pyramid is not pyramid:
+            # Decimation keeps every vertex of small polygons, and primitives have one outline.
+            self._same = ((pyramid.lengths[3] == pyramid.lengths[2]) & (pyramid.features.hole_count == 0)) | pyramid.primitive
+            self._pixels = {}
+            self._pyramid = pyramid
+
+    def pixels(self, pyramid, i, geometry):
+        """Return the canvas pixels of feature `i` with all of its vertices (`geometry` 2) or
+        decimated (3), rasterizing it the first time it is asked for."""
+        self._use(pyramid)
+        if geometry == 3 and self._same[i]:
+            geometry = 2
+        if (i, geometry) not in self._pixels:
+            self._pixels[i, geometry] = self.feature_pixels(pyramid, i, geometry)
+        return self._pixels[i, geometry]
+
+    def gain_bounds(self, pyramid, candidates, error, colors):
+        """
+        Bound the gain of every candidate from its bounding box, without rasterizing it.
+
+        A candidate can at most remove, over the pixels of its box, the error its color does
+        not have there; summed-area tables of that positive part, one per color, answer every
+        box at once.
+
+        Args:
+            pyramid (SimplificationPyramid): The features.
+            candidates (np.ndarray): The indices of the candidate features.
+            error (np.ndarray): The squared error of every canvas pixel as rendered so far.
+            colors (np.ndarray): (n, 3) float32 RGB color of every feature.
+
+        Returns:
+            np.ndarray: The upper bound of the gain of each candidate.
+        """
+        width, height = self.size
+        # The canvas pixels whose centers the box covers, with a pixel of margin for the rasterizer.
+        box = pyramid.bbox[candidates] * np.tile(self.scale, 2) - 0.5
+        x0 = np.clip(np.floor(box[:, 0]).astype(np.int64) - 1, 0, width)
+        y0 = np.clip(np.floor(box[:, 1]).astype(np.int64) - 1, 0, height)
+        x1 = np.clip(np.ceil(box[:, 2]).astype(np.int64) + 2, 0, width)
+        y1 = np.clip(np.ceil(box[:, 3]).astype(np.int64) + 2, 0, height)
+
+        bounds = np.zeros(len(candidates))
+        color_index = pyramid.features.color_index[candidates]
+        for color in np.unique(color_index).tolist():
+            members = np.flatnonzero(color_index == color)
+            i = candidates[members[0]]
+            reduction = np.maximum(error - ((self.target - colors[i]) ** 2).sum(axis=1), 0).reshape(height, width)
+            table = cv2.integral(reduction.astype(np.float64))
+            rows0, rows1, cols0, cols1 = y0[members], y1[members], x0[members], x1[members]
+            bounds[members] = table[rows1, cols1] - table[rows0, cols1] - table[rows1, cols0] + table[rows0, cols0]
+        return bounds
+
+    def pack(self, pyramid, budget, keep=None):
+        """
+        Choose a level (or skip) for every feature of a pyramid within a byte budget.
+
+        Args:
+            pyramid (SimplificationPyramid): The features and their byte costs.
+            budget (int): The number of bytes available for features.
+            keep (np.ndarray, optional): (n,) bool mask of the features that may be drawn.
+                Defaults to all.
+
+        Returns:
+            np.ndarray: (n,) int8 level of each feature, SKIP when it is not drawn.
+        """
+        features = pyramid.features
+        num_features = len(features)
+        levels = np.full(num_features, SKIP, dtype=np.int8)
+        candidates = np.arange(num_features) if keep is None else np.flatnonzero(keep)
+        if len(candidates) == 0 or budget <= 0:
+            return levels
+
+        rank = np.empty(num_features, dtype=np.int64)
+        rank[pyramid.paint_order(np.zeros(num_features, dtype=np.int8))] = np.arange(num_features)
+
+        # Squared error of every pixel as rendered so far, and the paint rank of the feature on top.
+        error = ((self.target - self.background) ** 2).sum(axis=1)
+        top = np.full(len(error), -1, dtype=np.int64)
+        # The pixels of every candidate and their squared error when that candidate is on top,
+        # filled in as candidates are rasterized, the first time they reach the top of the queue.
+        colors = features.palette[features.color_index].astype(np.float32)
+        new_error = {}
+
+        # The cheapest level with every vertex, and the decimated level, with their costs.
+        full_level = np.argmin(pyramid.cost[:, :3], axis=1)
+        option_cost = {2: pyramid.cost[np.arange(num_features), full_level].tolist(), 3: pyramid.cost[:, 3].tolist()}
+        group_of, group_cost = pyramid.group.tolist(), pyramid.group_cost.tolist()
+        group_used = np.zeros(len(pyramid.group_cost), dtype=bool)
+
+        # A feature whose decimation covers the same pixels is only a candidate at the cheaper option.
+        self._use(pyramid)
+        same = self._same.tolist()
+
+        def options(i):
+            if not same[i]:
+                return (2, 3)
+            return (3,) if option_cost[3][i] < option_cost[2][i] else (2,)
+
+        def option_level(i, geometry):
+            return int(full_level[i]) if geometry == 2 else 3
+
+        def cost_of(i, geometry):
+            group = group_of[i]
+            return int(option_cost[geometry][i]) + (0 if group_used[group] else int(group_cost[group]))
+
+        def gain_of(i, geometry):
+            if (i, geometry) not in new_error:
+                index = self.pixels(pyramid, i, geometry)
+                new_error[i, geometry] = index, ((self.target[index] - colors[i]) ** 2).sum(axis=1)
+            index, after = new_error[i, geometry]
+            shown = top[index] < rank[i]
+            index, after = index[shown], after[shown]
+            return float((error[index] - after).sum()), index, after
+
+        # Initial scores: a bound of the gain over the background alone. The rendered error only
+        # goes down, so the last gain found for a candidate stays a bound: queued scores are only
+        # ever upper bounds, and a candidate is rasterized only once it reaches the top.
+        scored = candidates[np.argsort(-features.importance[candidates], kind='stable')[:self.max_candidates]]
+        heap, bounds = [], {}
+        for i, bound in zip(scored.tolist(), self.gain_bounds(pyramid, scored, error, colors).tolist()):
+            if bound > 0:
+                for geometry in options(i):
+                    bounds[i, geometry] = bound
+                    heap.append((-bound / cost_of(i, geometry), i, geometry))
+        heapq.heapify(heap)
+
+        used = 0
+        while heap:
+            _, i, geometry = heapq.heappop(heap)
+            if levels[i] != SKIP:
+                continue  # The feature was already drawn through its other option.
+            cost = cost_of(i, geometry)
+            if used + cost > budget:
+                continue  # Only a group becoming used could make it fit again; it is requeued then.
+            gain, index, after = gain_of(i, geometry)
+            bounds[i, geometry] = gain
+            if gain <= 0:
+                continue
+            score = gain / cost
+            if heap and score < -heap[0][0]:
+                heapq.heappush(heap, (-score, i, geometry))  # No longer the best: requeue under its fresh score.
+                continue
+
+            # Draw it: its pixels now carry its color.
+            levels[i] = option_level(i, geometry)
+            used += cost
+            error[index] = after
+            top[index] = rank[i]
+            group = pyramid.group[i]
+            if not group_used[group]:
+                group_used[group] = True
+                if pyramid.group_cost[group] > 0:
+                    # The rest of the group got cheaper: requeue it under its bounds at the new cost.
+                    for j in scored[(pyramid.group[scored] == group) & (levels[scored] == SKIP)].tolist():
+                        for option in (2, 3):
+                            if bounds.get((j, option), 0) > 0:
+                                heapq.heappush(heap, (-bounds[j, option] / cost_of(j, option), j, option))
+
+        # Details below the canvas resolution score nothing there: spend what is left on the
+        # remaining features in importance order, at their cheapest level.
+        for i in candidates[np.argsort(-features.importance[candidates], kind='stable')].tolist():
+            if levels[i] != SKIP:
+                continue
+            geometry = 2 if pyramid.cost[i, full_level[i]] <= pyramid.cost[i, 3] else 3
+            cost = cost_of(i, geometry)
+            if used + cost <= budget:
+                levels[i] = option_level(i, geometry)
+                used += cost
+                group_used[pyramid.group[i]] = True
+
+        # Spend what is left on the full geometry of every feature drawn decimated, the largest
+        # error reduction per extra byte first (lazily rescored, as above). Levels 0-2 draw the
+        # same geometry, so only a decimation that changes pixels is worth undoing.
+        upgrades = []
+        for i in np.flatnonzero(levels == 3).tolist():
+            extra = option_cost[2][i] - option_cost[3][i]
+            if not same[i] and used + extra <= budget:
+                upgrades.append((-gain_of(i, 2)[0] / max(extra, 1), i))
+        heapq.heapify(upgrades)
+        while upgrades:
+            _, i = heapq.heappop(upgrades)
+            extra = option_cost[2][i] - option_cost[3][i]
+            if used + extra > budget:
+                continue
+            gain, index, after = gain_of(i, 2)
+            score = gain / max(extra, 1)
+            if upgrades and score < -upgrades[0][0]:
+                heapq.heappush(upgrades, (-score, i))
+                continue
+            # The traced outline is the better drawing even where the canvas is too coarse to
+            # show it, so every upgrade that fits is made.
+            levels[i] = option_level(i, 2)
+            used += extra
+            error[index] = after
+            top[index] = rank[i]
+        return levels
@@ -0,0 +1,82 @@
+import io  # In-memory binary streams for the default output buffer
+
+class SVGWriter:
+    """
+    Incremental SVG document writer with a running byte count.
+
+    Elements are encoded once and written straight to a binary file object (an `io.BytesIO`
+    by default), so checking whether the next element still fits costs O(element) instead of
+    re-encoding the whole document. The closing tag is reserved up front, so a document that
+    is closed never exceeds `max_size_bytes`.
+
+    Args:
+        fp (file object, optional): A binary stream to write to. Defaults to a new `io.BytesIO`.
+        max_size_bytes (int, optional): The maximum size of the finished document, or None for
+            no limit. Defaults to None.
+        footer (str, optional): The closing text written by `close`. Defaults to '</svg>'.
+    """
+
+    def __init__(self, fp=None, max_size_bytes=None, footer='</svg>'):
+        self.fp = fp if fp is not None else io.BytesIO()
+        self.max_size_bytes = max_size_bytes
+        self.footer = footer.encode('utf-8')
+        self.bytes_written = 0
+
+    def begin(self, text):
+        """Write the document header (and anything else that must always be present) unconditionally."""
+        data = text.encode('utf-8')
+        self.fp.write(data)
+        self.bytes_written += len(data)
+
+    def fits(self, size):
+        """Return True if `size` more bytes still leave room for the footer within the limit."""
+        if self.max_size_bytes is None:
+            return True
+        return self.bytes_written + size + len(self.footer) <= self.max_size_bytes
+
+    def write(self, element):
+        """
+        Write one element if it fits.
+
+        Args:
+            element (str or bytes): The element text.
+
+        Returns:
+            bool: True if the element was written, False if it would exceed the limit.
+        """
+        data = element.encode('utf-8') if isinstance(element, str) else element
+        if not self.fits(len(data)):
+            return False
+        self.fp.write(data)
+        self.bytes_written += len(data)
+        return True
+
+    def write_all(self, elements):
+        """
+        Write elements from an iterable until the first one that does not fit.
+
+        The iterable is consumed lazily, so a generator only formats the elements that are
+        actually considered.
+
+        Args:
+            elements (iterable): Element strings (or bytes), in paint order.
+
+        Returns:
+            int: The number of elements written.
+        """
+        count = 0
+        for element in elements:
+            if not self.write(element):
+                break
+            count += 1
+        return count
+
+    def close(self):
+        """Write the footer and return the total number of bytes written."""
+        self.fp.write(self.footer)
+        self.bytes_written += len(self.footer)
+        return self.bytes_written
+
+    def getvalue(self):
+        """Return the document written so far as a string (only for in-memory buffers)."""
+        return self.fp.getvalue().decode('utf-8')
@@ -0,0 +1,450 @@
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+from PrimitiveFitter import SHAPE_POLYGON, format_primitive, primitive_outline  # Elements of features fitted with a primitive
+
+# Coordinate decimals emitted at each simplification level (0-3).
+LEVEL_DECIMALS = (1, 1, 0, 0)
+
+# Fixed text of a polygon element: <polygon points="..." fill="..." />\n
+POLYGON_OPEN = '<polygon points="'
+POLYGON_FILL = '" fill="'
+POLYGON_CLOSE = '" />\n'
+
+# Fixed text of the compact encoding's per-color element: <path fill="..." d="..."/>\n
+PATH_OPEN = '<path fill="'
+PATH_DATA = '" d="'
+PATH_CLOSE = '"/>\n'
+
+ENCODINGS = ('polygon', 'path')
+
+def digit_counts(values):
+    """
+    Count the characters needed to print each integer in `values` (including a minus sign).
+
+    Args:
+        values (np.ndarray): An integer array.
+
+    Returns:
+        np.ndarray: An int32 array of the same shape holding the printed length of each value.
+    """
+    magnitude = np.abs(values.astype(np.int64))
+    counts = np.ones(values.shape, dtype=np.int32)
+    for power in (10, 100, 1000, 10000, 100000):
+        counts += magnitude >= power
+    counts += values < 0
+    return counts
+
+def decimate_mask(lengths):
+    """
+    Select the vertices kept by the point-reduction level of `simplify_polygon`.
+
+    Polygons with more than 5 vertices keep every other vertex plus the last one; smaller
+    polygons keep all of their vertices.
+
+    Args:
+        lengths (np.ndarray): The vertex count of each polygon.
+
+    Returns:
+        np.ndarray: A boolean mask over the concatenated vertices of all polygons.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    # Position of each vertex within its own polygon.
+    local = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+    polygon_length = np.repeat(lengths, lengths)
+    # The step is min(2, n // 3), i.e. 1 (keep all) for n <= 5 and 2 otherwise.
+    return (polygon_length <= 5) | (local % 2 == 0) | (local == polygon_length - 1)
+
+def _segment_command(dx, dy):
+    """Return the path command of each relative segment: 'h' (horizontal), 'v' (vertical) or 'l'."""
+    return np.where(dy == 0, 'h', np.where(dx == 0, 'v', 'l'))
+
+def format_subpath(points):
+    """
+    Format a closed polygon as compact path data with integer relative segments.
+
+    The subpath starts with an absolute moveto and continues with `l`, `h` and `v` segments.
+    The first segment always prints its command letter (numbers right after an absolute
+    moveto would be absolute lineto coordinates); later ones only when it differs from the
+    previous segment's. Zero-length segments are dropped, and numbers are separated by a space
+    only when the next one has no minus sign. `z` closes the subpath back to its start.
+
+    Args:
+        points (np.ndarray): (n, 2) integer vertices.
+
+    Returns:
+        str: The subpath data, e.g. "M10 20l5-3 2 1h4v-2z".
+    """
+    points = np.asarray(points, dtype=np.int64)
+    x0, y0 = points[0].tolist()
+    parts = [f'M{x0}', ' ' if y0 >= 0 else '', str(y0)]
+    deltas = np.diff(points, axis=0)
+    deltas = deltas[(deltas != 0).any(axis=1)]
+    previous = 'M'
+    for command, (dx, dy) in zip(_segment_command(deltas[:, 0], deltas[:, 1]).tolist(), deltas.tolist()):
+        numbers = (dx, dy) if command == 'l' else (dx,) if command == 'h' else (dy,)
+        if command != previous:
+            parts.append(command)
+        elif numbers[0] >= 0:
+            parts.append(' ')
+        parts.append(str(numbers[0]))
+        if command == 'l':
+            parts.append(f' {dy}' if dy >= 0 else str(dy))
+        previous = command
+    parts.append('z')
+    return ''.join(parts)
+
+class SimplificationPyramid:
+    """
+    Precomputed simplification levels for every feature of a FeatureTable.
+
+    The pyramid is built once from the numeric contours. For each level it stores the vertex
+    subset that level keeps and the coordinate precision it prints with, together with the
+    exact byte size of the resulting polygon element, computed arithmetically from digit
+    counts. Strings are only formatted for the (feature, level) pairs that are emitted.
+
+    Levels follow `simplify_polygon`: 0 and 1 print every vertex with 1 decimal, 2 prints
+    every vertex as an integer, and 3 prints about half of the vertices as integers. The
+    vertices of a FeatureTable are integers, though, so levels 0-2 print them the same way,
+    without decimals (which would only append ".0" to every coordinate), at the same cost;
+    the precision of levels 0 and 1 only matters for primitives.
+
+    With the compact 'path' encoding every feature is instead a subpath (see `format_subpath`)
+    of a `<path>` element of its color, always printed with integer coordinates: the cost of a
+    feature is the size of its subpath, and `group_cost` holds the size of the element around
+    the subpaths, paid once per element. Features of one color share an element unless a
+    feature of another color painted between them overlaps them (see `element_runs`), so the
+    paint order stays that of the polygon encoding.
+
+    A feature whose fill refers to a definition (`FeatureTable.defs`, e.g. a gradient) is
+    preceded by it, and its cost includes it: in the polygon element, or once in its color's path.
+
+    Features fitted with a primitive (`FeatureTable.shape`) are their own `<circle>`,
+    `<ellipse>` or `<rect>` element, printed with each level's coordinate precision. With the
+    path encoding a primitive is only used when it is smaller than the feature's integer subpath.
+
+    Features with holes (`FeatureTable.hole_count`) are drawn as their outer subpath followed by
+    one subpath per hole, with integer coordinates at every level (level 3 decimates the holes
+    too). With the polygon encoding such a feature is a `<path>` element of its own.
+
+    Attributes:
+        features (FeatureTable): The table the pyramid was built for.
+        encoding (str): 'polygon' (one element per feature) or 'path' (one element per run of a color's features).
+        vertex_index (list): Per level, the kept vertices as indices into `features.coords`.
+        offsets (list): Per level, the (n,) start of each feature in `vertex_index[level]`.
+        lengths (list): Per level, the (n,) number of vertices each feature keeps.
+        cost (np.ndarray): (n, 4) int32 byte size of each feature's element (or subpath) at each level.
+        primitive (np.ndarray): (n,) bool, True for the features drawn as their primitive.
+        holed (np.ndarray): (n,) bool, True for the features with holes.
+        group (np.ndarray): (n,) group of each feature for the packer: its palette index, or the
+            palette size for primitives, which share no element.
+        group_cost (np.ndarray): Per group, the fixed bytes of its path element (zeros for the
+            polygon encoding and for the primitive group).
+        decimals (tuple): Per level, the decimals vertices are printed with.
+        bbox (np.ndarray): (n, 4) float64 bounding box (x0, y0, x1, y1) of each feature at any level.
+    """
+
+    num_levels = len(LEVEL_DECIMALS)
+
+    def __init__(self, features, encoding='polygon'):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding!r}")
+        self.features = features
+        self.encoding = encoding
+
+        # Indices of every vertex, feature by feature, into the shared coordinate buffer.
+        lengths = features.lengths.astype(np.int64)
+        starts = np.cumsum(lengths) - lengths
+        full_index = np.arange(lengths.sum()) + np.repeat(features.offsets.astype(np.int64) - starts, lengths)
+        feature_of_vertex = np.repeat(np.arange(len(features)), lengths)
+
+        # Levels 0-2 share the full vertex set; level 3 keeps the decimated subset.
+        keep = decimate_mask(lengths)
+        reduced_lengths = np.bincount(feature_of_vertex[keep], minlength=len(features)).astype(np.int64)
+        subsets = {
+            False: (full_index, starts, lengths),
+            True: (full_index[keep], np.cumsum(reduced_lengths) - reduced_lengths, reduced_lengths),
+        }
+
+        # Printed width of each vertex as "x,y" with no decimals.
+        coords = features.coords[full_index].astype(np.int64)
+        vertex_width = digit_counts(coords[:, 0]) + digit_counts(coords[:, 1]) + 1
+
+        # Fixed bytes of the element: tags, attribute names, fill color and the newline.
+        palette_color_bytes = np.array([len(c) for c in features.hex_colors], dtype=np.int64)
+        defs_bytes = np.array([len(d) for d in features.defs], dtype=np.int64)
+        self.group_cost = np.zeros(len(features.hex_colors) + 1, dtype=np.int64)
+        if encoding == 'path':
+            self.group_cost[:-1] = len(PATH_OPEN) + len(PATH_DATA) + len(PATH_CLOSE) + palette_color_bytes + defs_bytes
+        fixed = (len(POLYGON_OPEN) + len(POLYGON_FILL) + len(POLYGON_CLOSE) +
+                 (palette_color_bytes + defs_bytes)[features.color_index])
+
+        # Integer vertices print no decimals at any level: those would only add ".0".
+        integral = np.issubdtype(features.coords.dtype, np.integer)
+        self.decimals = tuple(0 if integral else decimals for decimals in LEVEL_DECIMALS)
+
+        self.vertex_index, self.offsets, self.lengths = [], [], []
+        self.cost = np.zeros((len(features), self.num_levels), dtype=np.int32)
+        for level, decimals in enumerate(self.decimals):
+            reduced = level == 3
+            index, level_offsets, level_lengths = subsets[reduced]
+            self.vertex_index.append(index)
+            self.offsets.append(level_offsets)
+            self.lengths.append(level_lengths)
+
+            if encoding == 'path':
+                owner = feature_of_vertex[keep] if reduced else feature_of_vertex
+                self.cost[:, level] = self._subpath_bytes(features.coords[index], owner, level_offsets)
+                continue
+
+            # Each printed coordinate gains "." plus the decimals when decimals > 0.
+            width = vertex_width + (2 * (decimals + 1) if decimals else 0)
+            if reduced:
+                width = width[keep]
+                owner = feature_of_vertex[keep]
+            else:
+                owner = feature_of_vertex
+            points_bytes = np.bincount(owner, weights=width, minlength=len(features)).astype(np.int64)
+            # Vertices are separated by single spaces.
+            points_bytes += np.maximum(level_lengths - 1, 0)
+            self.cost[:, level] = fixed + points_bytes
+
+        # Features with holes are few; their sizes come from formatting them.
+        self.holed = features.hole_count > 0
+        for i in np.flatnonzero(self.holed).tolist():
+            self.cost[i] = [len(self.subpath(i, level) if encoding == 'path' else self.element(i, level, primitive=False))
+                            for level in range(self.num_levels)]
+
+        # Primitives are few too.
+        self.primitive = (features.shape != SHAPE_POLYGON) & ~self.holed
+        for i in np.flatnonzero(self.primitive).tolist():
+            cost = [len(self.element(i, level, primitive=True)) for level in range(self.num_levels)]
+            if encoding == 'path' and cost[2] >= self.cost[i, 2]:
+                self.primitive[i] = False  # The integer subpath is smaller.
+            else:
+                self.cost[i] = cost
+        self.group = np.where(self.primitive, len(features.hex_colors), features.color_index).astype(np.int64)
+
+        # Bounding boxes: the full vertex set contains every level's (decimation keeps a subset,
+        # holes lie inside), and primitives are bounded by their outline.
+        points = features.coords[full_index].astype(np.float64)
+        self.bbox = np.zeros((len(features), 4), dtype=np.float64)
+        nonempty = lengths > 0
+        if nonempty.any():
+            self.bbox[nonempty, :2] = np.minimum.reduceat(points, starts[nonempty], axis=0)
+            self.bbox[nonempty, 2:] = np.maximum.reduceat(points, starts[nonempty], axis=0)
+        for i in np.flatnonzero(self.primitive).tolist():
+            outline = primitive_outline(features.shape[i], features.shape_params[i])
+            self.bbox[i] = [*outline.min(axis=0), *outline.max(axis=0)]
+        self._runs = (None, None)  # The last `_assign_runs` result, by drawn set.
+
+    def _subpath_bytes(self, points, owner, starts):
+        """
+        Compute the exact length of `format_subpath` for every feature, without formatting.
+
+        Args:
+            points (np.ndarray): (m, 2) vertices of all features at one level, feature by feature.
+            owner (np.ndarray): (m,) feature index of each vertex.
+            starts (np.ndarray): (n,) index of each feature's first vertex in `points`.
+
+        Returns:
+            np.ndarray: (n,) int64 subpath sizes.
+        """
+        num_features = len(self.features)
+        points = points.astype(np.int64)
+
+        # "M" + x + separator + y + "z" for every feature.
+        first = points[starts]
+        nbytes = 2 + digit_counts(first[:, 0]) + (first[:, 1] >= 0) + digit_counts(first[:, 1])
+        nbytes = nbytes.astype(np.int64)
+
+        # Relative segments between consecutive vertices of the same feature, without zero-length ones.
+        deltas = np.diff(points, axis=0)
+        segment = (owner[1:] == owner[:-1]) & (deltas != 0).any(axis=1)
+        deltas, segment_owner = deltas[segment], owner[1:][segment]
+        if len(deltas) == 0:
+            return nbytes
+        dx, dy = deltas[:, 0], deltas[:, 1]
+        command = _segment_command(dx, dy)
+
+        # The letter is printed when the command changes, and always on a subpath's first segment.
+        previous = np.empty_like(command)
+        previous[1:] = command[:-1]
+        previous[np.r_[True, segment_owner[1:] != segment_owner[:-1]]] = 'M'
+        letter = command != previous
+
+        is_line, is_horizontal = command == 'l', command == 'h'
+        first_number = np.where(is_line | is_horizontal, dx, dy)
+        segment_bytes = (letter + (~letter & (first_number >= 0)) + digit_counts(first_number) +
+                         np.where(is_line, (dy >= 0) + digit_counts(dy), 0))
+        return nbytes + np.bincount(segment_owner, weights=segment_bytes, minlength=num_features).astype(np.int64)
+
+    def points(self, i, level):
+        """Return the (n, 2) vertices feature `i` keeps at `level`."""
+        start = self.offsets[level][i]
+        return self.features.coords[self.vertex_index[level][start:start + self.lengths[level][i]]]
+
+    def hole_points(self, i, level):
+        """Return the (m, 2) vertices of each hole of feature `i` kept at `level`."""
+        holes = self.features.holes(i)
+        if level == 3:
+            return [ring[decimate_mask([len(ring)])] for ring in holes]
+        return holes
+
+    def outline(self, i, level):
+        """Return the rings feature `i` is drawn with at `level`: its primitive's outline, or its
+        vertices and holes, as (m, 2) arrays in image coordinates."""
+        if self.primitive[i]:
+            return [primitive_outline(self.features.shape[i], self.features.shape_params[i])]
+        return [self.points(i, level), *self.hole_points(i, level)]
+
+    def points_string(self, i, level):
+        """Format the points attribute of feature `i` at `level`."""
+        decimals = self.decimals[level]
+        points = self.points(i, level).tolist()
+        if decimals == 0:
+            return " ".join([f"{x},{y}" for x, y in points])
+        return " ".join([f"{x:.{decimals}f},{y:.{decimals}f}" for x, y in points])
+
+    def element(self, i, level, primitive=None):
+        """Format the element of feature `i` at `level` (a polygon unless it is drawn as its
+        primitive), preceded by the definition its fill refers to; its length is `cost[i, level]`."""
+        features = self.features
+        defs = features.defs[features.color_index[i]]
+        if self.primitive[i] if primitive is None else primitive:
+            return defs + format_primitive(features.shape[i], features.shape_params[i], features.color(i), LEVEL_DECIMALS[level])
+        if self.holed[i]:
+            return f'{defs}{PATH_OPEN}{features.color(i)}{PATH_DATA}{self.subpath(i, level)}{PATH_CLOSE}'
+        return f'{defs}{POLYGON_OPEN}{self.points_string(i, level)}{POLYGON_FILL}{features.color(i)}{POLYGON_CLOSE}'
+
+    def subpath(self, i, level):
+        """Format the path data of feature `i` at `level`, holes included; its length is
+        `cost[i, level]` for the path encoding."""
+        if self.holed[i]:
+            return ''.join([format_subpath(ring) for ring in [self.points(i, level), *self.hole_points(i, level)]])
+        return format_subpath(self.points(i, level))
+
+    def _assign_runs(self, drawn):
+        """
+        Split drawn features into path elements (runs), in importance order.
+
+        A feature joins the latest run of its color unless a feature of another group placed in
+        a later run overlaps its bounding box, in which case it opens a new run; primitives are
+        runs of their own. Joining moves a feature below only later runs that it does not
+        overlap, so wherever features of different colors overlap they paint in importance
+        order, as with the polygon encoding. Whether a feature opens a run only depends on the
+        drawn features before it.
+
+        Args:
+            drawn (np.ndarray): The drawn features, in increasing index (importance) order.
+
+        Returns:
+            tuple: (run, opens): the (m,) run of each drawn feature and the (m,) bool mask of
+                   the features that open a run.
+        """
+        key = drawn.tobytes()
+        if self._runs[0] == key:
+            return self._runs[1]
+        num_drawn = len(drawn)
+        group = self.group[drawn]
+        x0, y0, x1, y1 = self.bbox[drawn].T
+        run = np.empty(num_drawn, dtype=np.int64)
+        opens = np.zeros(num_drawn, dtype=bool)
+        opened_at = []  # Per run, the drawn feature that opened it.
+        latest = {}  # Group -> its latest run.
+        for k in range(num_drawn):
+            g = int(group[k])
+            target = None if self.primitive[drawn[k]] else latest.get(g)
+            if target is not None:
+                # The features placed in later runs all have other colors: none may overlap.
+                # Runs are numbered as they open, so those features came after this run opened.
+                start = opened_at[target]
+                if ((run[start:k] > target) & (x0[start:k] <= x1[k]) & (x1[start:k] >= x0[k]) &
+                        (y0[start:k] <= y1[k]) & (y1[start:k] >= y0[k])).any():
+                    target = None
+            if target is None:
+                target = len(opened_at)
+                opened_at.append(k)
+                opens[k] = True
+                latest[g] = target
+            run[k] = target
+        self._runs = (key, (run, opens))
+        return run, opens
+
+    def opens(self, levels):
+        """
+        Return the (n,) bool mask of the drawn features that open an element, and so pay their
+        group's `group_cost` (see `element_runs`).
+
+        The mask of a feature only depends on the drawn features before it, so it stays the same
+        when less important features are dropped (see `BudgetPacker.pack_budget`).
+        """
+        drawn = np.flatnonzero(levels >= 0)
+        mask = np.zeros(len(levels), dtype=bool)
+        if self.encoding == 'path':
+            mask[drawn] = self._assign_runs(drawn)[1]
+        return mask
+
+    def element_runs(self, levels):
+        """
+        Return the drawn features grouped by the element that paints them, in paint order.
+
+        With the polygon encoding every feature is its own element, in importance order. With
+        the path encoding, a feature shares the `<path>` of earlier features of its color unless
+        a feature of another color painted after them overlaps it (bounding boxes are compared),
+        so nested and overlapping shapes paint exactly as their polygons would.
+
+        Args:
+            levels (np.ndarray): (n,) level of each feature, SKIP (-1) for features not drawn.
+
+        Returns:
+            list: Per element, the np.ndarray of its features in paint order.
+        """
+        drawn = np.flatnonzero(levels >= 0)
+        if self.encoding == 'polygon':
+            return [drawn[k:k + 1] for k in range(len(drawn))]
+        run = self._assign_runs(drawn)[0]
+        order = np.argsort(run, kind='stable')
+        return np.split(drawn[order], np.flatnonzero(np.diff(run[order])) + 1) if len(drawn) else []
+
+    def paint_order(self, levels):
+        """
+        Return the drawn features in the order their elements paint them (see `element_runs`).
+
+        Args:
+            levels (np.ndarray): (n,) level of each feature, SKIP (-1) for features not drawn.
+
+        Returns:
+            np.ndarray: The indices of the drawn features.
+        """
+        drawn = np.flatnonzero(levels >= 0)
+        if self.encoding == 'polygon' or len(drawn) == 0:
+            return drawn
+        run = self._assign_runs(drawn)[0]
+        return drawn[np.argsort(run, kind='stable')]
+
+    def path_elements(self, levels):
+        """
+        Format the compact encoding: path elements holding the subpaths of one color each.
+
+        See `element_runs` for how the features are split into elements. Primitives are
+        separate elements.
+
+        Args:
+            levels (np.ndarray): (n,) level of each feature, SKIP (-1) for features not drawn.
+
+        Returns:
+            list: The path elements, in paint order. Their total length is the cost of the drawn
+                  features plus `group_cost` of the group of each feature in `opens`.
+        """
+        features = self.features
+        elements = []
+        for run in self.element_runs(levels):
+            i = run[0]
+            if self.primitive[i]:
+                elements.append(self.element(i, levels[i]))
+                continue
+            color = features.color_index[i]
+            data = ''.join([self.subpath(j, levels[j]) for j in run.tolist()])
+            elements.append(f'{features.defs[color]}{PATH_OPEN}{features.hex_colors[color]}{PATH_DATA}{data}{PATH_CLOSE}')
+        return elements
@@ -0,0 +1,302 @@
+import math  # Log-space interpolation of the size model
+import time  # Per-trial timings for the trial log
+
+import numpy as np  # Import the NumPy library for efficient numerical computations
+
+import cv2  # Import the OpenCV library for computer vision tasks
+
+import Bitmap2SVGConverter
+from BudgetPacker import packed_size  # Exact byte size of a set of drawn features
+from ColorQuantizer import get_quantizer  # Pluggable color quantization engines
+from ResidualPacker import RESIDUAL_CANVAS, ResidualPacker  # Low-resolution canvas results are compared on
+from SimplificationPyramid import SimplificationPyramid  # Precomputed simplification levels
+from SVGWriter import SVGWriter  # Incremental SVG writer with a running byte count
+
+# Range searched for the simplification epsilon, as a fraction of each contour's perimeter.
+EPSILON_RANGE = (0.001, 0.05)
+
+# A search stops once the SVG uses at least this fraction of max_size_bytes.
+SIZE_TOLERANCE = 0.02
+
+# Maximum number of trials of one search (per color count).
+MAX_TRIALS = 12
+
+# Simplification level every feature of a trial is drawn at: every vertex, integer coordinates.
+TRIAL_LEVEL = 2
+
+def _search(size_at, fine, coarse, fine_size, coarse_size, target, tolerance, max_trials):
+    """
+    Find the finest setting of one knob whose SVG still fits, on a bracket of it.
+
+    The SVG size is modelled as a power law of the knob (a line in log-log space), so each
+    step is the secant between the ends of the bracket. A step is kept within the middle 80%
+    of the bracket, which turns it into a bisection where the model is poor (sizes are a step
+    function of the knob) and guarantees the bracket shrinks.
+
+    Args:
+        size_at (callable): Maps a knob value to the SVG size of a trial run with it.
+        fine (float): A value whose SVG does not fit (larger than `target`).
+        coarse (float): A larger value whose SVG fits.
+        fine_size (int): The SVG size at `fine`.
+        coarse_size (int): The SVG size at `coarse`.
+        target (int): The maximum SVG size.
+        tolerance (float): Stop once a fitting SVG is within this fraction of `target`.
+        max_trials (int): The maximum number of trials.
+
+    Returns:
+        float: The finest value found whose SVG fits.
+    """
+    for _ in range(max_trials):
+        if coarse_size >= (1 - tolerance) * target or coarse / fine < 1.001:
+            break
+        log_fine, log_coarse = math.log(fine), math.log(coarse)
+        # Where the line through the two ends crosses the target size (sizes are >= 1 byte).
+        step = (math.log(fine_size) - math.log(target)) / (math.log(fine_size) - math.log(max(coarse_size, 1)))
+        value = math.exp(log_fine + min(max(step, 0.1), 0.9) * (log_coarse - log_fine))
+        size = size_at(value)
+        if size <= target:
+            coarse, coarse_size = value, size
+        else:
+            fine, fine_size = value, size
+    return coarse
+
+class SizeAutotuner:
+    """
+    Tune the contour simplification of one image's conversion to land just under a byte budget.
+
+    A trial runs the conversion pipeline with every feature drawn: the features are extracted
+    as the 'components' engine of `Bitmap2SVGConverter.extract_features_from_labels` does,
+    with one setting of its `epsilon_factor` and `min_contour_area` knobs, built into a
+    `SimplificationPyramid` and drawn at `level`. The size of a trial comes from the
+    pyramid's byte costs, without formatting; only the result is written, by `SVGWriter`. The
+    SVG size only goes down as epsilon or the minimum area go up, so instead of a random
+    search over full conversions, `tune` searches each knob on a bracket (see `_search`):
+    epsilon first, then, if even the coarsest epsilon is too large, the minimum area.
+
+    Quantizing and labelling do not depend on either knob, so they run once per color count
+    and are kept, as are the traced contours of every region (see the `traced` argument of
+    `_extract_features_components`); a trial only re-simplifies.
+
+    Args:
+        image (PIL.Image or array-like): The input image, see `Bitmap2SVGConverter.prepare_image`.
+        resize (bool, optional): Whether to resize the image before processing. Defaults to True.
+        target_size (tuple, optional): The target size for resizing (width, height). Defaults to (384, 384).
+        quantizer (str or ColorQuantizer, optional): The color quantization engine, see
+            `Bitmap2SVGConverter.quantize_colors`. Defaults to 'kmeans'.
+        seed (int, optional): Seed of the quantizer's random number generator. Defaults to 0.
+        encoding (str, optional): 'polygon' or 'path', see `Bitmap2SVGConverter.bitmap_to_svg_layered`.
+            Defaults to 'polygon'.
+        level (int, optional): The simplification level every feature is drawn at (see
+            `SimplificationPyramid`). Defaults to TRIAL_LEVEL.
+
+    Attributes:
+        conversions (int): The number of quantize-and-label passes run so far.
+    """
+
+    def __init__(self, image, resize=True, target_size=(384, 384), quantizer='kmeans', seed=0,
+                 encoding='polygon', level=TRIAL_LEVEL):
+        self.img_np, original_size = Bitmap2SVGConverter.prepare_image(image, resize=resize, target_size=target_size)
+        img_rgb = self.img_np if self.img_np.ndim == 3 else cv2.cvtColor(self.img_np, cv2.COLOR_GRAY2RGB)
+        self.img_rgb = img_rgb[:, :, :3]
+        self.quantizer = quantizer
+        self.seed = seed
+        self.encoding = encoding
+        self.level = level
+        self.conversions = 0
+        self._labelled = {}
+
+        # The same document frame as `Bitmap2SVGConverter.write_svg_array`.
+        self.svg_base, self.svg_footer, self.background, _ = Bitmap2SVGConverter.svg_frame(self.img_np, original_size)
+        self.base_size = len((self.svg_base + self.svg_footer).encode('utf-8'))
+
+    def labelled(self, num_colors):
+        """
+        Quantize and label the image for a color count, or reuse an earlier pass.
+
+        Returns:
+            tuple: (labels, palette, regions, traced): the label map and palette (see
+                   `quantize_colors`), its regions (see `label_regions`) and the dict the
+                   traced contours of the regions are kept in.
+        """
+        if num_colors not in self._labelled:
+            labels, palette = Bitmap2SVGConverter.quantize_colors(
+                self.img_rgb, num_colors, quantizer=get_quantizer(self.quantizer, seed=self.seed))
+            self._labelled[num_colors] = labels, palette, Bitmap2SVGConverter.label_regions(labels), {}
+            self.conversions += 1
+        return self._labelled[num_colors]
+
+    def pyramid(self, num_colors, epsilon_factor, min_contour_area):
+        """
+        Extract the features of a color count with one setting of the knobs.
+
+        Args:
+            num_colors (int): The number of colors.
+            epsilon_factor (float): The simplification epsilon as a fraction of each perimeter.
+            min_contour_area (float): Contours with a smaller area are dropped.
+
+        Returns:
+            SimplificationPyramid: The features, sorted by importance, and their byte costs.
+        """
+        labels, palette, regions, traced = self.labelled(num_colors)
+        height, width = labels.shape
+        features = Bitmap2SVGConverter._extract_features_components(
+            labels, palette, width, height, regions=regions, traced=traced,
+            epsilon_factor=epsilon_factor, min_contour_area=min_contour_area)
+        return SimplificationPyramid(features, encoding=self.encoding)
+
+    def levels(self, pyramid):
+        """Return the levels of a trial: every feature of `pyramid` drawn at `level`."""
+        return np.full(len(pyramid.features), self.level, dtype=np.int8)
+
+    def trial(self, num_colors, epsilon_factor, min_contour_area):
+        """
+        Run one trial: extract the features with one setting of the knobs and size the SVG.
+
+        Args:
+            num_colors (int): The number of colors.
+            epsilon_factor (float): The simplification epsilon as a fraction of each perimeter.
+            min_contour_area (float): Contours with a smaller area are dropped.
+
+        Returns:
+            tuple: (pyramid, trial) where trial is a dict of the knobs, the SVG 'bytes', the
+                   number of 'features' drawn and the 'seconds' the trial took (including
+                   quantizing when this color count had not been quantized yet).
+        """
+        start = time.perf_counter()
+        pyramid = self.pyramid(num_colors, epsilon_factor, min_contour_area)
+        size = self.base_size + packed_size(pyramid.cost, self.levels(pyramid), pyramid.group,
+                                            pyramid.group_cost, pyramid.opens)
+        trial = {
+            'num_colors': num_colors,
+            'epsilon_factor': epsilon_factor,
+            'min_contour_area': min_contour_area,
+            'bytes': size,
+            'features': len(pyramid.features),
+            'seconds': time.perf_counter() - start,
+        }
+        return pyramid, trial
+
+    def write(self, pyramid):
+        """Write the SVG of a trial's pyramid (see `trial`) and return it."""
+        writer = SVGWriter(footer=self.svg_footer)
+        writer.begin(self.svg_base)
+        writer.write_all(Bitmap2SVGConverter.iter_feature_elements(pyramid, self.levels(pyramid)))
+        writer.close()
+        return writer.getvalue()
+
+    def convert(self, num_colors, epsilon_factor, min_contour_area):
+        """
+        Run one trial and write its SVG (see `trial`).
+
+        Returns:
+            tuple: (svg, trial).
+        """
+        pyramid, trial = self.trial(num_colors, epsilon_factor, min_contour_area)
+        return self.write(pyramid), trial
+
+    def error(self, pyramid, canvas=RESIDUAL_CANVAS):
+        """
+        Return the mean squared RGB error of a trial's drawing against the image, both
+        downscaled so the longer side is `canvas` pixels (see `ResidualPacker`).
+        """
+        residual = ResidualPacker(self.img_np, self.background, canvas=canvas)
+        render = np.tile(residual.background, (len(residual.target), 1))
+        features = pyramid.features
+        levels = self.levels(pyramid)
+        for i in pyramid.paint_order(levels).tolist():
+            render[residual.feature_pixels(pyramid, i, self.level)] = features.palette[features.color_index[i]]
+        return float(((render - residual.target) ** 2).sum(axis=1).mean())
+
+    def tune(self, max_size_bytes=10000, num_colors=None, min_contour_area=Bitmap2SVGConverter.MIN_CONTOUR_AREA,
+             epsilon_range=EPSILON_RANGE, tolerance=SIZE_TOLERANCE, max_trials=MAX_TRIALS):
+        """
+        Find the knobs whose SVG uses as much of `max_size_bytes` as possible without exceeding it.
+
+        For each color count, the finest epsilon is tried first (when it fits, nothing is
+        simplified away needlessly), then the coarsest; between them, epsilon is searched on
+        the bracket. If even the coarsest epsilon does not fit, the minimum area is searched
+        instead, between `min_contour_area` and the image area, at the coarsest epsilon.
+        With several color counts, the result with the smallest low-resolution error (see
+        `error`) wins. The knobs found reproduce the features of the result in
+        `Bitmap2SVGConverter.bitmap_to_svg_layered`, which also fits them to the budget by
+        simplification level.
+
+        Args:
+            max_size_bytes (int, optional): The maximum size of the SVG in bytes. Defaults to 10000.
+            num_colors (int or iterable, optional): The color count, or candidate color counts.
+                If None, uses the adaptive selection (see `Bitmap2SVGConverter.default_num_colors`).
+            min_contour_area (float, optional): The smallest minimum area tried, at least 1 (the
+                minimum area is searched in log space). Defaults to MIN_CONTOUR_AREA.
+            epsilon_range (tuple, optional): The (finest, coarsest) epsilon factors tried.
+                Defaults to EPSILON_RANGE.
+            tolerance (float, optional): A search stops once the SVG is within this fraction of
+                `max_size_bytes`. Defaults to SIZE_TOLERANCE.
+            max_trials (int, optional): The maximum number of bracket steps per search.
+                Defaults to MAX_TRIALS.
+
+        Returns:
+            tuple: (svg, best, trials): the best SVG, the trial dict that produced it (with its
+                   'error' added) and the list of every trial run, in order. If nothing fits,
+                   svg is the background alone and best is None.
+        """
+        height, width = self.img_rgb.shape[:2]
+        if num_colors is None:
+            num_colors = Bitmap2SVGConverter.default_num_colors(width, height)
+        candidates = [num_colors] if isinstance(num_colors, int) else list(num_colors)
+        finest, coarsest = epsilon_range
+        # Every search, and the trials its bracket starts from, use the same smallest area.
+        smallest_area = max(float(min_contour_area), 1.0)
+        max_area = float(width * height)
+
+        trials = []
+        results = {}
+
+        def run(colors, epsilon, area):
+            pyramid, trial = self.trial(colors, epsilon, area)
+            trial['fits'] = trial['bytes'] <= max_size_bytes
+            trials.append(trial)
+            results[colors, epsilon, area] = pyramid, trial
+            return trial['bytes']
+
+        best = None
+        for colors in candidates:
+            area = smallest_area
+            fine_size = run(colors, finest, area)
+            if fine_size <= max_size_bytes:
+                epsilon = finest
+            else:
+                coarse_size = run(colors, coarsest, area)
+                if coarse_size <= max_size_bytes:
+                    epsilon = _search(lambda value: run(colors, value, area), finest, coarsest,
+                                      fine_size, coarse_size, max_size_bytes, tolerance, max_trials)
+                else:
+                    # Even the coarsest outlines are too large: drop small contours instead.
+                    epsilon = coarsest
+                    area_size = run(colors, coarsest, max_area)
+                    if area_size > max_size_bytes:
+                        continue  # Not even the background fits.
+                    area = _search(lambda value: run(colors, coarsest, value), smallest_area, max_area,
+                                   coarse_size, area_size, max_size_bytes, tolerance, max_trials)
+
+            pyramid, trial = results[colors, epsilon, area]
+            trial['error'] = self.error(pyramid)
+            if best is None or trial['error'] < best['error']:
+                best = trial
+
+        if best is None:
+            return self.svg_base + self.svg_footer, None, trials
+        best['best'] = True
+        return self.write(results[best['num_colors'], best['epsilon_factor'], best['min_contour_area']][0]), best, trials
+
+def autotune_svg(image, max_size_bytes=10000, resize=True, target_size=(384, 384), quantizer='kmeans', seed=0,
+                 encoding='polygon', level=TRIAL_LEVEL, **params):
+    """
+    Convert a bitmap with its contour simplification tuned to land just under `max_size_bytes`
+    (see `SizeAutotuner` and `SizeAutotuner.tune` for the other keyword arguments).
+
+    Returns:
+        tuple: (svg, best, trials), see `SizeAutotuner.tune`.
+    """
+    tuner = SizeAutotuner(image, resize=resize, target_size=target_size, quantizer=quantizer, seed=seed,
+                          encoding=encoding, level=level)
+    return tuner.tune(max_size_bytes=max_size_bytes, **params)
@@ -0,0 +1,25 @@
+import Bitmap2SVGConverter
+from Bitmap2SVGBatch import BatchConverter
+from Bitmap2SVGBenchmark import synthetic_image
+
+def test_pool_results_match_serial_conversion():
+    images = [synthetic_image(kind, 96 + 16 * seed, seed) for seed in range(3) for kind in ('flat', 'gradient')]
+    params = {'quantizer': 'fast', 'seed': 0, 'max_size_bytes': 4000}
+    serial = [Bitmap2SVGConverter.bitmap_to_svg_layered(image, **params) for image in images]
+    read = []
+
+    def source():
+        for image in images:
+            read.append(len(read))
+            yield image
+
+    with BatchConverter(workers=2, max_in_flight=2) as converter:
+        results = converter.imap(source(), **params)
+        assert next(results) == serial[0]
+        # Images are read lazily, at most `max_in_flight` ahead of the results.
+        assert len(read) <= 3
+        assert [serial[0], *results] == serial
+
+        unordered = list(converter.imap(images, ordered=False, **params))
+        assert sorted(index for index, _ in unordered) == list(range(len(images)))
+        assert all(svg == serial[index] for index, svg in unordered)
@@ -0,0 +1,22 @@
+import numpy as np
+from PIL import Image
+
+from Bitmap2SVGBenchmark import STAGES, INPUTS, measure, synthetic_image
+
+def test_synthetic_images_are_reproducible():
+    for kind in INPUTS:
+        img = synthetic_image(kind, 64, 1)
+        assert img.shape == (64, 64, 3) and img.dtype == np.uint8
+        assert np.array_equal(img, synthetic_image(kind, 64, 1))
+        assert not np.array_equal(img, synthetic_image(kind, 64, 2))
+
+def test_every_stage_is_timed_and_traced():
+    source = Image.fromarray(synthetic_image('flat', 128, 0))
+    result = measure(source, 128, 8, repeat=1, max_size_bytes=4000)
+    assert list(result['stages']) == list(STAGES)
+    for stage in result['stages'].values():
+        assert 0 <= stage['seconds'] < float('inf')
+        assert stage['peak_bytes'] >= 0 and stage['peak_bytes'] >= stage['retained_bytes']
+    assert result['total_seconds'] == sum(stage['seconds'] for stage in result['stages'].values())
+    assert 0 < result['drawn'] <= result['features'] and result['vertices'] > 0
+    assert result['svg_bytes'] <= 4000
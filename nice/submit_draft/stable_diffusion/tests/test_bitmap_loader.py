@@ -0,0 +1,24 @@
+import numpy as np
+
+from PIL import Image
+
+from BitmapLoader import load_image
+
+def test_large_palette_png_is_reduced(tmp_path):
+    path = tmp_path / 'palette.png'
+    rgb = np.zeros((1600, 1600, 3), dtype=np.uint8)
+    rgb[:, 800:] = (255, 0, 0)
+    Image.fromarray(rgb).convert('P', palette=Image.ADAPTIVE, colors=2).save(path)
+    image, original_size = load_image(str(path))
+    assert original_size == (1600, 1600)
+    assert image.mode == 'RGB' and image.size == (400, 400)
+    pixels = np.asarray(image)
+    assert (pixels[:, :190] == 0).all() and (pixels[:, 210:] == (255, 0, 0)).all()
+
+def test_bilevel_and_16_bit_images_are_reduced(tmp_path):
+    for mode in ('1', 'I;16'):
+        path = tmp_path / f'{mode.replace(";", "_")}.png'
+        Image.new(mode, (1200, 800)).save(path)
+        image, original_size = load_image(str(path))
+        assert original_size == (1200, 800)
+        assert image.mode == 'RGB' and image.size == (600, 400)
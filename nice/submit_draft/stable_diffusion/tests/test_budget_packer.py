@@ -0,0 +1,25 @@
+import re
+
+import numpy as np
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+from BudgetPacker import SKIP, level_values, pack_dp, pack_lagrangian, packed_size
+
+def test_solvers_stay_within_budget():
+    rng = np.random.default_rng(0)
+    cost = np.sort(rng.integers(10, 200, size=(300, 4)), axis=1)[:, ::-1]
+    value = level_values(np.sort(rng.random(300))[::-1], 4)
+    for solver in (pack_dp, pack_lagrangian):
+        for budget in (0, 150, 2000, 20000):
+            levels = solver(cost, value, budget)
+            assert packed_size(cost, levels) <= budget
+            assert budget < cost[:, 3].min() or (levels != SKIP).any()
+
+def test_integral_coordinates_print_without_decimals():
+    img = synthetic_image('flat', 384, 0)
+    for budget in (2000, 4000, 10000):
+        svg = Bitmap2SVGConverter.bitmap_to_svg_layered(img, budget, quantizer='fast', seed=0, primitives=True)
+        # Levels 0-2 have the same geometry, so no byte goes to a ".0" suffix.
+        assert not re.search(r'\d\.0(?!\d)', svg)
+        assert len(svg.encode('utf-8')) <= budget
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from Bitmap2SVGBenchmark import synthetic_image
+from ColorQuantizer import QUANTIZERS, HistogramQuantizer, KMeansQuantizer, SuperpixelQuantizer, exact_palette, get_quantizer
+
+def test_warm_start_keeps_a_converged_palette():
+    img = synthetic_image('gradient', 64, 0)
+    quantizer = KMeansQuantizer(seed=0)
+    labels, palette = quantizer.quantize(img, 8)
+    warm_labels, warm_palette = quantizer.quantize(img, 8, init_centers=palette.astype(np.float32))
+    assert np.abs(warm_palette.astype(int) - palette).max() <= 1
+    assert (warm_labels == labels).mean() > 0.99
+
+def test_palettes_larger_than_uint8_labels_are_rejected():
+    img = synthetic_image('noise', 32, 0)
+    for name in QUANTIZERS:
+        with pytest.raises(ValueError):
+            get_quantizer(name, seed=0).quantize(img, 257)
+
+def test_median_cut_refines_with_every_split():
+    img = synthetic_image('noise', 128, 0)
+    errors = []
+    for num_colors in (2, 16, 256):
+        labels, palette = HistogramQuantizer().quantize(img, num_colors)
+        assert len(palette) == num_colors
+        errors.append(((palette[labels].astype(float) - img) ** 2).mean())
+    assert errors == sorted(errors, reverse=True)
+
+def test_images_with_few_colors_keep_their_own_palette():
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, (6, 3)).astype(np.uint8)
+    img = colors[rng.integers(0, 5, (40, 40))]
+    # A sixth color on one pixel the strided probe skips.
+    img[0, 1] = colors[5]
+    for name in QUANTIZERS:
+        labels, palette = get_quantizer(name, seed=0).quantize(img, 6)
+        assert np.array_equal(palette[labels], img)
+        assert len(palette) == 6
+    assert exact_palette(img, 5) is None
+
+def test_superpixels_are_compact_and_follow_color_edges():
+    img = synthetic_image('gradient', 200, 0)
+    # A hard edge off the seed grid (step 10).
+    img[:, 97:] = (255, 0, 0)
+    quantizer = SuperpixelQuantizer(segments=400, seed=0)
+    superpixels = quantizer.superpixels(img)
+    segments = np.unique(superpixels)
+    assert len(segments) == 400
+    assert len(np.intersect1d(superpixels[:, :97], superpixels[:, 97:])) == 0
+    ys, xs = np.indices(superpixels.shape)
+    assert max(max(np.ptp(xs[superpixels == s]), np.ptp(ys[superpixels == s])) for s in segments) < 20
+
+    labels, palette = quantizer.quantize(img, 8)
+    assert len(palette) == 8
+    assert all(len(np.unique(labels[superpixels == s])) == 1 for s in segments)
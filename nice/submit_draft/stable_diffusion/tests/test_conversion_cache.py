@@ -0,0 +1,30 @@
+import pytest
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+from ConversionCache import ConversionCache
+
+def test_stats_are_served_with_the_svg(tmp_path):
+    img = synthetic_image('flat', 128, 0)
+    svg, stats = ConversionCache(directory=tmp_path).bitmap_to_svg_layered(img, quantizer='fast',
+                                                                             return_stats=True)
+    assert svg == Bitmap2SVGConverter.bitmap_to_svg_layered(img, quantizer='fast', seed=0)
+
+    # A new process sharing the directory gets both from disk.
+    cache = ConversionCache(directory=tmp_path)
+    assert cache.bitmap_to_svg_layered(img, quantizer='fast', return_stats=True) == (svg, stats)
+    assert cache.bitmap_to_svg_layered(img, quantizer='fast', seed=0) == svg
+    assert cache.stats()['misses'] == 0 and cache.stats()['disk_hits'] == 1
+
+def test_entries_without_stats_are_converted_again_for_them():
+    img = synthetic_image('flat', 128, 0)
+    cache = ConversionCache()
+    svg = cache.bitmap_to_svg_layered(img, quantizer='fast')
+    assert cache.bitmap_to_svg_layered(img, quantizer='fast', return_stats=True)[0] == svg
+    assert cache.stats()['misses'] == 2
+    cache.bitmap_to_svg_layered(img, quantizer='fast', return_stats=True)
+    assert cache.stats()['hits'] == 1
+
+def test_unseeded_caches_are_rejected():
+    with pytest.raises(ValueError):
+        ConversionCache(seed=None)
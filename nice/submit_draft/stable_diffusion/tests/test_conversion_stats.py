@@ -0,0 +1,21 @@
+import io
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+
+def test_stats_describe_the_returned_svg():
+    img = synthetic_image('flat', 128, 0)
+    svg, stats = Bitmap2SVGConverter.bitmap_to_svg_layered(img, quantizer='fast', seed=0, max_size_bytes=3000,
+                                                           return_stats=True)
+    assert svg == Bitmap2SVGConverter.bitmap_to_svg_layered(img, quantizer='fast', seed=0, max_size_bytes=3000)
+    assert stats['bytes'] == len(svg.encode('utf-8')) <= stats['max_size_bytes'] == 3000
+    assert stats['drawn'] + stats['dropped'] == stats['features']
+    assert sum(stats['levels']) == stats['drawn'] and not stats['fallback']
+    assert set(stats['timings']) == {'prepare', 'quantize', 'contours', 'simplify', 'pack', 'serialize'}
+
+    # Writing to a file fills in the same report.
+    written = {}
+    Bitmap2SVGConverter.write_svg_layered(img, io.BytesIO(), quantizer='fast', seed=0, max_size_bytes=3000,
+                                          stats=written)
+    assert {name: value for name, value in written.items() if name != 'timings'} == \
+        {name: value for name, value in stats.items() if name != 'timings'}
@@ -0,0 +1,57 @@
+import numpy as np
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+from ColorQuantizer import get_quantizer
+
+def same_features(a, b):
+    return all(np.array_equal(getattr(a, name), getattr(b, name))
+               for name in ('coords', 'offsets', 'lengths', 'color_index', 'area', 'importance'))
+
+def quantized(kind, size):
+    return get_quantizer('fast', seed=0).quantize(synthetic_image(kind, size, 0), 16)
+
+def test_multiscale_extracts_small_images_at_full_resolution():
+    # Below COARSE_MIN_SIDE the coarse pass would cost about as much as it saves.
+    labels, palette = quantized('flat', 384)
+    components = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='components')
+    multiscale = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='multiscale')
+    assert same_features(multiscale, components)
+
+def test_multiscale_downsamples_large_images():
+    labels, palette = quantized('gradient', Bitmap2SVGConverter.COARSE_MIN_SIDE)
+    components = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='components')
+    multiscale = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='multiscale')
+    # The large regions are traced downsampled, half a block out: the same regions, about as large.
+    assert not same_features(multiscale, components)
+    assert len(multiscale) == len(components)
+    assert abs(multiscale.area.sum() / components.area.sum() - 1) < 0.02
+
+def feature_set(features):
+    return sorted((float(features.importance[i]), int(features.color_index[i]), int(features.area[i]),
+                   features.points(i).tobytes()) for i in range(len(features)))
+
+def test_merge_roots_joins_chains_to_their_smallest_element():
+    elements, roots = Bitmap2SVGConverter._merge_roots(np.array([[9, 5], [5, 3], [12, 11], [7, 9]]))
+    assert elements.tolist() == [3, 5, 7, 9, 11, 12]
+    assert roots.tolist() == [3, 3, 3, 3, 11, 11]
+
+def test_tiled_regions_match_the_whole_image():
+    labels, _ = quantized('flat', 300)
+    whole = Bitmap2SVGConverter.label_regions(labels)
+    tiled = Bitmap2SVGConverter.label_regions_tiled(labels, tile_size=64)
+    assert len(tiled['area']) == len(whole['area'])
+    # The same regions, numbered differently: map each tiled region to the whole-image one.
+    order = np.empty(len(whole['area']), dtype=np.int64)
+    order[tiled['ids'].ravel()] = whole['ids'].ravel()
+    assert np.array_equal(order[tiled['ids']], whole['ids'])
+    for name in ('color', 'area', 'bbox', 'cells'):
+        assert np.array_equal(tiled[name], whole[name][order])
+    for name in ('cx', 'cy'):
+        assert np.allclose(tiled[name], whole[name][order])
+
+def test_tiled_engine_finds_the_component_features():
+    labels, palette = quantized('flat', 2 * Bitmap2SVGConverter.TILE_SIZE)
+    components = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='components', holes=True)
+    tiled = Bitmap2SVGConverter.extract_features_from_labels(labels, palette, engine='tiled', holes=True)
+    assert feature_set(tiled) == feature_set(components)
@@ -0,0 +1,31 @@
+import numpy as np
+
+from FeatureTable import FeatureTable
+
+def square(x, y, side):
+    return np.array([[[x, y]], [[x + side, y]], [[x + side, y + side]], [[x, y + side]]], dtype=np.int32)
+
+def table():
+    contours = [square(0, 0, 10), square(20, 0, 4), square(0, 20, 6)]
+    holes = [[square(2, 2, 3), square(6, 6, 2)], [], [square(1, 21, 2)]]
+    palette = np.array([[255, 0, 0], [0, 0, 255]], dtype=np.uint8)
+    return FeatureTable.from_contours(contours, [0, 1, 0], [100, 16, 36], [1.0, 3.0, 2.0], palette, ['red', 'blue'],
+                                      holes=holes)
+
+def test_take_and_filter_keep_each_feature_with_its_rings():
+    features = table()
+    ordered = features.sorted_by_importance()
+    assert ordered.importance.tolist() == [3.0, 2.0, 1.0]
+    assert [ordered.color(i) for i in range(3)] == ['blue', 'red', 'red']
+    # The tables share one coordinate buffer; only the per-feature arrays are permuted.
+    assert ordered.coords is features.coords
+    for new, old in enumerate([1, 2, 0]):
+        assert np.array_equal(ordered.points(new), features.points(old))
+        assert all(np.array_equal(a, b) for a, b in zip(ordered.holes(new), features.holes(old)))
+        assert len(ordered.holes(new)) == len(features.holes(old))
+
+    kept = features.filter(features.area > 20)
+    assert len(kept) == 2
+    assert np.array_equal(kept.points(1), square(0, 20, 6).reshape(-1, 2))
+    assert np.array_equal(kept.holes(1)[0], square(1, 21, 2).reshape(-1, 2))
+    assert len(features.filter(np.zeros(3, dtype=bool))) == 0
@@ -0,0 +1,41 @@
+import numpy as np
+
+import Bitmap2SVGConverter
+from GradientBands import merge_gradient_bands
+
+def banded_ramp(bands=8):
+    """A red-to-blue horizontal ramp and its quantization into vertical bands."""
+    x = np.linspace(0, 255, 256)
+    img = np.zeros((64, 256, 3), dtype=np.uint8)
+    img[..., 0], img[..., 1], img[..., 2] = x, 80, 255 - x
+    labels = np.broadcast_to(np.arange(256) * bands // 256, (64, 256)).astype(np.uint8)
+    palette = np.array([img[0, labels[0] == band].mean(axis=0) for band in range(bands)]).round().astype(np.uint8)
+    return img, labels, palette
+
+def test_ramp_bands_merge_into_one_gradient():
+    img, labels, palette = banded_ramp()
+    new_labels, new_palette, gradients = merge_gradient_bands(img, labels, palette,
+                                                               Bitmap2SVGConverter.label_regions(labels))
+    assert len(gradients) == 1
+    gradient = gradients[0]
+    assert gradient['index'] == len(palette) and len(new_palette) == len(palette) + 1
+    assert (new_labels == gradient['index']).all()
+    # The gradient vector runs across the image along the ramp, with its end colors.
+    (x0, y0), (x1, y1) = sorted([gradient['start'], gradient['end']])
+    assert x0 <= 1 and x1 >= 254 and abs(y1 - y0) <= 1
+    stops = sorted(tuple(stop.tolist()) for stop in gradient['stops'])
+    assert np.abs(np.array(stops) - [[0, 80, 255], [255, 80, 0]]).max() <= 2
+
+def test_bands_that_do_not_progress_are_kept():
+    img, labels, palette = banded_ramp()
+    # Shuffle the first six bands: adjacent colors stay close, but no longer progress along one
+    # ramp. Only the last two, still in order, make a gradient.
+    order = np.array([0, 2, 1, 3, 5, 4, 6, 7])
+    shuffled = img.copy()
+    for band, source in enumerate(order):
+        shuffled[:, band * 32:(band + 1) * 32] = img[:, source * 32:(source + 1) * 32]
+    palette = palette[order]
+    new_labels, _, gradients = merge_gradient_bands(shuffled, labels, palette, Bitmap2SVGConverter.label_regions(labels))
+    assert len(gradients) == 1
+    assert np.array_equal(new_labels[:, :192], labels[:, :192])
+    assert (new_labels[:, 192:] == gradients[0]['index']).all()
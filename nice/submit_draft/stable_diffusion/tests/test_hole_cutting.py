@@ -0,0 +1,18 @@
+import numpy as np
+
+import Bitmap2SVGConverter
+from ColorQuantizer import get_quantizer
+
+def test_holes_follow_min_contour_area():
+    # A 3x3 blue dot in a red square on a blue square: its hole can be cut out of the red square.
+    img = np.full((128, 128, 3), 235, dtype=np.uint8)
+    img[10:118, 10:118] = (30, 30, 200)
+    img[30:98, 30:98] = (200, 30, 30)
+    img[60:63, 60:63] = (30, 30, 200)
+    for min_contour_area, cut in ((2, 1), (5, 0), (20, 0)):
+        features = Bitmap2SVGConverter.extract_features_by_scale(
+            img, num_colors=3, quantizer=get_quantizer('fast', seed=0), holes=True,
+            min_contour_area=min_contour_area)
+        assert features.hole_count.sum() == cut
+        # A cut hole replaces the dot's feature; a dot too small to draw is dropped.
+        assert len(features) == 3
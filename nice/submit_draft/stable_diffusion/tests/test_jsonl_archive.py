@@ -0,0 +1,13 @@
+import json
+
+from Bitmap2SVGCLI import JsonlArchive
+
+def test_corrupt_middle_line_keeps_later_records(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    records = [json.dumps({'key': 'a', 'svg': '<svg/>'}), 'not json', json.dumps({'key': 'b', 'svg': '<svg/>'})]
+    path.write_text('\n'.join(records) + '\n{"key": "c", "sv')
+    archive = JsonlArchive(str(path))
+    archive.close()
+    assert archive.keys == {'a', 'b'}
+    # Only the unfinished last line is cut off.
+    assert path.read_text() == '\n'.join(records) + '\n'
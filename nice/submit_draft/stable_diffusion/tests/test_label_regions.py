@@ -0,0 +1,29 @@
+import numpy as np
+
+import cv2
+
+import Bitmap2SVGConverter
+
+def test_regions_match_per_color_components():
+    rng = np.random.default_rng(0)
+    # Blocky random labels, so regions of all sizes and shapes touch each other diagonally.
+    labels = np.kron(rng.integers(0, 4, (24, 32)), np.ones((3, 2), dtype=np.int64)).astype(np.uint8)
+    labels[rng.random(labels.shape) < 0.05] = 4
+    regions = Bitmap2SVGConverter.label_regions(labels)
+    ids = regions['ids']
+
+    total = 0
+    for color in range(5):
+        num, components = cv2.connectedComponents((labels == color).astype(np.uint8), connectivity=4)
+        for component in range(1, num):
+            pixels = components == component
+            region = ids[pixels]
+            # One region per 4-connected component, holding nothing else.
+            assert (region == region[0]).all() and (pixels == (ids == region[0])).all()
+            region = region[0]
+            ys, xs = np.nonzero(pixels)
+            assert regions['color'][region] == color
+            assert regions['area'][region] == pixels.sum()
+            assert tuple(regions['bbox'][region]) == (xs.min(), ys.min(), np.ptp(xs) + 1, np.ptp(ys) + 1)
+        total += num - 1
+    assert len(regions['area']) == total
@@ -0,0 +1,15 @@
+from OcclusionCulling import cull_svg
+
+def test_shapes_inside_containers_are_ignored():
+    clip = '<defs><clipPath id="c"><rect x="0" y="0" width="100" height="100"/></clipPath></defs>\n'
+    gradient = '<linearGradient id="g"><stop offset="0" stop-color="#000"/></linearGradient>\n'
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100">\n'
+           '<rect width="100" height="100" fill="#fff"/>\n'
+           + clip + gradient +
+           '<rect x="10" y="10" width="20" height="20" fill="#f00"/>\n'
+           '<rect x="0" y="0" width="100" height="100" fill="#00f"/>\n</svg>')
+    culled, removed = cull_svg(svg)
+    # Only the red square, under the blue one, goes; the clip shape is not a drawn element.
+    assert removed == 1
+    assert clip in culled and gradient in culled
+    assert 'fill="#f00"' not in culled
@@ -0,0 +1,52 @@
+import re
+
+import numpy as np
+
+import cv2
+
+import Bitmap2SVGConverter
+from BudgetPacker import SKIP
+from SimplificationPyramid import SimplificationPyramid
+
+def nested_circles():
+    """A white circle inside a red circle, on a white background."""
+    img = np.full((384, 384, 3), 255, dtype=np.uint8)
+    cv2.circle(img, (192, 192), 150, (255, 0, 0), -1)
+    cv2.circle(img, (192, 192), 60, (255, 255, 255), -1)
+    return img
+
+def test_nested_same_color_shape_paints_on_top():
+    svg = Bitmap2SVGConverter.bitmap_to_svg_layered(nested_circles(), encoding='path', quantizer='fast', seed=0)
+    fills = re.findall(r'<path fill="([^"]+)"', svg)
+    # The white inner circle needs a path of its own after the red one.
+    assert fills.index('#f00') < len(fills) - 1 - fills[::-1].index('#fff')
+
+def test_path_paint_order_matches_polygon_order():
+    features = Bitmap2SVGConverter.extract_features_by_scale(nested_circles(), quantizer='fast')
+    pyramid = SimplificationPyramid(features, encoding='path')
+    levels = np.zeros(len(features), dtype=np.int8)
+    rank = np.argsort(pyramid.paint_order(levels))
+    for i in range(len(features)):
+        for j in range(i + 1, len(features)):
+            box_i, box_j = pyramid.bbox[i], pyramid.bbox[j]
+            overlap = (box_i[:2] <= box_j[2:]).all() and (box_j[:2] <= box_i[2:]).all()
+            if overlap and features.color_index[i] != features.color_index[j]:
+                assert rank[i] < rank[j]
+    # Elements hold the subpaths of one color each.
+    for run in pyramid.element_runs(levels):
+        assert len(set(features.color_index[run].tolist())) == 1
+
+def test_path_encoding_fits_budget_exactly():
+    rng = np.random.default_rng(0)
+    img = np.full((384, 384, 3), 255, dtype=np.uint8)
+    for _ in range(200):
+        color = tuple(int(c) for c in rng.choice([0, 128, 255], 3))
+        cv2.circle(img, tuple(int(v) for v in rng.integers(0, 384, 2)), int(rng.integers(4, 40)), color, -1)
+    for max_size_bytes in (1500, 4000, 10000):
+        for packer in ('dp', 'lagrangian', 'greedy', 'residual'):
+            svg, stats = Bitmap2SVGConverter.bitmap_to_svg_layered(
+                img, max_size_bytes=max_size_bytes, encoding='path', packer=packer, quantizer='fast', seed=0,
+                return_stats=True)
+            assert len(svg.encode('utf-8')) == stats['bytes'] <= max_size_bytes
+            assert not stats['fallback']
+            assert stats['drawn'] > 0
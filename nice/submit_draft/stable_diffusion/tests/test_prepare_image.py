@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from Bitmap2SVGConverter import prepare_image
+from Bitmap2SVGBenchmark import synthetic_image
+
+def test_arrays_are_used_in_place_when_not_resized():
+    img = synthetic_image('gradient', 64, 0)
+    pixels, original_size = prepare_image(img, resize=False)
+    assert original_size == (64, 64) and np.shares_memory(pixels, img)
+    resized, original_size = prepare_image(img[:, :48], target_size=(32, 16))
+    assert original_size == (48, 64) and resized.shape == (16, 32, 3) and resized.dtype == np.uint8
+
+def test_float_tensors_map_to_the_same_pixels():
+    img = synthetic_image('gradient', 64, 0)
+    unit = (img.astype(np.float32) / 255).transpose(2, 0, 1)[None]  # (1, 3, H, W) in [0, 1].
+    for tensor in (unit, unit.astype(np.float16), unit * 2 - 1):
+        pixels, original_size = prepare_image(tensor, resize=False)
+        assert original_size == (64, 64) and pixels.dtype == np.uint8
+        assert np.abs(pixels.astype(int) - img).max() <= 1
+    # Resized in float, the result stays within rounding of the uint8 resize.
+    from_float, _ = prepare_image(unit, target_size=(32, 32))
+    from_uint8, _ = prepare_image(img, target_size=(32, 32))
+    assert np.abs(from_float.astype(int) - from_uint8).max() <= 1
+
+def test_unsupported_layouts_are_rejected():
+    for image in (np.zeros((8, 8, 4), dtype=np.uint8), np.zeros((8, 8, 3), dtype=np.int32), np.zeros(8)):
+        with pytest.raises(ValueError):
+            prepare_image(image)
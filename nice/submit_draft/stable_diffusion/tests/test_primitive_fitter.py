@@ -0,0 +1,36 @@
+import numpy as np
+
+import cv2
+
+from PrimitiveFitter import SHAPE_CIRCLE, SHAPE_ELLIPSE, SHAPE_POLYGON, fit_primitive, format_primitive, shape_iou
+
+def traced(draw):
+    """The traced contour and the simplified polygon of the largest shape drawn on a blank mask."""
+    mask = np.zeros((200, 200), dtype=np.uint8)
+    draw(mask)
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[0]
+    contour = max(contours, key=cv2.contourArea).reshape(-1, 2)
+    return contour, cv2.approxPolyDP(contour, 1.0, True).reshape(-1, 2)
+
+def test_round_shapes_become_primitives():
+    contour, polygon = traced(lambda mask: cv2.circle(mask, (100, 100), 60, 1, -1))
+    kind, params = fit_primitive(contour, '#ff0000', polygon)
+    assert kind == SHAPE_CIRCLE
+    assert format_primitive(kind, params, '#ff0000') == '<circle cx="100" cy="100" r="59" fill="#ff0000"/>\n'
+
+    contour, polygon = traced(lambda mask: cv2.ellipse(mask, (100, 100), (70, 35), 30, 0, 360, 1, -1))
+    kind, params = fit_primitive(contour, '#ff0000', polygon)
+    assert kind == SHAPE_ELLIPSE
+    assert shape_iou(contour, kind, params) >= 0.92
+    assert 'transform="rotate(30 100 100)"' in format_primitive(kind, params, '#ff0000')
+
+def test_polygons_stay_when_no_primitive_is_cheaper_and_close():
+    corners = np.array([[20, 20], [180, 20], [180, 60], [60, 60], [60, 180], [20, 180]], dtype=np.int32)
+    contour, polygon = traced(lambda mask: cv2.fillPoly(mask, [corners], 1))
+    assert fit_primitive(contour, '#ff0000', polygon) == (SHAPE_POLYGON, None)
+
+    # A box matches exactly, but its four-vertex polygon is already shorter than a rotated <rect>.
+    box = cv2.boxPoints(((100, 100), (120, 50), 20)).astype(np.int32)
+    contour, polygon = traced(lambda mask: cv2.fillPoly(mask, [box], 1))
+    assert len(polygon) == 4
+    assert fit_primitive(contour, '#ff0000', polygon) == (SHAPE_POLYGON, None)
@@ -0,0 +1,32 @@
+import numpy as np
+
+import cv2
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+from ColorQuantizer import get_quantizer
+from SimplificationPyramid import SimplificationPyramid
+
+def drawing_error(img, pyramid, levels, background):
+    """Mean squared error of the selected features painted at full resolution."""
+    canvas = np.empty(img.shape, dtype=np.float32)
+    canvas[:] = background
+    features = pyramid.features
+    for i in pyramid.paint_order(levels).tolist():
+        rings = [np.rint(ring * 8).astype(np.int32) for ring in pyramid.outline(i, levels[i])]
+        cv2.fillPoly(canvas, rings, features.palette[features.color_index[i]].tolist(), shift=3)
+    return ((canvas - img) ** 2).sum(axis=-1).mean()
+
+def test_unbound_budget_draws_as_well_as_dp():
+    for img in (synthetic_image('flat', 384, 2), synthetic_image('gradient', 384, 0)):
+        features = Bitmap2SVGConverter.extract_features_by_scale(img, quantizer=get_quantizer('fast', seed=0))
+        background = Bitmap2SVGConverter.svg_frame(img)[2]
+        for encoding in ('polygon', 'path'):
+            pyramid = SimplificationPyramid(features, encoding)
+            errors = {}
+            for packer in ('dp', 'residual'):
+                levels, _ = Bitmap2SVGConverter.select_levels(pyramid, 10 ** 6, packer=packer, img_np=img,
+                                                              background=background)
+                errors[packer] = drawing_error(img, pyramid, levels, background)
+            # With bytes to spare, every decimated feature gets its traced outline back.
+            assert errors['residual'] <= errors['dp']
@@ -0,0 +1,54 @@
+import numpy as np
+
+import Bitmap2SVGConverter
+from Bitmap2SVGBenchmark import synthetic_image
+from BudgetPacker import packed_size
+from ColorQuantizer import get_quantizer
+from SimplificationPyramid import SimplificationPyramid
+
+def ramp():
+    """A horizontal red-to-blue ramp (drawn as a gradient) around a green square."""
+    x = np.linspace(0, 255, 256)
+    img = np.zeros((256, 256, 3), dtype=np.uint8)
+    img[..., 0], img[..., 1], img[..., 2] = x, 80, 255 - x
+    img[60:200, 60:200] = (30, 160, 30)
+    return img
+
+def nested():
+    """A blue square in a red square on a blue square: the red square gets a hole."""
+    img = np.full((128, 128, 3), 235, dtype=np.uint8)
+    img[10:118, 10:118] = (30, 30, 200)
+    img[30:98, 30:98] = (200, 30, 30)
+    img[50:70, 45:75] = (30, 30, 200)
+    return img
+
+# Every kind of element: polygons, primitives, features with holes and gradient fills.
+CASES = ((synthetic_image('flat', 256, 3), {}), (synthetic_image('flat', 256, 3), {'primitives': True}),
+         (nested(), {'holes': True}), (ramp(), {'gradients': True}))
+
+def pyramids(encoding):
+    for img, options in CASES:
+        features = Bitmap2SVGConverter.extract_features_by_scale(img, quantizer=get_quantizer('fast', seed=0), **options)
+        yield SimplificationPyramid(features, encoding)
+
+def test_predicted_cost_is_the_formatted_length():
+    kinds = set()
+    for pyramid in pyramids('polygon'):
+        features = pyramid.features
+        kinds.update(name for name, present in (('primitive', pyramid.primitive.any()), ('holes', pyramid.holed.any()),
+                                                ('defs', any(features.defs))) if present)
+        for i in range(len(features)):
+            for level in range(pyramid.num_levels):
+                assert len(pyramid.element(i, level).encode('utf-8')) == pyramid.cost[i, level]
+    assert kinds == {'primitive', 'holes', 'defs'}
+
+def test_path_elements_add_up_to_the_packed_size():
+    rng = np.random.default_rng(0)
+    for pyramid in pyramids('path'):
+        for i in np.flatnonzero(~pyramid.primitive).tolist():
+            for level in range(pyramid.num_levels):
+                assert len(pyramid.subpath(i, level)) == pyramid.cost[i, level]
+        for _ in range(5):
+            levels = rng.integers(-1, pyramid.num_levels, len(pyramid.features)).astype(np.int8)
+            size = sum(len(element.encode('utf-8')) for element in pyramid.path_elements(levels))
+            assert size == packed_size(pyramid.cost, levels, pyramid.group, pyramid.group_cost, pyramid.opens)
@@ -0,0 +1,22 @@
+import numpy as np
+
+import cv2
+
+from SizeAutotuner import SizeAutotuner
+
+def blobs():
+    """Many small colored discs on a white background."""
+    rng = np.random.default_rng(0)
+    img = np.full((384, 384, 3), 255, dtype=np.uint8)
+    for _ in range(300):
+        center = tuple(int(v) for v in rng.integers(0, 384, 2))
+        cv2.circle(img, center, int(rng.integers(3, 12)), tuple(int(v) for v in rng.integers(0, 256, 3)), -1)
+    return img
+
+def test_area_search_starts_where_its_bracket_was_measured():
+    tuner = SizeAutotuner(blobs(), quantizer='fast', encoding='path')
+    svg, best, trials = tuner.tune(1500, num_colors=8, min_contour_area=0.5)
+    assert len(svg.encode('utf-8')) == best['bytes'] <= 1500
+    # Both epsilon trials are too large, so the area is searched up from the area they used.
+    assert not trials[1]['fits'] and trials[1]['min_contour_area'] == trials[0]['min_contour_area'] == 1.0
+    assert best['min_contour_area'] > 1.0
@@ -0,0 +1,27 @@
+from SVGWriter import SVGWriter
+
+def test_closed_document_never_exceeds_the_limit():
+    header = '<svg xmlns="http://www.w3.org/2000/svg">\n'
+    element = '<rect width="1" height="1" fill="#f00"/>\n'
+    formatted = []
+
+    def elements():
+        for number in range(100):
+            formatted.append(number)
+            yield element.replace('#f00', f'#{number:03d}')
+
+    limit = len(header) + 3 * len(element) + len('</svg>') + len(element) // 2
+    writer = SVGWriter(max_size_bytes=limit)
+    writer.begin(header)
+    assert writer.write_all(elements()) == 3
+    # Elements after the first that did not fit are never formatted.
+    assert len(formatted) == 4
+    assert writer.close() == len(writer.getvalue().encode('utf-8')) <= limit
+    assert writer.getvalue().endswith('#002"/>\n</svg>')
+
+def test_unlimited_writer_takes_every_element():
+    writer = SVGWriter(footer='</g></svg>')
+    writer.begin('<svg><g>')
+    assert writer.write_all(['<a/>', b'<b/>', '<c/>']) == 3
+    assert writer.close() == len('<svg><g><a/><b/><c/></g></svg>')
+    assert writer.getvalue() == '<svg><g><a/><b/><c/></g></svg>'
@@ -14,6 +14,12 @@ import kagglehub
 
 import logging
 
+import sys
+# The shared quantization engines live in the stable_diffusion directory, two levels up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from ColorQuantizer import get_quantizer
+from OcclusionCulling import cull_svg
+
 
 device = "cuda:1" if torch.cuda.is_available() else "cpu"
 
@@ -75,13 +81,15 @@ def compress_hex_color(r: int, g: int, b: int) -> str:
     else:
         return f"#{r:02x}{g:02x}{b:02x}"
 
-def perform_color_quantization(image: np.ndarray, num_colors_hint: int = 0) -> Tuple[np.ndarray, List[Tuple[int, int, int]]]:
+def perform_color_quantization(image: np.ndarray, num_colors_hint: int = 0, quantizer=None) -> Tuple[np.ndarray, List[Tuple[int, int, int]]]:
     """
     Enhanced color quantization using K-means with full adaptive logic from C++
 
     Args:
         image: Input RGB image
         num_colors_hint: Color count hint (0 for automatic, >0 for manual)
+        quantizer: Optional quantization engine name ('kmeans', 'fast') or ColorQuantizer instance.
+            None keeps the built-in K-means below.
 
     Returns:
         Tuple of (quantized_image, palette)
@@ -124,36 +132,41 @@ def perform_color_quantization(image: np.ndarray, num_colors_hint: int = 0) -> T
         if k == 0:
             return image.astype(np.uint8), [(128, 128, 128)]  # Fallback
 
-    # Check for unique colors to avoid unnecessary clustering
-    unique_colors = np.unique(pixels, axis=0)
-    if len(unique_colors) <= k:
-        # If we have fewer unique colors than requested, use them directly
-        k = len(unique_colors)
-        centers = unique_colors.astype(np.float32)
-        
-        # Create labels by finding closest center for each pixel
-        labels = np.zeros(pixels.shape[0], dtype=np.int32)
-        for i, pixel in enumerate(pixels):
-            distances = np.sum((centers - pixel) ** 2, axis=1)
-            labels[i] = np.argmin(distances)
+    if quantizer is not None:
+        # Delegate to the shared engine; it returns a label map and a uint8 palette.
+        labels, centers = get_quantizer(quantizer).quantize(image.astype(np.uint8), k)
+        centers = centers.astype(np.float32)
     else:
-        # Perform K-means clustering with adaptive parameters
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 50, 0.1)
-        attempts = 5 if k <= 8 else 7
-        
-        try:
-            _, labels, centers = cv2.kmeans(
-                pixels, k, None, criteria, attempts, cv2.KMEANS_PP_CENTERS
-            )
-        except cv2.error as e:
-            logging.error(f"K-means failed: {e}. Using fallback method.")
-            # Fallback to simple uniform sampling
-            indices = np.linspace(0, len(unique_colors) - 1, k, dtype=int)
-            centers = unique_colors[indices].astype(np.float32)
+        # Check for unique colors to avoid unnecessary clustering
+        unique_colors = np.unique(pixels, axis=0)
+        if len(unique_colors) <= k:
+            # If we have fewer unique colors than requested, use them directly
+            k = len(unique_colors)
+            centers = unique_colors.astype(np.float32)
+
+            # Create labels by finding closest center for each pixel
             labels = np.zeros(pixels.shape[0], dtype=np.int32)
             for i, pixel in enumerate(pixels):
                 distances = np.sum((centers - pixel) ** 2, axis=1)
                 labels[i] = np.argmin(distances)
+        else:
+            # Perform K-means clustering with adaptive parameters
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 50, 0.1)
+            attempts = 5 if k <= 8 else 7
+
+            try:
+                _, labels, centers = cv2.kmeans(
+                    pixels, k, None, criteria, attempts, cv2.KMEANS_PP_CENTERS
+                )
+            except cv2.error as e:
+                logging.error(f"K-means failed: {e}. Using fallback method.")
+                # Fallback to simple uniform sampling
+                indices = np.linspace(0, len(unique_colors) - 1, k, dtype=int)
+                centers = unique_colors[indices].astype(np.float32)
+                labels = np.zeros(pixels.shape[0], dtype=np.int32)
+                for i, pixel in enumerate(pixels):
+                    distances = np.sum((centers - pixel) ** 2, axis=1)
+                    labels[i] = np.argmin(distances)
 
     # Handle empty centers (fallback logic from C++)
     if centers.shape[0] == 0:
@@ -417,6 +430,8 @@ def text_to_svg_enhanced(
                         max_features: int = 100,
                         min_contour_area: float = 100,
                         simplification_epsilon: float = 0.02,
+                        quantizer=None,
+                        cull_occluded: bool = False,
                         **generation_kwargs) -> Tuple[str, Image.Image]:
     """
     Enhanced text-to-SVG pipeline with full adaptive color quantization
@@ -429,6 +444,8 @@ def text_to_svg_enhanced(
         max_features: Maximum features to render
         min_contour_area: Minimum contour area to consider
         simplification_epsilon: Contour simplification factor
+        quantizer: Optional quantization engine name ('kmeans', 'fast') or ColorQuantizer instance
+        cull_occluded: Remove the polygons that polygons drawn after them completely hide
         **generation_kwargs: Additional arguments for image generation
 
     Returns:
@@ -440,7 +457,7 @@ def text_to_svg_enhanced(
 
     # Step 2: Enhanced color quantization with full adaptive logic
     img_array = np.array(image)
-    quantized_image, palette = perform_color_quantization(img_array, num_colors)
+    quantized_image, palette = perform_color_quantization(img_array, num_colors, quantizer)
 
     # Step 3: Classify segments
     segments_info = classify_segments_enhanced(image, quantized_image, palette)
@@ -451,6 +468,11 @@ def text_to_svg_enhanced(
         width, height, max_features
     )
 
+    # Step 5 (optional): Drop the polygons painted over by later ones
+    if cull_occluded:
+        svg_content, removed = cull_svg(svg_content)
+        logging.info(f"Occlusion culling removed {removed} hidden polygons")
+
     return svg_content, image
 
 # Example usage